@@ -9,10 +9,13 @@ import os
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from services.log_config import configure_logging
 from services.pdf_service import analyze_template
 
 
 def main():
+    # analyze_template reports the fields and patterns through logging
+    configure_logging()
     template_path = "data/template.pdf"
 
     print("🔍 ANALIZANDO TEMPLATE PDF")
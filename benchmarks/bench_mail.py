@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark del envío de emails contra el servidor SMTP local.
+
+Envía N mensajes con certificado adjunto a través de SMTPSink y reporta
+throughput, percentiles de latencia, fallos y reintentos para cada
+remitente (envío individual y envío por sesión reutilizada).
+
+Ejemplos:
+    python benchmarks/bench_mail.py
+    python benchmarks/bench_mail.py --counts 100 1000 --rate-4xx 0.05 --tls
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_sink import SMTPSink, SinkFaults
+from services.mail_service import MailSession, send_baptism_congratulations_email
+from services.timings import percentile
+
+
+def make_attachment(directory, size_kb):
+    """Crear un PDF falso del tamaño indicado"""
+    path = os.path.join(directory, "certificado_Bench.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        f.write(os.urandom(size_kb * 1024))
+        f.write(b"\n%%EOF\n")
+    return path
+
+
+def _send_single(config, session, recipient, attachment):
+    return send_baptism_congratulations_email(
+        recipient, "Persona de Prueba", attachment, config=config
+    )
+
+
+def _send_session(config, session, recipient, attachment):
+    return send_baptism_congratulations_email(
+        recipient, "Persona de Prueba", attachment, session=session
+    )
+
+
+SENDERS = {
+    "individual": _send_single,
+    "sesion": _send_session,
+}
+
+
+def run_sender(name, sink, count, attachment, max_retries, retry_delay):
+    """Ejecutar un remitente contra el servidor y medir resultados"""
+    config = sink.email_config()
+    send = SENDERS[name]
+    before = sink.snapshot()
+    latencies = []
+    sent = failed = retries = 0
+
+    session = MailSession(config) if name == "sesion" else None
+    start = time.perf_counter()
+    try:
+        for i in range(count):
+            recipient = f"persona{i}@example.com"
+            t0 = time.perf_counter()
+            ok = False
+            for attempt in range(max_retries + 1):
+                if attempt:
+                    retries += 1
+                    time.sleep(retry_delay)
+                if send(config, session, recipient, attachment):
+                    ok = True
+                    break
+            latencies.append(time.perf_counter() - t0)
+            if ok:
+                sent += 1
+            else:
+                failed += 1
+    finally:
+        if session is not None:
+            session.close()
+    elapsed = time.perf_counter() - start
+    after = sink.snapshot()
+
+    return {
+        "sender": name,
+        "messages": count,
+        "sent": sent,
+        "failed": failed,
+        "retries": retries,
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(count / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "server": {key: after[key] - before[key] for key in after},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de envío de emails")
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--senders", nargs="+", choices=sorted(SENDERS), default=sorted(SENDERS)
+    )
+    parser.add_argument("--attachment-kb", type=int, default=60)
+    parser.add_argument("--tls", action="store_true", help="Usar STARTTLS")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--data-latency", type=float, default=0.0)
+    parser.add_argument("--rate-4xx", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--retry-delay", type=float, default=0.0)
+    parser.add_argument("--store", action="store_true", help="Guardar los .eml")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_mail_")
+    results = []
+    try:
+        attachment = make_attachment(workdir, args.attachment_kb)
+        faults = SinkFaults(
+            latency=args.latency,
+            data_latency=args.data_latency,
+            rate_4xx=args.rate_4xx,
+            rate_5xx=args.rate_5xx,
+            seed=42,
+        )
+        store_dir = os.path.join(workdir, "sink") if args.store else None
+        with SMTPSink(store_dir=store_dir, faults=faults, tls=args.tls) as sink:
+            for count in args.counts:
+                for name in args.senders:
+                    print(f"⏱️  {name}: {count} mensajes...", file=sys.stderr)
+                    result = run_sender(
+                        name, sink, count, attachment, args.max_retries, args.retry_delay
+                    )
+                    results.append(result)
+                    print(
+                        f"   {result['throughput_per_s']} msg/s, "
+                        f"p50={result['latency_ms']['p50']} ms, "
+                        f"p95={result['latency_ms']['p95']} ms, "
+                        f"enviados={result['sent']}, fallidos={result['failed']}, "
+                        f"reintentos={result['retries']}",
+                        file=sys.stderr,
+                    )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks de extremo a extremo.
+
+Mide con datos sintéticos (ver synthetic_data.py) las partes del programa
+que deciden cuánto tarda un lote:
+
+    db     inserción, consultas con filtros y actualizaciones en SQLite
+    pdf    generate_certificate y cada método de relleno por separado
+    mail   envío contra el servidor SMTP local (ver bench_mail.py)
+    batch  el lote completo: generación, envío y base de datos
+
+Los resultados se guardan en JSON junto con la versión del código, y con
+--compare se comparan con los de otra versión para detectar regresiones.
+
+Ejemplos:
+    python benchmarks/bench_suite.py --json resultados.json
+    python benchmarks/bench_suite.py --suites db --sizes 1000 10000 100000
+    python benchmarks/bench_suite.py --suites pdf batch --compare anterior.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_mail import run_sender
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.synthetic_data import generate_records, load_database, make_template
+from services.batch_processor import BatchProcessor
+from services.database_service import DatabaseService
+from services.mail_scheduler import DEFAULT_POLICIES
+from services.pdf_service import (
+    PYMUPDF_AVAILABLE,
+    fill_pdf_template,
+    fill_pdf_with_text_replacement,
+    format_date,
+    generate_certificate,
+    improved_text_replacement,
+)
+from services.timings import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def quiet():
+    """Descartar los mensajes de progreso del código medido"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def result(suite, case, size, count, seconds, latencies=None, **extra):
+    """Un resultado con el formato común de la suite"""
+    entry = {
+        "suite": suite,
+        "case": case,
+        "size": size,
+        "count": count,
+        "seconds": round(seconds, 4),
+        "per_second": round(count / seconds, 1) if seconds else 0.0,
+    }
+    if latencies:
+        entry["latency_ms"] = {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        }
+    entry.update(extra)
+    return entry
+
+
+def timed(function, repeat=1):
+    """Mediana de repeat ejecuciones de function, y su último resultado"""
+    times, value = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        times.append(time.perf_counter() - start)
+    return percentile(times, 50), value
+
+
+def new_database(workdir, size, seed):
+    """Base de datos nueva con size registros sintéticos"""
+    path = os.path.join(workdir, f"bench_{size}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    db = DatabaseService(path)
+    load_database(db, generate_records(size, seed))
+    return db
+
+
+# Suites ----------------------------------------------------------------
+
+
+def bench_database(args, workdir, sink):
+    results = []
+    for size in args.sizes:
+        path = os.path.join(workdir, f"bench_{size}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        db = DatabaseService(path)
+        records = list(generate_records(size, args.seed))
+
+        seconds, added = timed(lambda: load_database(db, records))
+        results.append(result("db", "insertar", size, added, seconds))
+        # Importar la misma hoja otra vez no añade nada
+        seconds, _ = timed(lambda: load_database(db, records))
+        results.append(result("db", "reimportar", size, size, seconds))
+
+        church = records[0]["iglesia"]
+        queries = {
+            "contar_pendientes": lambda: db.contar_bautismos(estado="pendientes"),
+            "buscar_iglesia_100": lambda: db.buscar_bautismos(iglesia=church, limit=100),
+            "buscar_rango_fechas_500": lambda: db.buscar_bautismos(
+                desde="2023-01-01", hasta="2023-06-30", limit=500
+            ),
+            "recorrer_sin_terminar": lambda: sum(
+                1 for _ in db.iterar_bautismos(estado="sin_terminar")
+            ),
+            "estadisticas": lambda: db.obtener_estadisticas(),
+            "estadisticas_por_iglesia": lambda: db.estadisticas_por_iglesia(),
+        }
+        for case, query in queries.items():
+            seconds, _ = timed(query, args.repeat)
+            results.append(result("db", case, size, 1, seconds))
+
+        ids = [row["id"] for row in db.buscar_bautismos(limit=args.update_count)]
+        start = time.perf_counter()
+        for record_id in ids:
+            db.marcar_certificado_generado(record_id)
+        results.append(
+            result("db", "marcar_generado", size, len(ids), time.perf_counter() - start)
+        )
+        seconds, _ = timed(lambda: db.marcar_emails_enviados(ids))
+        results.append(result("db", "marcar_enviados_lote", size, len(ids), seconds))
+        seconds, _ = timed(lambda: db.regenerar_certificados(ids))
+        results.append(result("db", "regenerar_lote", size, len(ids), seconds))
+        os.remove(path)
+    return results
+
+
+def _pdf_strategies():
+    """Métodos de relleno: (nombre, función(plantilla, salida, registro))"""
+
+    def form_fields(template, output, record):
+        data = {
+            "[NOMBRE_COMPLETO]": record["nombre_completo"],
+            "[FECHA_BAUTISMO]": format_date(record["fecha_bautismo"]),
+            "[NOMBRE_IGLESIA]": record["iglesia"],
+        }
+        return fill_pdf_template(template, output, data)
+
+    def text(method):
+        def render(template, output, record):
+            return method(
+                template,
+                output,
+                record["nombre_completo"],
+                format_date(record["fecha_bautismo"]),
+                record["iglesia"],
+            )
+
+        return render
+
+    def certificate(template, output, record):
+        return generate_certificate(
+            record["nombre_completo"],
+            record["fecha_bautismo"],
+            record["iglesia"],
+            template,
+            output,
+        )
+
+    strategies = [("generate_certificate", certificate), ("formulario", form_fields)]
+    if PYMUPDF_AVAILABLE:
+        strategies.append(("reemplazo_mejorado", text(improved_text_replacement)))
+        strategies.append(("reemplazo_original", text(fill_pdf_with_text_replacement)))
+    return strategies
+
+
+def bench_pdf(args, workdir, sink):
+    results = []
+    output_dir = os.path.join(workdir, "pdf")
+    records = list(generate_records(args.pdf_count, args.seed))
+    for name, render in _pdf_strategies():
+        os.makedirs(output_dir, exist_ok=True)
+        latencies, ok, size = [], 0, 0
+        start = time.perf_counter()
+        for i, record in enumerate(records):
+            output = os.path.join(output_dir, f"certificado_{i}.pdf")
+            t0 = time.perf_counter()
+            with quiet():
+                done = render(args.template, output, record)
+            latencies.append(time.perf_counter() - t0)
+            if done and os.path.exists(output):
+                ok += 1
+                size += os.path.getsize(output)
+        elapsed = time.perf_counter() - start
+        results.append(
+            result(
+                "pdf",
+                name,
+                args.pdf_count,
+                len(records),
+                elapsed,
+                latencies,
+                ok=ok,
+                avg_kb=round(size / ok / 1024, 1) if ok else 0.0,
+            )
+        )
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+
+def bench_mail(args, workdir, sink):
+    results = []
+    attachment = os.path.join(workdir, "adjunto.pdf")
+    shutil.copy(args.template, attachment)
+    for sender in ("individual", "sesion"):
+        with quiet():
+            entry = run_sender(sender, sink, args.mail_count, attachment, 2, 0.0)
+        results.append(
+            {
+                "suite": "mail",
+                "case": sender,
+                "size": args.mail_count,
+                "count": entry["sent"],
+                "seconds": entry["seconds"],
+                "per_second": entry["throughput_per_s"],
+                "latency_ms": entry["latency_ms"],
+                "failed": entry["failed"],
+                "retries": entry["retries"],
+            }
+        )
+    return results
+
+
+def bench_batch(args, workdir, sink):
+    results = []
+    for size in args.batch_sizes:
+        db = new_database(workdir, size, args.seed)
+        output_dir = os.path.join(workdir, "batch")
+        # Sin los límites por minuto de Outlook o Yahoo el lote mide el
+        # programa y no las esperas entre envíos
+        limits = {}
+        if not args.domain_rates:
+            limits = {
+                group: (policy.concurrency, 0)
+                for group, policy in DEFAULT_POLICIES.items()
+            }
+        processor = BatchProcessor(
+            db=db,
+            config=sink.email_config(domain_limits=limits),
+            template_path=args.template,
+            output_dir=output_dir,
+            workers=args.workers,
+            connections=args.connections,
+        )
+        before = sink.snapshot()
+        with quiet():
+            summary = processor.generate(
+                db.iterar_bautismos(estado="sin_terminar"), send=True, total=size
+            )
+        after = sink.snapshot()
+        results.append(
+            result(
+                "batch",
+                "generar_y_enviar",
+                size,
+                summary["generated"],
+                summary["seconds"],
+                sent=summary["sent"],
+                failed=summary["failed"],
+                bytes_written=summary["bytes_written"],
+                bytes_sent=summary["bytes_sent"],
+                server_accepted=after["accepted"] - before["accepted"],
+                stages=summary["stages"],
+            )
+        )
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.remove(db.db_path)
+    return results
+
+
+SUITES = {
+    "db": bench_database,
+    "pdf": bench_pdf,
+    "mail": bench_mail,
+    "batch": bench_batch,
+}
+
+
+# Resultados ------------------------------------------------------------
+
+
+def code_version():
+    """Commit del código medido (o None fuera de un repositorio git)"""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, tolerance):
+    """
+    Comparar el ritmo (per_second) con el de otra ejecución.
+
+    :return: Casos más lentos que el anterior en más de tolerance
+    """
+    old = {(r["suite"], r["case"], r["size"]): r for r in previous["results"]}
+    regressions = []
+    print(
+        f"\n📊 Comparación con {previous['meta'].get('version') or 'la anterior'}",
+        file=sys.stderr,
+    )
+    for entry in results:
+        before = old.get((entry["suite"], entry["case"], entry["size"]))
+        if not before or not before["per_second"]:
+            continue
+        ratio = entry["per_second"] / before["per_second"]
+        mark = "  "
+        if ratio < 1 - tolerance:
+            mark = "🔻"
+            regressions.append(entry)
+        elif ratio > 1 + tolerance:
+            mark = "🔺"
+        print(
+            f"{mark} {entry['suite']}/{entry['case']} ({entry['size']}): "
+            f"{before['per_second']} -> {entry['per_second']}/s ({ratio:.2f}x)",
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks")
+    parser.add_argument(
+        "--suites", nargs="+", choices=list(SUITES), default=list(SUITES)
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+        help="Registros para la suite db",
+    )
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1000],
+        help="Registros para el lote completo",
+    )
+    parser.add_argument("--pdf-count", type=int, default=50)
+    parser.add_argument("--mail-count", type=int, default=500)
+    parser.add_argument("--update-count", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--domain-rates", action="store_true",
+        help="Respetar en el lote los envíos por minuto de cada proveedor",
+    )
+    parser.add_argument(
+        "--template", help="Plantilla PDF (por defecto, una sintética)"
+    )
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    parser.add_argument("--compare", help="Resultados JSON de otra versión")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.10,
+        help="Caída de rendimiento aceptada al comparar (por defecto 10%%)",
+    )
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    cwd = os.getcwd()
+    results = []
+    try:
+        # generate_certificate busca data/template.pdf y data/field_mapping.json
+        # en el directorio actual
+        os.chdir(workdir)
+        os.makedirs("data")
+        shutil.copy(os.path.join(ROOT, "data", "field_mapping.json"), "data")
+        if args.template:
+            shutil.copy(os.path.join(cwd, args.template), "data/template.pdf")
+        else:
+            make_template("data/template.pdf")
+        args.template = os.path.abspath("data/template.pdf")
+
+        with SMTPSink() as sink:
+            for suite in args.suites:
+                print(f"⏱️  {suite}...", file=sys.stderr)
+                for entry in SUITES[suite](args, workdir, sink):
+                    results.append(entry)
+                    latency = entry.get("latency_ms")
+                    print(
+                        f"   {entry['case']} ({entry['size']}): "
+                        f"{entry['seconds']} s, {entry['per_second']}/s"
+                        + (f", p95={latency['p95']} ms" if latency else ""),
+                        file=sys.stderr,
+                    )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "version": code_version(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    data = json.dumps(output, indent=2, ensure_ascii=False)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(data)
+        print(f"✅ Resultados guardados en {args.json}", file=sys.stderr)
+    else:
+        print(data)
+
+    if previous is not None and compare(results, previous, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
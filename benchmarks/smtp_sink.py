@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Servidor SMTP local para pruebas y benchmarks del envío de emails.
+
+Implementa lo necesario del protocolo SMTP sobre asyncio (EHLO, STARTTLS,
+AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT), guarda los mensajes
+recibidos en un directorio y permite inyectar latencia y respuestas 4xx/5xx.
+
+Uso como script:
+    python benchmarks/smtp_sink.py --port 2525 --dir output/smtp_sink
+
+Uso desde código:
+    with SMTPSink(store_dir="output/smtp_sink") as sink:
+        config = sink.email_config()
+        ...
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import random
+import re
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_self_signed_cert(directory):
+    """
+    Crear un certificado autofirmado con openssl para STARTTLS.
+
+    :return: (certfile, keyfile) o None si openssl no está disponible
+    """
+    if not shutil.which("openssl"):
+        return None
+
+    certfile = os.path.join(directory, "sink_cert.pem")
+    keyfile = os.path.join(directory, "sink_key.pem")
+    result = subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", keyfile, "-out", certfile, "-days", "1",
+            "-subj", "/CN=localhost",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if result.returncode != 0:
+        return None
+    return certfile, keyfile
+
+
+class SinkFaults:
+    """
+    Fallos a inyectar en el servidor.
+
+    :param latency: Segundos de espera antes de responder a cada comando
+    :param data_latency: Segundos extra de espera al aceptar DATA
+    :param rate_4xx: Probabilidad de responder 451 a un mensaje
+    :param rate_5xx: Probabilidad de responder 554 a un mensaje
+    :param reject_pattern: Regex de destinatarios rechazados con 550
+    :param defer_pattern: Regex de destinatarios aplazados con 450
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        data_latency=0.0,
+        rate_4xx=0.0,
+        rate_5xx=0.0,
+        reject_pattern=None,
+        defer_pattern=None,
+        seed=None,
+    ):
+        self.latency = latency
+        self.data_latency = data_latency
+        self.rate_4xx = rate_4xx
+        self.rate_5xx = rate_5xx
+        self.reject_pattern = re.compile(reject_pattern, re.I) if reject_pattern else None
+        self.defer_pattern = re.compile(defer_pattern, re.I) if defer_pattern else None
+        self._random = random.Random(seed)
+
+    def rcpt_response(self, address):
+        if self.reject_pattern and self.reject_pattern.search(address):
+            return "550 5.1.1 Mailbox does not exist"
+        if self.defer_pattern and self.defer_pattern.search(address):
+            return "450 4.2.1 Mailbox temporarily unavailable, try again later"
+        return None
+
+    def data_response(self):
+        roll = self._random.random()
+        if roll < self.rate_5xx:
+            return "554 5.7.1 Message rejected"
+        if roll < self.rate_5xx + self.rate_4xx:
+            return "451 4.3.0 Temporary failure, try again later"
+        return None
+
+
+class SMTPSink:
+    """Servidor SMTP en un hilo propio que guarda los mensajes recibidos"""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        store_dir=None,
+        user="sink@localhost",
+        password="sink",
+        faults=None,
+        tls=False,
+        certfile=None,
+        keyfile=None,
+    ):
+        self.host = host
+        self.port = port
+        self.store_dir = store_dir
+        self.user = user
+        self.password = password
+        self.faults = faults or SinkFaults()
+        self.tls = tls
+        self.certfile = certfile
+        self.keyfile = keyfile
+
+        self._ssl_context = None
+        self._tmpdir = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.stats = {
+            "connections": 0,
+            "auth_ok": 0,
+            "auth_failed": 0,
+            "accepted": 0,
+            "deferred": 0,
+            "rejected": 0,
+            "bytes": 0,
+        }
+
+    # Ciclo de vida -------------------------------------------------------
+
+    def start(self):
+        """Arrancar el servidor y esperar a que acepte conexiones"""
+        if self.tls:
+            if not self.certfile:
+                self._tmpdir = tempfile.mkdtemp(prefix="smtp_sink_")
+                cert = make_self_signed_cert(self._tmpdir)
+                if cert is None:
+                    raise RuntimeError("openssl no disponible para generar certificado")
+                self.certfile, self.keyfile = cert
+            self._ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self._ssl_context.load_cert_chain(self.certfile, self.keyfile)
+
+        if self.store_dir:
+            os.makedirs(self.store_dir, exist_ok=True)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self.host, self.port
+
+    def stop(self):
+        """Detener el servidor"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+            self._loop = None
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(
+                asyncio.gather(*pending, return_exceptions=True)
+            )
+            self._loop.close()
+
+    def email_config(self, **overrides):
+        """EmailConfig que apunta a este servidor"""
+        from services.mail_config import EmailConfig
+
+        values = {
+            "sender": self.user,
+            "password": self.password,
+            "smtp_server": self.host,
+            "smtp_port": self.port,
+            "tls_mode": "starttls" if self.tls else "none",
+            "timeout": 30.0,
+        }
+        values.update(overrides)
+        return EmailConfig(**values)
+
+    def snapshot(self):
+        """Copia de las estadísticas actuales"""
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    # Protocolo -----------------------------------------------------------
+
+    def _store(self, mail_from, rcpts, data):
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        self._count("accepted")
+        self._count("bytes", len(data))
+        if self.store_dir:
+            path = os.path.join(self.store_dir, f"{number:08d}.eml")
+            with open(path, "wb") as f:
+                f.write(data)
+        return number
+
+    async def _handle(self, reader, writer):
+        self._count("connections")
+        faults = self.faults
+
+        async def reply(line):
+            if faults.latency:
+                await asyncio.sleep(faults.latency)
+            writer.write(line.encode("ascii") + b"\r\n")
+            await writer.drain()
+
+        async def readline():
+            line = await reader.readline()
+            return line.decode("utf-8", "replace").rstrip("\r\n")
+
+        tls_active = False
+        authenticated = False
+        mail_from = None
+        rcpts = []
+
+        try:
+            await reply("220 localhost SMTP sink ready")
+            while True:
+                line = await readline()
+                if not line and reader.at_eof():
+                    break
+                command, _, arg = line.partition(" ")
+                command = command.upper()
+
+                if command in ("EHLO", "HELO"):
+                    if command == "HELO":
+                        await reply("250 localhost")
+                        continue
+                    extensions = ["AUTH PLAIN LOGIN", "8BITMIME", "SIZE 52428800"]
+                    if self._ssl_context and not tls_active:
+                        extensions.insert(0, "STARTTLS")
+                    lines = ["localhost"] + extensions
+                    for ext in lines[:-1]:
+                        writer.write(f"250-{ext}\r\n".encode("ascii"))
+                    await reply(f"250 {lines[-1]}")
+
+                elif command == "STARTTLS":
+                    if not self._ssl_context or tls_active:
+                        await reply("454 4.7.0 TLS not available")
+                        continue
+                    await reply("220 2.0.0 Ready to start TLS")
+                    await writer.start_tls(self._ssl_context)
+                    tls_active = True
+                    authenticated = False
+
+                elif command == "AUTH":
+                    mechanism, _, initial = arg.partition(" ")
+                    mechanism = mechanism.upper()
+                    if mechanism == "PLAIN":
+                        if not initial:
+                            await reply("334 ")
+                            initial = await readline()
+                        try:
+                            _, user, password = (
+                                base64.b64decode(initial).decode("utf-8").split("\0")
+                            )
+                        except Exception:
+                            user = password = None
+                    elif mechanism == "LOGIN":
+                        if initial:
+                            user = base64.b64decode(initial).decode("utf-8")
+                        else:
+                            await reply("334 VXNlcm5hbWU6")
+                            user = base64.b64decode(await readline()).decode("utf-8")
+                        await reply("334 UGFzc3dvcmQ6")
+                        password = base64.b64decode(await readline()).decode("utf-8")
+                    else:
+                        await reply("504 5.5.4 Unrecognized authentication type")
+                        continue
+
+                    if user == self.user and password == self.password:
+                        authenticated = True
+                        self._count("auth_ok")
+                        await reply("235 2.7.0 Authentication successful")
+                    else:
+                        self._count("auth_failed")
+                        await reply("535 5.7.8 Authentication credentials invalid")
+
+                elif command == "MAIL":
+                    if not authenticated:
+                        await reply("530 5.7.0 Authentication required")
+                        continue
+                    mail_from = arg.partition(":")[2].strip()
+                    rcpts = []
+                    await reply("250 2.1.0 OK")
+
+                elif command == "RCPT":
+                    if mail_from is None:
+                        await reply("503 5.5.1 Need MAIL command")
+                        continue
+                    address = arg.partition(":")[2].strip().strip("<>")
+                    response = faults.rcpt_response(address)
+                    if response:
+                        self._count("rejected" if response[0] == "5" else "deferred")
+                        await reply(response)
+                        continue
+                    rcpts.append(address)
+                    await reply("250 2.1.5 OK")
+
+                elif command == "DATA":
+                    if not rcpts:
+                        await reply("503 5.5.1 Need RCPT command")
+                        continue
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    chunks = []
+                    while True:
+                        raw = await reader.readline()
+                        if raw in (b".\r\n", b".\n") or not raw:
+                            break
+                        if raw.startswith(b".."):
+                            raw = raw[1:]
+                        chunks.append(raw)
+                    data = b"".join(chunks)
+
+                    if faults.data_latency:
+                        await asyncio.sleep(faults.data_latency)
+                    response = faults.data_response()
+                    if response:
+                        self._count("rejected" if response[0] == "5" else "deferred")
+                        await reply(response)
+                    else:
+                        number = self._store(mail_from, rcpts, data)
+                        await reply(f"250 2.0.0 OK queued as {number:08d}")
+                    mail_from = None
+                    rcpts = []
+
+                elif command == "RSET":
+                    mail_from = None
+                    rcpts = []
+                    await reply("250 2.0.0 OK")
+
+                elif command == "NOOP":
+                    await reply("250 2.0.0 OK")
+
+                elif command == "QUIT":
+                    await reply("221 2.0.0 Bye")
+                    break
+
+                else:
+                    await reply("502 5.5.2 Command not recognized")
+        except (
+            ConnectionError,
+            asyncio.IncompleteReadError,
+            asyncio.CancelledError,
+            ssl.SSLError,
+        ):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor SMTP local de pruebas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--dir", default=os.path.join("output", "smtp_sink"))
+    parser.add_argument("--user", default="sink@localhost")
+    parser.add_argument("--password", default="sink")
+    parser.add_argument("--tls", action="store_true", help="Ofrecer STARTTLS")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--data-latency", type=float, default=0.0)
+    parser.add_argument("--rate-4xx", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--reject", help="Regex de destinatarios rechazados (550)")
+    parser.add_argument("--defer", help="Regex de destinatarios aplazados (450)")
+    args = parser.parse_args()
+
+    faults = SinkFaults(
+        latency=args.latency,
+        data_latency=args.data_latency,
+        rate_4xx=args.rate_4xx,
+        rate_5xx=args.rate_5xx,
+        reject_pattern=args.reject,
+        defer_pattern=args.defer,
+    )
+    sink = SMTPSink(
+        host=args.host,
+        port=args.port,
+        store_dir=args.dir,
+        user=args.user,
+        password=args.password,
+        faults=faults,
+        tls=args.tls,
+    )
+    host, port = sink.start()
+    print(f"📬 Servidor SMTP de pruebas escuchando en {host}:{port}")
+    print(f"   Usuario: {args.user}  Contraseña: {args.password}")
+    print(f"   Mensajes en: {args.dir}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n📊 {sink.snapshot()}")
+    finally:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Datos sintéticos de bautismos para los benchmarks.
+
+Genera registros realistas (nombres en español con tildes y eñes, fechas,
+iglesias, células y líderes) siempre iguales para la misma semilla, así
+dos versiones del programa se miden con exactamente los mismos datos.
+También crea una plantilla PDF con campos de formulario y con los textos
+que buscan los métodos de reemplazo, para medir todas las estrategias.
+
+Ejemplos:
+    python benchmarks/synthetic_data.py --count 10000 --excel datos.xlsx
+    python benchmarks/synthetic_data.py --count 100000 --db bench.db
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+FIRST_NAMES = (
+    "María", "José", "Sofía", "Jesús", "Lucía", "Andrés", "Valentina", "Martín",
+    "Camila", "Sebastián", "Isabel", "Nicolás", "Ana", "Tomás", "Mónica", "Raúl",
+    "Inés", "Joaquín", "Begoña", "Óscar", "Ximena", "Ramón", "Noemí", "Germán",
+    "Renée", "Iñaki", "Zoé", "Adrián", "Ángela", "Héctor", "Verónica", "Julián",
+)
+SURNAMES = (
+    "González", "Rodríguez", "Pérez", "Fernández", "López", "Martínez", "Sánchez",
+    "Gómez", "Díaz", "Hernández", "Álvarez", "Jiménez", "Muñoz", "Ramírez",
+    "Núñez", "Ibáñez", "Peña", "Castaño", "Ordóñez", "Gutiérrez", "Chávez",
+    "Suárez", "Méndez", "Rincón", "Belén", "Cortés", "Ruiz", "Vázquez",
+)
+CHURCHES = (
+    "Manantial de Bendiciones", "Iglesia Betania", "Centro Cristiano Peniel",
+    "Comunidad Emaús", "Iglesia Monte Sión", "Tabernáculo de Fe",
+)
+CELLS = (
+    "Célula Génesis", "Célula Éxodo", "Célula Belén", "Célula Jericó",
+    "Célula Canaán", "Célula Sión", "Célula Nazaret", "Célula Galilea",
+)
+DOMAINS = ("gmail.com", "hotmail.com", "outlook.com", "yahoo.es", "iglesia.org")
+
+# Textos de la plantilla sintética: los campos de data/field_mapping.json y
+# las etiquetas que buscan los métodos de reemplazo de texto
+TEMPLATE_FIELDS = ("[NOMBRE_COMPLETO]", "[FECHA_BAUTISMO]", "[NOMBRE_IGLESIA]")
+TEMPLATE_LABELS = ("Certifico que:", "El día:", "En la iglesia:")
+
+
+def _ascii(text):
+    """Texto sin tildes para usarlo en una dirección de email"""
+    table = str.maketrans("áéíóúüñÁÉÍÓÚÜÑ", "aeiouunAEIOUUN")
+    return text.translate(table).lower()
+
+
+def generate_records(count, seed=42, future_ratio=0.0, email_ratio=0.95, start=None):
+    """
+    Registros sintéticos con las claves de DatabaseService.agregar_bautismos.
+
+    :param count: Número de registros
+    :param seed: Semilla; la misma semilla da los mismos registros
+    :param future_ratio: Parte de los registros con fecha futura
+    :param email_ratio: Parte de los registros con email
+    :param start: Fecha del bautismo más antiguo (por defecto, hace 5 años)
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    start = start or today - timedelta(days=5 * 365)
+    span = max(1, (today - start).days)
+    leaders = [
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}" for _ in range(len(CELLS))
+    ]
+
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        if rng.random() < 0.3:
+            first = f"{first} {rng.choice(FIRST_NAMES)}"
+        surnames = f"{rng.choice(SURNAMES)} {rng.choice(SURNAMES)}"
+        # El número evita nombres repetidos (y archivos de certificado repetidos)
+        name = f"{first} {surnames} {i + 1}"
+        if rng.random() < future_ratio:
+            day = today + timedelta(days=rng.randint(1, 180))
+        else:
+            day = start + timedelta(days=rng.randint(0, span))
+        email = ""
+        if rng.random() < email_ratio:
+            user = f"{_ascii(first.split()[0])}.{_ascii(surnames.split()[0])}{i + 1}"
+            email = f"{user}@{rng.choice(DOMAINS)}"
+        cell = rng.randrange(len(CELLS))
+        yield {
+            "nombre_completo": name,
+            "email": email,
+            "fecha_bautismo": day.strftime("%d/%m/%Y"),
+            "iglesia": rng.choice(CHURCHES),
+            "celula": CELLS[cell],
+            "lider": leaders[cell],
+        }
+
+
+def write_excel(path, records):
+    """
+    Guardar los registros en un Excel con las columnas de la hoja original.
+
+    :return: Número de filas escritas
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["nombre completo", "Fecha de bautizmo", "Email", "celula"])
+    rows = 0
+    for record in records:
+        sheet.append(
+            [
+                record["nombre_completo"],
+                record["fecha_bautismo"],
+                record["email"],
+                record["iglesia"],
+            ]
+        )
+        rows += 1
+    workbook.save(path)
+    return rows
+
+
+def load_database(db, records, batch=5000):
+    """
+    Insertar los registros en la base de datos por transacciones.
+
+    :return: Número de registros añadidos
+    """
+    added = 0
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= batch:
+            added += db.agregar_bautismos(chunk)
+            chunk = []
+    if chunk:
+        added += db.agregar_bautismos(chunk)
+    return added
+
+
+def make_template(path):
+    """
+    Crear una plantilla PDF que sirve a todos los métodos de relleno.
+
+    Tiene campos de formulario con los nombres de data/field_mapping.json y
+    las etiquetas "Certifico que:", "El día:" y "En la iglesia:".
+    """
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfgen import canvas
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    c = canvas.Canvas(path, pagesize=landscape(letter))
+    width, height = landscape(letter)
+    c.setFont("Helvetica-Bold", 28)
+    c.drawCentredString(width / 2, height - 90, "CERTIFICADO DE BAUTISMO")
+    c.setFont("Helvetica", 16)
+    y = height - 180
+    for label, field in zip(TEMPLATE_LABELS, TEMPLATE_FIELDS):
+        c.drawString(80, y, label)
+        c.acroForm.textfield(
+            name=field, x=220, y=y - 8, width=width - 320, height=26, borderWidth=0
+        )
+        y -= 90
+    c.save()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datos sintéticos de bautismos")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--future-ratio", type=float, default=0.0)
+    parser.add_argument("--excel", help="Guardar los registros en este Excel")
+    parser.add_argument("--db", help="Insertar los registros en esta base de datos")
+    parser.add_argument("--template", help="Crear también una plantilla PDF aquí")
+    args = parser.parse_args()
+
+    if not (args.excel or args.db or args.template):
+        parser.error("indique --excel, --db o --template")
+
+    def records():
+        return generate_records(args.count, args.seed, args.future_ratio)
+
+    if args.excel:
+        rows = write_excel(args.excel, records())
+        print(f"✅ {rows} filas guardadas en {args.excel}")
+    if args.db:
+        from services.database_service import DatabaseService
+
+        added = load_database(DatabaseService(args.db), records())
+        print(f"✅ {added} registros añadidos a {args.db}")
+    if args.template:
+        make_template(args.template)
+        print(f"✅ Plantilla creada: {args.template}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,25 @@ Esta versión permite usar la aplicación desde la línea de comandos
 sin necesidad de interfaz gráfica.
 """
 
+import argparse
+import json
 import os
+import signal
 import sys
-import pandas as pd
+import threading
 from datetime import datetime
 from services.database_service import DatabaseService
-from services.pdf_service import generate_certificate
-from services.mail_service import (
-    send_baptism_congratulations_email,
-    test_email_configuration,
-)
+from services.batch_processor import BatchProcessor
+from services.excel_reader import ExcelReader
+from services.excel_validation import ExcelValidator
+from services.mail_config import load_email_config
+from services.mail_service import MailSessionPool, test_email_configuration
+from services.log_config import configure_logging
+from services.metrics import BatchMetrics, MetricsExporter
+from services.profiling import StageProfiler, profile_dir
+from services.progress import ProgressTracker, format_bytes, format_duration
+from services.timings import timing_report
+from services.watcher import DatabaseWatcher, QuietHours
 
 
 def get_data_path():
@@ -39,28 +48,111 @@ def get_output_path():
     return os.path.join(base_path, "output")
 
 
-def validate_baptism_date(baptism_date_str):
-    """
-    Validate if baptism date has passed or is today.
+def make_processor(
+    db, email_config, args=None, template_path=None, output_path=None, **options
+):
+    """Batch processor configured from the command line options"""
+    return BatchProcessor(
+        db=db,
+        config=email_config,
+        template_path=template_path or os.path.join("data", "template.pdf"),
+        output_dir=output_path or get_output_path(),
+        workers=getattr(args, "workers", 2),
+        connections=getattr(args, "connections", None),
+        queue_size=getattr(args, "queue_size", 32),
+        profiler=getattr(args, "profiler", None),
+        metrics=getattr(args, "metrics", None),
+        **options,
+    )
 
-    :param baptism_date_str: Date in DD/MM/YYYY format
-    :return: True if date has passed or is today, False otherwise
-    """
-    try:
-        # Handle NaN values
-        if pd.isna(baptism_date_str):
-            return False
 
-        baptism_date = datetime.strptime(baptism_date_str, "%d/%m/%Y")
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+def progress_printer(get_stages=None, interval=2.0):
+    """Progress callback that prints rate and ETA every few seconds"""
+    tracker = ProgressTracker(interval)
+
+    def progress(stage, done, total):
+        if tracker.update(stage, done, total):
+            print(tracker.line(get_stages() if get_stages else None))
 
-        return baptism_date <= today
-    except Exception as e:
-        print(f"❌ Error validando fecha {baptism_date_str}: {e}")
-        return False
+    return progress
 
 
-def process_baptism_certificates():
+def write_json_summary(path, summary):
+    """Write a batch summary as JSON to a file, or to stdout with "-" """
+    if not path:
+        return
+    data = json.dumps(summary, ensure_ascii=False, indent=2, default=str)
+    if path == "-":
+        print(data)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data + "\n")
+    print(f"📄 Resumen guardado en {path}")
+
+
+def print_batch_summary(processor, summary, email_config):
+    """Print the totals and stage timings of a batch"""
+    print(
+        f"\n🖨️  {summary['generated']} certificados generados, "
+        f"{summary['skipped']} omitidos "
+        f"en {format_duration(summary['seconds'])} ({summary['per_second']:.1f}/s)"
+    )
+    if summary["records"]:
+        print(
+            f"📧 {summary['messages']} emails para {summary['records']} certificados: "
+            f"{summary['sent']} enviados, {summary['queued']} encolados, "
+            f"{summary['deferred']} para reintentar, {summary['failed']} fallidos"
+        )
+    elif summary["generated"] and not email_config.is_valid:
+        print(f"⚠️  {summary['generated']} emails sin enviar: configuración de email no válida")
+    if summary["bytes_written"] or summary["bytes_sent"]:
+        print(
+            f"💾 {format_bytes(summary['bytes_written'])} escritos, "
+            f"{format_bytes(summary['bytes_sent'])} enviados"
+        )
+    for line in processor.last_report:
+        print(line)
+
+
+def run_batch(
+    db,
+    records,
+    pdf_template,
+    output_path,
+    email_config,
+    args=None,
+    validate_dates=True,
+    skip_existing=True,
+    send=True,
+    total=None,
+    scope=None,
+):
+    """Generate certificates and send them as they are ready"""
+    processor = make_processor(
+        db,
+        email_config,
+        args,
+        template_path=pdf_template,
+        output_path=output_path,
+        validate_dates=validate_dates,
+        skip_existing=skip_existing,
+        progress=progress_printer(lambda: processor.stages),
+    )
+    summary = processor.generate(
+        records,
+        send=send,
+        resume=getattr(args, "resume", False),
+        total=total,
+        scope=scope,
+    )
+    if summary is None:
+        return None
+    print_batch_summary(processor, summary, email_config)
+    write_json_summary(getattr(args, "json_summary", None), summary)
+    return summary
+
+
+def process_baptism_certificates(email_config=None, args=None):
     """Main function to process baptism certificates"""
     print("🎯 Iniciando Certificador de Bautismos...")
 
@@ -81,80 +173,48 @@ def process_baptism_certificates():
         print(f"❌ Error: No se encontró la plantilla PDF en {pdf_template}")
         return
 
-    # Test email configuration
-    if not test_email_configuration():
+    # Load and test email configuration once for the whole run
+    email_config = email_config or load_email_config()
+    if not test_email_configuration(email_config):
         print(
             "⚠️  Configuración de email no válida. Los certificados se generarán pero no se enviarán emails."
         )
+        for error in email_config.errors:
+            print(f"   - {error}")
 
     # Create output directory if it doesn't exist
     os.makedirs(output_path, exist_ok=True)
 
+    # Rows are read one by one while earlier certificates are being rendered,
+    # and validated in blocks before they reach the PDF stage
+    print("📊 Leyendo datos del archivo Excel...")
+    validator = ExcelValidator()
+    records = validator.records(ExcelReader(excel_file))
+
     try:
-        # Read Excel file
-        print("📊 Leyendo datos del archivo Excel...")
-        df = pd.read_excel(excel_file)
-        print(f"✅ Datos leídos: {len(df)} registros encontrados")
-
-        # Process each row
-        for index, row in df.iterrows():
-            try:
-                # Extract data using correct column names
-                name = row["nombre completo"]
-                baptism_date = row["Fecha de bautizmo"]
-                email = row["Email"]
-                church_name = row.get(
-                    "celula", "Iglesia Default"
-                )  # Using 'celula' as church name
-
-                print(f"\n👤 Procesando: {name}")
-
-                # Skip if no baptism date
-                if pd.isna(baptism_date):
-                    print(f"📅 {name}: Sin fecha de bautismo, saltando...")
-                    continue
-
-                # Validate baptism date
-                if not validate_baptism_date(baptism_date):
-                    print(
-                        f"📅 {name}: Fecha de bautismo futura ({baptism_date}), saltando..."
-                    )
-                    continue
-
-                # Define output file path
-                safe_name = "".join(
-                    c for c in name if c.isalnum() or c in (" ", "-", "_")
-                ).rstrip()
-                certificate_filename = f"certificado_{safe_name}.pdf"
-                certificate_path = os.path.join(output_path, certificate_filename)
-
-                # Check if certificate already exists
-                if os.path.exists(certificate_path):
-                    print(f"📄 {name}: Certificado ya existe, saltando...")
-                    continue
-
-                # Generate certificate
-                print(f"🖨️  Generando PDF para {name}...")
-                if generate_certificate(
-                    name, baptism_date, church_name, pdf_template, certificate_path
-                ):
-                    # Send email
-                    print(f"📧 Enviando email a {email}...")
-                    send_baptism_congratulations_email(email, name, certificate_path)
-                else:
-                    print(f"❌ Error generando certificado para {name}")
-
-            except Exception as e:
-                print(f"❌ Error procesando registro {index}: {e}")
-                continue
-
-        print("\n✅ Proceso completado!")
-
-    except Exception as e:
+        # Dates were already checked by the validator
+        run_batch(
+            None, records, pdf_template, output_path, email_config, args,
+            validate_dates=False,
+        )
+    except (ImportError, ValueError) as e:
         print(f"❌ Error leyendo archivo Excel: {e}")
+        return
 
+    if validator.rejected:
+        print(f"🚫 {len(validator.rejected)} filas rechazadas:")
+        for reason, count in validator.reason_counts().items():
+            print(f"   - {reason}: {count}")
+    if validator.warnings:
+        print(f"⚠️  {len(validator.warnings)} filas con email inválido (no se envían)")
+    report = validator.save_report(os.path.join(output_path, "rechazos_excel.csv"))
+    if report:
+        print(f"📄 Detalle en {report}")
 
-def process_baptism_certificates_from_db():
+    print("\n✅ Proceso completado!")
+
+
+def process_baptism_certificates_from_db(email_config=None, args=None):
     """Process baptism certificates from SQLite database"""
     print("🎯 Procesando certificados desde base de datos SQLite...")
 
@@ -167,11 +227,14 @@ def process_baptism_certificates_from_db():
         print(f"❌ Error: No se encontró la plantilla PDF en {pdf_template}")
         return
 
-    # Test email configuration
-    if not test_email_configuration():
+    # Load and test email configuration once for the whole run
+    email_config = email_config or load_email_config()
+    if not test_email_configuration(email_config):
         print(
             "⚠️  Configuración de email no válida. Los certificados se generarán pero no se enviarán emails."
         )
+        for error in email_config.errors:
+            print(f"   - {error}")
 
     # Create output directory if it doesn't exist
     os.makedirs(output_path, exist_ok=True)
@@ -179,6 +242,12 @@ def process_baptism_certificates_from_db():
     # Initialize database
     db = DatabaseService()
     bautismos_pendientes = db.obtener_bautismos_pendientes()
+    if getattr(args, "resume", False):
+        # An interrupted run may have left certificates generated but unsent
+        pending_ids = {b["id"] for b in bautismos_pendientes}
+        bautismos_pendientes += [
+            b for b in db.obtener_emails_pendientes() if b["id"] not in pending_ids
+        ]
 
     if not bautismos_pendientes:
         print("✅ No hay certificados pendientes de generar")
@@ -186,65 +255,722 @@ def process_baptism_certificates_from_db():
 
     print(f"📊 Procesando {len(bautismos_pendientes)} certificados pendientes...")
 
-    # Process each baptism
-    for bautismo in bautismos_pendientes:
-        try:
-            name = bautismo["nombre_completo"]
-            baptism_date = bautismo["fecha_bautismo"]
-            email = bautismo["email"]
-            church_name = bautismo.get("iglesia", "Iglesia Default")
-
-            print(f"\n👤 Procesando: {name}")
-
-            # Validate baptism date
-            if not validate_baptism_date(baptism_date):
-                print(
-                    f"📅 {name}: Fecha de bautismo futura ({baptism_date}), saltando..."
-                )
-                continue
-
-            # Define output file path
-            safe_name = "".join(
-                c for c in name if c.isalnum() or c in (" ", "-", "_")
-            ).rstrip()
-            certificate_filename = f"certificado_{safe_name}.pdf"
-            certificate_path = os.path.join(output_path, certificate_filename)
-
-            # Check if certificate already exists
-            if os.path.exists(certificate_path):
-                print(f"📄 {name}: Certificado ya existe, saltando...")
-                continue
-
-            # Generate certificate
-            print(f"🖨️  Generando PDF para {name}...")
-            if generate_certificate(
-                name, baptism_date, church_name, pdf_template, certificate_path
-            ):
-                # Mark certificate as generated
-                db.marcar_certificado_generado(bautismo["id"])
-
-                # Send email
-                print(f"📧 Enviando email a {email}...")
-                if send_baptism_congratulations_email(email, name, certificate_path):
-                    db.marcar_email_enviado(bautismo["id"])
-                    print(f"✅ Email enviado exitosamente a {email}")
-                else:
-                    print(f"❌ Error enviando email a {email}")
-            else:
-                print(f"❌ Error generando certificado para {name}")
-
-        except Exception as e:
-            print(f"❌ Error procesando bautismo {bautismo.get('id', 'N/A')}: {e}")
-            continue
+    # PDFs are rendered while earlier emails are still being sent
+    run_batch(db, bautismos_pendientes, pdf_template, output_path, email_config, args)
 
     print("\n✅ Proceso completado!")
 
 
-def run_cli():
+def flush_email_spool(email_config, connections=None):
+    """Deliver every message queued in the spool directory"""
+    print(f"📤 Enviando emails en cola desde {email_config.spool_dir}...")
+    if not test_email_configuration(email_config):
+        print("❌ Configuración de email no válida:")
+        for error in email_config.errors:
+            print(f"   - {error}")
+        return
+
+    db = DatabaseService() if os.path.exists("bautismos.db") else None
+    processor = BatchProcessor(db=db, config=email_config, connections=connections)
+    summary = processor.flush_spool()
+    print(
+        f"\n✅ Cola procesada: {summary['sent']} enviados, "
+        f"{summary['deferred']} para reintentar, {summary['failed']} rechazados "
+        f"(de {summary['total']})"
+    )
+
+
+DB_PATH = "bautismos.db"
+
+
+def parse_date(value):
+    """Date option in YYYY-MM-DD or DD/MM/YYYY format, as YYYY-MM-DD"""
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"fecha inválida: {value} (use AAAA-MM-DD)")
+
+
+def parse_ids(value):
+    """Id list such as 1,4,10-20"""
+    ids = []
+    try:
+        for part in value.split(","):
+            part = part.strip()
+            if "-" in part:
+                first, last = part.split("-", 1)
+                ids.extend(range(int(first), int(last) + 1))
+            elif part:
+                ids.append(int(part))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ids inválidos: {value} (p. ej. 1,4,10-20)")
+    return ids
+
+
+def record_filters(args, estado=None):
+    """Filters for DatabaseService queries from the command line options"""
+    return {
+        "estado": estado,
+        "iglesia": getattr(args, "church", None),
+        "desde": getattr(args, "since", None),
+        "hasta": getattr(args, "until", None),
+        "ids": getattr(args, "ids", None),
+    }
+
+
+def describe_filters(filters, limit=None):
+    """Filters as text, also used as the scope of a resumable run"""
+    parts = [f"{key}={value}" for key, value in filters.items() if value]
+    if limit:
+        parts.append(f"limit={limit}")
+    return ", ".join(parts)
+
+
+def open_database():
+    """Open the SQLite database, or None if it does not exist yet"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ No se encontró la base de datos {DB_PATH}")
+        print("💡 Para crearla desde un Excel, ejecuta: python main.py import <archivo.xlsx>")
+        return None
+    return DatabaseService(DB_PATH)
+
+
+def print_dry_run(db, filters, limit, action):
+    """Show which records a command would process, without touching them"""
+    count = db.contar_bautismos(**filters)
+    if limit is not None:
+        count = min(count, limit)
+    print(f"🔎 Simulación: se {action} {count} registros")
+    sample = db.buscar_bautismos(limit=min(count, 10), **filters) if count else []
+    for record in sample:
+        print(
+            f"   #{record['id']} {record['nombre_completo']} "
+            f"({record['fecha_bautismo']}, {record['iglesia'] or 'sin iglesia'})"
+        )
+    if count > len(sample):
+        print(f"   ... y {count - len(sample)} más")
+
+
+def command_generate(args, email_config):
+    """generate: render (and send) the pending certificates that match the filters"""
+    db = open_database()
+    if db is None:
+        return 1
+    estado = "sin_terminar" if args.resume else "pendientes"
+    filters = record_filters(args, estado)
+    if args.dry_run:
+        print_dry_run(db, filters, args.limit, "generarían")
+        return 0
+
+    send = not args.no_send
+    if send and not test_email_configuration(email_config):
+        print("⚠️  Configuración de email no válida: solo se generarán los certificados")
+    total = db.contar_bautismos(**filters)
+    if args.limit is not None:
+        total = min(total, args.limit)
+    if not total:
+        print("✅ No hay certificados pendientes que coincidan")
+        return 0
+    print(f"📊 Procesando {total} certificados...")
+
+    # Pages are read while earlier certificates are rendered and sent
+    records = db.iterar_bautismos(limit=args.limit, **filters)
+    summary = run_batch(
+        db,
+        records,
+        os.path.join("data", "template.pdf"),
+        get_output_path(),
+        email_config,
+        args,
+        send=send,
+        total=total,
+        scope=describe_filters(record_filters(args), args.limit),
+    )
+    return 0 if summary is not None and not summary["failed"] else 1
+
+
+def command_send(args, email_config):
+    """send: email the generated certificates that have not been sent"""
+    db = open_database()
+    if db is None:
+        return 1
+    filters = record_filters(args, "por_enviar")
+    if args.dry_run:
+        print_dry_run(db, filters, args.limit, "enviarían")
+        return 0
+    if not test_email_configuration(email_config):
+        print("❌ Configuración de email no válida:")
+        for error in email_config.errors:
+            print(f"   - {error}")
+        return 1
+
+    records = db.buscar_bautismos(limit=args.limit, **filters)
+    if not records:
+        print("✅ No hay emails pendientes que coincidan")
+        return 0
+    print(f"📧 Enviando {len(records)} certificados...")
+    processor = make_processor(db, email_config, args, progress=progress_printer())
+    summary = processor.send(records)
+    print(
+        f"\n📧 {summary['messages']} emails para {summary['records']} certificados: "
+        f"{summary['sent']} enviados, {summary['queued']} encolados, "
+        f"{summary['deferred']} para reintentar, {summary['failed']} fallidos"
+    )
+    if summary["missing"]:
+        print(f"⚠️  {summary['missing']} certificados no se encontraron en disco")
+    write_json_summary(getattr(args, "json_summary", None), summary)
+    return 0 if not summary["failed"] else 1
+
+
+def command_regenerate(args, email_config):
+    """regenerate: render again the certificates that match the filters"""
+    db = open_database()
+    if db is None:
+        return 1
+    filters = record_filters(args)
+    if not any(filters.values()):
+        print("❌ Indique qué regenerar: --ids, --church, --since o --until")
+        return 2
+    if args.dry_run:
+        print_dry_run(db, filters, args.limit, "regenerarían")
+        return 0
+
+    records = db.buscar_bautismos(limit=args.limit, **filters)
+    if not records:
+        print("✅ No hay certificados que coincidan")
+        return 0
+    db.regenerar_certificados([record["id"] for record in records])
+    print(f"🔄 Regenerando {len(records)} certificados...")
+    summary = run_batch(
+        db,
+        records,
+        os.path.join("data", "template.pdf"),
+        get_output_path(),
+        email_config,
+        args,
+        skip_existing=False,
+        send=args.send,
+    )
+    return 0 if summary is not None and not summary["failed"] else 1
+
+
+def command_import(args, email_config):
+    """import: add the rows of an Excel sheet to the database"""
+    if not os.path.exists(args.path):
+        print(f"❌ Error: No se encontró el archivo Excel en {args.path}")
+        return 1
+
+    # Future dates are allowed: they are checked again when generating
+    validator = ExcelValidator(allow_future=True)
+    db = None if args.dry_run else DatabaseService(DB_PATH)
+    added = 0
+    try:
+        chunk = []
+        for record in validator.records(ExcelReader(args.path)):
+            chunk.append(record)
+            if len(chunk) >= validator.chunk_size:
+                added += db.agregar_bautismos(chunk) if db else 0
+                chunk = []
+        if chunk and db:
+            added += db.agregar_bautismos(chunk)
+    except (ImportError, ValueError) as e:
+        print(f"❌ Error leyendo archivo Excel: {e}")
+        return 1
+
+    if args.dry_run:
+        print(f"🔎 Simulación: {validator.accepted} filas válidas para importar")
+    else:
+        print(
+            f"✅ {added} registros importados "
+            f"({validator.accepted - added} ya estaban en la base de datos)"
+        )
+    if validator.rejected:
+        print(f"🚫 {len(validator.rejected)} filas rechazadas:")
+        for reason, count in validator.reason_counts().items():
+            print(f"   - {reason}: {count}")
+    report = validator.save_report(
+        os.path.join(get_output_path(), "rechazos_importacion.csv")
+    )
+    if report:
+        print(f"📄 Detalle en {report}")
+    return 0
+
+
+def command_export(args, email_config):
+    """export: write the records that match the filters to an Excel file"""
+    db = open_database()
+    if db is None:
+        return 1
+    filters = record_filters(args)
+    if args.dry_run:
+        print_dry_run(db, filters, None, "exportarían")
+        return 0
+    if not db.exportar_a_excel(args.path, **filters):
+        return 1
+    print(f"✅ {db.contar_bautismos(**filters)} registros exportados a {args.path}")
+    return 0
+
+
+def format_latency(seconds):
+    """Latency as milliseconds, or seconds from one second up"""
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    return f"{seconds * 1000:.0f}ms"
+
+
+def print_timing_table(rows, indent="   "):
+    """Percentile table of a timing_report, one line per stage"""
+    print(f"{indent}{'etapa':<14} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}")
+    for row in rows:
+        errors = f"  ({row['errores']} con error)" if row["errores"] else ""
+        print(
+            f"{indent}{row['etapa']:<14} {row['count']:>7} "
+            f"{format_latency(row['p50']):>8} {format_latency(row['p95']):>8} "
+            f"{format_latency(row['p99']):>8} {format_latency(row['max']):>8}{errors}"
+        )
+
+
+def print_timings(db, filters, run, slowest=10):
+    """Per-stage latency percentiles, per church and per template, and the slowest steps"""
+    if run == "all":
+        run_id = None
+    elif run is None:
+        run_id = db.ultimo_run_con_eventos()
+        if run_id is None:
+            print("ℹ️  Todavía no hay tiempos registrados: se guardan al procesar un lote")
+            return
+    else:
+        run_id = int(run)
+
+    events = db.obtener_eventos(run_id=run_id, **filters)
+    scope = f"ejecución {run_id}" if run_id is not None else "todas las ejecuciones"
+    if any(filters.values()):
+        scope += f", {describe_filters(filters)}"
+    if not events:
+        print(f"ℹ️  No hay tiempos registrados ({scope})")
+        return
+
+    print(f"\n⏱️  Tiempos por etapa ({scope}, {len(events)} eventos):")
+    print_timing_table(timing_report(events))
+
+    for by, title in (("iglesia", "⛪ Por iglesia"), ("plantilla", "📄 Por plantilla")):
+        report = timing_report(events, by=by)
+        groups = list(dict.fromkeys(row["grupo"] for row in report))
+        if len(groups) < 2:
+            continue
+        print(f"\n{title}:")
+        for group in groups:
+            print(f"   {group}:")
+            print_timing_table(
+                [row for row in report if row["grupo"] == group], indent="      "
+            )
+
+    if slowest:
+        print("\n🐢 Pasos más lentos:")
+        for event in events[:slowest]:
+            record = (
+                f"#{event['bautismo_id']} {event['nombre_completo'] or ''}".strip()
+                if event["bautismo_id"] is not None
+                else "(sin registro)"
+            )
+            print(
+                f"   {format_latency(event['duracion']):>8}  {event['etapa']:<14} "
+                f"{record} [{event['resultado']}]"
+            )
+
+
+def command_stats(args, email_config):
+    """stats: totals for the records that match the filters, per church"""
+    db = open_database()
+    if db is None:
+        return 1
+    filters = record_filters(args)
+    if args.timings:
+        print_timings(db, filters, args.run, args.slowest)
+        return 0
+    stats = db.obtener_estadisticas(**filters)
+    print(f"📊 Estadísticas{' (' + describe_filters(filters) + ')' if any(filters.values()) else ''}:")
+    print(f"   Total registros: {stats['total']}")
+    print(f"   Pendientes: {stats['pendientes']}")
+    print(f"   Completados: {stats['completados']}")
+    print(f"   Emails enviados: {stats['emails_enviados']}")
+    if stats["emails_rechazados"]:
+        print(f"   Emails rechazados: {stats['emails_rechazados']}")
+
+    churches = db.estadisticas_por_iglesia(**filters)
+    if len(churches) > 1:
+        print("\n⛪ Por iglesia:")
+        for church in churches:
+            print(
+                f"   {church['iglesia']}: {church['total']} registros, "
+                f"{church['pendientes']} pendientes, "
+                f"{church['emails_enviados']} emails enviados"
+            )
+    return 0
+
+
+def command_watch(args, email_config):
+    """watch: keep running and process new or changed records as they appear"""
+    db = open_database()
+    if db is None:
+        return 1
+    try:
+        quiet_hours = QuietHours.parse(args.quiet_hours) if args.quiet_hours else None
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    send = not args.no_send
+    if send and not test_email_configuration(email_config):
+        print("⚠️  Configuración de email no válida: solo se generarán los certificados")
+
+    # SMTP connections stay open between cycles while they are in use
+    pool = MailSessionPool(max_idle=args.smtp_idle)
+    processor = make_processor(
+        db,
+        email_config,
+        args,
+        validate_dates=True,
+        skip_existing=True,
+        session_factory=pool,
+    )
+    watcher = DatabaseWatcher(
+        db,
+        processor,
+        interval=args.interval,
+        quiet_hours=quiet_hours,
+        retry_every=args.retry_every * 60,
+        send=send,
+        session_pool=pool,
+    )
+    if threading.current_thread() is threading.main_thread():
+        # systemd and similar stop services with SIGTERM
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    print(
+        f"👀 Vigilando {DB_PATH} cada {args.interval:g}s"
+        + (f", en silencio {quiet_hours}" if quiet_hours else "")
+        + " (Ctrl+C para salir)"
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    print(f"\n👋 Servicio detenido después de {watcher.cycles} lotes")
+    return 0
+
+
+COMMANDS = {
+    "generate": command_generate,
+    "send": command_send,
+    "regenerate": command_regenerate,
+    "import": command_import,
+    "export": command_export,
+    "stats": command_stats,
+    "watch": command_watch,
+}
+
+
+def add_batch_arguments(parser, suppress=False):
+    """Options for the generation and sending stages"""
+
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    parser.add_argument(
+        "--spool",
+        action="store_true",
+        default=default(False),
+        help="Encolar los emails en disco en lugar de enviarlos",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=default(None),
+        help="Conexiones SMTP por dominio (por defecto según el proveedor)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=default(2),
+        help="Hilos de generación de PDF (por defecto 2)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=default(32),
+        help="Capacidad de las colas entre generación y envío (por defecto 32)",
+    )
+    parser.add_argument(
+        "--json-summary",
+        metavar="ARCHIVO",
+        default=default(None),
+        help="Guardar el resumen del lote (ritmo, p50/p95, bytes) en JSON; - para la salida estándar",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=default(False),
+        help="Perfilar cada etapa del lote (.pstats y stacks.collapsed)",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        metavar="CARPETA",
+        default=default(None),
+        help="Perfilar y guardar los perfiles en esta carpeta "
+        "(con --profile, por defecto una nueva en output/perfiles/)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=default(15),
+        help="Funciones a mostrar por etapa al perfilar (por defecto 15)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="ARCHIVO",
+        default=default(None),
+        help="Escribir métricas de Prometheus en este archivo .prom para el "
+        "textfile collector de node_exporter (o METRICS_FILE)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=default(15.0),
+        help="Segundos entre escrituras del archivo de métricas (por defecto 15)",
+    )
+
+
+def add_filter_arguments(parser, limit=True, dry_run=True):
+    """Options that select which records a subcommand works on"""
+    parser.add_argument("--church", help="Solo los registros de esta iglesia")
+    parser.add_argument(
+        "--since", type=parse_date, help="Fecha de bautismo desde (AAAA-MM-DD)"
+    )
+    parser.add_argument(
+        "--until", type=parse_date, help="Fecha de bautismo hasta (AAAA-MM-DD)"
+    )
+    parser.add_argument("--ids", type=parse_ids, help="Ids de registros, p. ej. 1,4,10-20")
+    if limit:
+        parser.add_argument("--limit", type=int, help="Máximo de registros a procesar")
+    if dry_run:
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Mostrar qué se haría sin generar, enviar ni escribir nada",
+        )
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Certificador de Bautismos (CLI)")
+    add_batch_arguments(parser)
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        "-v",
+        "--verbose",
+        action="store_const",
+        const="DEBUG",
+        dest="log_level",
+        help="Mostrar el detalle de cada certificado y email",
+    )
+    verbosity.add_argument(
+        "-q",
+        "--quiet",
+        action="store_const",
+        const="WARNING",
+        dest="log_level",
+        help="Mostrar solo avisos y errores de los servicios",
+    )
+    verbosity.add_argument(
+        "--log-level",
+        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+        type=str.upper,
+        help="Nivel de los mensajes en la consola (por defecto INFO, o LOG_LEVEL)",
+    )
+    parser.add_argument(
+        "--log-file",
+        metavar="ARCHIVO",
+        help="Guardar todos los mensajes como JSON por línea (o LOG_FILE)",
+    )
+    parser.add_argument(
+        "--flush-spool",
+        action="store_true",
+        help="Enviar los emails encolados y salir",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continuar la última ejecución interrumpida desde su punto de control",
+    )
+
+    # Batch options may also follow the subcommand; SUPPRESS keeps the
+    # subparser from overwriting a value given before it
+    batch = argparse.ArgumentParser(add_help=False)
+    add_batch_arguments(batch, argparse.SUPPRESS)
+
+    commands = parser.add_subparsers(dest="command", metavar="comando")
+    generate = commands.add_parser(
+        "generate", parents=[batch], help="Generar y enviar certificados pendientes"
+    )
+    add_filter_arguments(generate)
+    generate.add_argument(
+        "--no-send", action="store_true", help="Solo generar, sin enviar emails"
+    )
+    generate.add_argument(
+        "--resume",
+        action="store_true",
+        default=argparse.SUPPRESS,
+        help="Continuar la última ejecución interrumpida",
+    )
+
+    send = commands.add_parser(
+        "send", parents=[batch], help="Enviar los certificados ya generados"
+    )
+    add_filter_arguments(send)
+
+    regenerate = commands.add_parser(
+        "regenerate", parents=[batch], help="Volver a generar certificados"
+    )
+    add_filter_arguments(regenerate)
+    regenerate.add_argument(
+        "--send", action="store_true", help="Reenviar los certificados regenerados"
+    )
+
+    import_ = commands.add_parser("import", help="Importar registros desde un Excel")
+    import_.add_argument("path", help="Archivo .xlsx")
+    import_.add_argument(
+        "--dry-run", action="store_true", help="Validar el archivo sin importar nada"
+    )
+
+    export = commands.add_parser("export", help="Exportar registros a un Excel")
+    export.add_argument("path", help="Archivo .xlsx de destino")
+    add_filter_arguments(export, limit=False)
+
+    watch = commands.add_parser(
+        "watch", parents=[batch], help="Procesar registros nuevos de forma continua"
+    )
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        help="Segundos entre comprobaciones (por defecto 10)",
+    )
+    watch.add_argument(
+        "--quiet-hours", help="Horario sin generar ni enviar, p. ej. 22-7"
+    )
+    watch.add_argument(
+        "--retry-every",
+        type=float,
+        default=60.0,
+        help="Minutos entre revisiones de todos los pendientes (por defecto 60)",
+    )
+    watch.add_argument(
+        "--smtp-idle",
+        type=float,
+        default=60.0,
+        help="Segundos que una conexión SMTP sin uso sigue abierta (por defecto 60)",
+    )
+    watch.add_argument(
+        "--no-send", action="store_true", help="Solo generar, sin enviar emails"
+    )
+
+    stats = commands.add_parser("stats", help="Mostrar estadísticas")
+    add_filter_arguments(stats, limit=False, dry_run=False)
+    stats.add_argument(
+        "--timings",
+        action="store_true",
+        help="Percentiles del tiempo de cada etapa, por iglesia y por plantilla",
+    )
+    stats.add_argument(
+        "--run",
+        help="Ejecución cuyos tiempos mostrar (por defecto la última; all para todas)",
+    )
+    stats.add_argument(
+        "--slowest",
+        type=int,
+        default=10,
+        help="Pasos más lentos a listar con --timings (por defecto 10)",
+    )
+
+    return parser.parse_args(argv)
+
+
+def start_profiler(args):
+    """Start profiling batch stages if --profile or --profile-dir was given"""
+    if not (args.profile or args.profile_dir):
+        return None
+    output_dir = args.profile_dir or profile_dir(get_output_path())
+    print(f"🔬 Perfilando las etapas del lote en {output_dir}")
+    args.profiler = StageProfiler(output_dir).start()
+    return args.profiler
+
+
+def finish_profiler(profiler, top=15):
+    """Write the profiles and print the hotspots of each stage"""
+    files = profiler.stop()
+    if not files:
+        print("\n🔬 No se perfiló ninguna etapa")
+        return
+    print("\n🔬 Puntos calientes por etapa (tiempo propio):")
+    for line in profiler.report(top):
+        print(line)
+    print(f"📁 Perfiles guardados en {profiler.output_dir}:")
+    for path in files:
+        print(f"   {os.path.basename(path)}")
+    print("💡 python -m pstats <archivo>.pstats, o flamegraph.pl stacks.collapsed")
+
+
+def start_metrics(args):
+    """Start writing Prometheus metrics if --metrics-file (or METRICS_FILE) was given"""
+    path = args.metrics_file or os.environ.get("METRICS_FILE")
+    if not path:
+        return None
+    db = DatabaseService(DB_PATH) if os.path.exists(DB_PATH) else None
+    args.metrics = BatchMetrics(db=db, spool_dir=load_email_config().spool_dir)
+    print(f"📈 Métricas en {path} cada {args.metrics_interval:g}s")
+    return MetricsExporter(args.metrics, path, args.metrics_interval).start()
+
+
+def run_cli(argv=None):
     """Run the command line interface"""
+    args = parse_args(argv)
+    configure_logging(args.log_level, args.log_file)
+
     print("📋 Modo Línea de Comandos")
     print("=" * 40)
 
+    profiler = start_profiler(args)
+    exporter = start_metrics(args)
+    try:
+        return run_command(args)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        if profiler is not None:
+            finish_profiler(profiler, args.profile_top)
+
+
+def run_command(args):
+    """Run the subcommand, or the default batch, selected by args"""
+
+    email_config = load_email_config()
+    if args.spool:
+        email_config = email_config.replace(transport="spool")
+
+    if args.flush_spool:
+        flush_email_spool(email_config, connections=args.connections)
+        return
+
+    batch_command = args.command not in ("import", "export", "stats")
+    if email_config.transport == "spool" and batch_command:
+        print(f"📥 Modo cola: los emails se guardarán en {email_config.spool_dir}")
+        print("💡 Para enviarlos después, ejecuta: python main.py --flush-spool")
+        print()
+
+    if args.command:
+        return COMMANDS[args.command](args, email_config)
+
     # Check if we should use database or Excel
     if os.path.exists("bautismos.db"):
         print("🗄️  Base de datos SQLite detectada")
@@ -260,19 +986,21 @@ def run_cli():
         print(f"   Pendientes: {stats['pendientes']}")
         print(f"   Completados: {stats['completados']}")
         print(f"   Emails enviados: {stats['emails_enviados']}")
+        if stats["emails_rechazados"]:
+            print(f"   Emails rechazados: {stats['emails_rechazados']}")
         print()
 
         # Process pending certificates
-        if stats["pendientes"] > 0:
+        if stats["pendientes"] > 0 or args.resume:
             print(f"🔄 Procesando {stats['pendientes']} certificados pendientes...")
-            process_baptism_certificates_from_db()
+            process_baptism_certificates_from_db(email_config, args)
         else:
             print("✅ No hay certificados pendientes")
 
     else:
         print("📊 Modo Excel detectado")
         print("💡 Procesando archivo Excel...")
-        process_baptism_certificates()
+        process_baptism_certificates(email_config, args)
 
 
 if __name__ == "__main__":
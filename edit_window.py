@@ -7,7 +7,8 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
 import os
-from services.pdf_service import generate_certificate
+from services.batch_processor import BatchProcessor
+from services.mail_service import SendResult
 
 
 class EditBautismoWindow:
@@ -193,6 +194,16 @@ class EditBautismoWindow:
         else:
             self.email_status.set("⏳ Email: Pendiente")
 
+    def form_record(self):
+        """Record with the values currently shown in the form"""
+        return {
+            "id": self.bautismo_data["id"],
+            "nombre_completo": self.nombre_var.get().strip(),
+            "email": self.email_var.get().strip(),
+            "fecha_bautismo": self.fecha_var.get().strip(),
+            "iglesia": self.iglesia_var.get().strip(),
+        }
+
     def validar_datos(self):
         """Validate form data"""
         nombre = self.nombre_var.get().strip()
@@ -264,80 +275,24 @@ class EditBautismoWindow:
             return
 
         try:
-            # Mark certificate as not generated
-            self.db.regenerar_certificado(self.bautismo_data["id"])
-
-            # Generate new certificate
-            template_path = "data/template.pdf"
-            if not os.path.exists(template_path):
+            processor = BatchProcessor(db=self.db)
+            if not os.path.exists(processor.template_path):
                 messagebox.showerror(
-                    "Error", f"No se encontró la plantilla: {template_path}"
+                    "Error", f"No se encontró la plantilla: {processor.template_path}"
                 )
                 return
 
-            # Create output directory
-            os.makedirs("output", exist_ok=True)
-
-            # Generate certificate with unique filename to avoid conflicts
-            safe_name = "".join(
-                c
-                for c in self.nombre_var.get().strip()
-                if c.isalnum() or c in (" ", "-", "_")
-            ).rstrip()
-
-            # Add timestamp to avoid conflicts
-            import time
-
-            timestamp = int(time.time())
-            output_path = f"output/certificado_{safe_name}_{timestamp}.pdf"
-
-            # Remove old certificate if it exists
-            old_certificate_path = f"output/certificado_{safe_name}.pdf"
-            if os.path.exists(old_certificate_path):
-                try:
-                    os.remove(old_certificate_path)
-                    print(f"✅ Archivo anterior eliminado: {old_certificate_path}")
-                except Exception as e:
-                    print(f"⚠️  No se pudo eliminar archivo anterior: {e}")
-
-            # Generate new certificate
+            # Regenerate with the values currently in the form
             print(f"🔄 Generando certificado para: {self.nombre_var.get().strip()}")
-            success = generate_certificate(
-                self.nombre_var.get().strip(),
-                self.fecha_var.get().strip(),
-                self.iglesia_var.get().strip() or "Iglesia Default",
-                template_path,
-                output_path,
-            )
+            output_path = processor.regenerate(self.form_record())
 
-            if success:
-                # Rename to standard filename
-                final_path = f"output/certificado_{safe_name}.pdf"
-                try:
-                    if os.path.exists(final_path):
-                        os.remove(final_path)
-                    os.rename(output_path, final_path)
-                    output_path = final_path
-                    print(f"✅ Archivo renombrado a: {final_path}")
-                except Exception as e:
-                    print(f"⚠️  No se pudo renombrar archivo: {e}")
-                    # Use the timestamped file if rename fails
-                    output_path = f"output/certificado_{safe_name}_{timestamp}.pdf"
-
-                # Verify the file was created successfully
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                    self.db.marcar_certificado_generado(self.bautismo_data["id"])
-                    messagebox.showinfo(
-                        "Éxito", f"Certificado regenerado exitosamente:\n{output_path}"
-                    )
-                    self.load_data()  # Refresh status
-                    if hasattr(self.parent, "load_bautismos"):
-                        self.parent.load_bautismos()
-                else:
-                    messagebox.showerror(
-                        "Error",
-                        "El certificado se generó pero el archivo está vacío o corrupto",
-                    )
+            if output_path:
+                messagebox.showinfo(
+                    "Éxito", f"Certificado regenerado exitosamente:\n{output_path}"
+                )
+                self.load_data()  # Refresh status
+                if hasattr(self.parent, "load_bautismos"):
+                    self.parent.load_bautismos()
             else:
                 messagebox.showerror(
                     "Error",
@@ -356,36 +311,37 @@ class EditBautismoWindow:
             return
 
         try:
-            from services.mail_service import send_baptism_congratulations_email
+            processor = BatchProcessor(db=self.db)
+            record = self.form_record()
 
             # Check if certificate exists
-            safe_name = "".join(
-                c
-                for c in self.nombre_var.get().strip()
-                if c.isalnum() or c in (" ", "-", "_")
-            ).rstrip()
-            certificate_path = f"output/certificado_{safe_name}.pdf"
-
-            if not os.path.exists(certificate_path):
+            if not os.path.exists(processor.certificate_path(record)):
                 messagebox.showerror(
                     "Error",
                     "No se encontró el certificado. Regenera el certificado primero.",
                 )
                 return
 
-            # Send email
-            if send_baptism_congratulations_email(
-                self.email_var.get().strip(),
-                self.nombre_var.get().strip(),
-                certificate_path,
-            ):
-                self.db.marcar_email_enviado(self.bautismo_data["id"])
-                messagebox.showinfo("Éxito", "Email reenviado correctamente")
+            # Send email (or queue it in spool mode)
+            result = processor.resend(record)
+            if result:
+                if processor.config.transport == "spool":
+                    messagebox.showinfo("Éxito", "Email encolado correctamente")
+                else:
+                    messagebox.showinfo("Éxito", "Email reenviado correctamente")
                 self.load_data()  # Refresh status
                 if hasattr(self.parent, "load_bautismos"):
                     self.parent.load_bautismos()
+            elif result.status == SendResult.PERMANENT:
+                messagebox.showerror(
+                    "Error",
+                    "El servidor rechazó la dirección de forma permanente:\n"
+                    f"{result.message}\n\nCorrige el email y guarda los cambios.",
+                )
             else:
-                messagebox.showerror("Error", "No se pudo enviar el email")
+                messagebox.showerror(
+                    "Error", f"No se pudo enviar el email:\n{result.message}"
+                )
 
         except Exception as e:
             messagebox.showerror("Error", f"Error al reenviar email: {e}")
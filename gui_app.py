@@ -1,15 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
+import logging
 import os
-import threading
 from services.database_service import DatabaseService
-from services.pdf_service import generate_certificate
+from services.mail_config import load_email_config
 from services.mail_service import (
-    send_baptism_congratulations_email,
     test_email_configuration,
     test_email_connection,
 )
+from services.batch_processor import BatchProcessor
+from services.log_config import LOGGER_NAME, configure_logging
+from services.profiling import StageProfiler, profile_dir
+from services.jobs import JobManager
+from services.ui_queue import UIQueue
+from record_list import RecordList
+
+# Under the services logger, so configure_logging handles it too
+logger = logging.getLogger(f"{LOGGER_NAME}.gui")
+
+# Interval between two UI queue drains (about 20 frames per second)
+UI_FRAME_MS = 50
+# Interval between two reads of the database change log
+CHANGES_MS = 1000
+# Interval between two refreshes of the jobs panel
+JOBS_MS = 500
 
 
 def check_excel_dependencies():
@@ -25,14 +40,27 @@ def check_excel_dependencies():
 
 class BautismoApp:
     def __init__(self):
+        # Services log to the console; LOG_LEVEL and LOG_FILE adjust it
+        configure_logging()
+
         self.root = tk.Tk()
         self.root.title("Certificador de Bautismos")
-        self.root.geometry("900x700")
+        self.root.geometry("900x800")
         self.root.resizable(True, True)
 
         # Initialize database
         self.db = DatabaseService()
 
+        # Worker threads never touch Tk: they post to this queue instead
+        self.ui = UIQueue()
+
+        # Generation, sending and spool delivery run as background jobs
+        self.jobs = JobManager(
+            on_change=lambda job: self.ui.update("jobs", self.show_jobs)
+        )
+        # Copy of the profile checkbox that worker threads can read
+        self.profile_batches = False
+
         # Create main container
         self.main_frame = ttk.Frame(self.root, padding="10")
         self.main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -43,9 +71,15 @@ class BautismoApp:
         self.main_frame.columnconfigure(1, weight=1)
         self.main_frame.rowconfigure(2, weight=1)
 
+        # Last change log entry shown; later ones are applied row by row
+        self.change_id = self.db.ultimo_cambio_vista()
+
         self.create_widgets()
         self.load_bautismos()
         self.update_stats()
+        self.root.after(UI_FRAME_MS, self.poll_ui)
+        self.root.after(CHANGES_MS, self.poll_changes)
+        self.root.after(JOBS_MS, self.poll_jobs)
 
     def create_widgets(self):
         """Create all GUI widgets"""
@@ -157,6 +191,21 @@ class BautismoApp:
         ttk.Button(
             action_frame, text="📧 Enviar Emails", command=self.enviar_emails_threaded
         ).pack(fill=tk.X, pady=2)
+        ttk.Button(
+            action_frame,
+            text="🚀 Generar y Enviar",
+            command=self.generar_y_enviar_threaded,
+        ).pack(fill=tk.X, pady=2)
+        ttk.Button(
+            action_frame, text="📤 Enviar Cola", command=self.enviar_cola_threaded
+        ).pack(fill=tk.X, pady=2)
+        self.profile_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            action_frame,
+            text="🔬 Perfilar lote",
+            variable=self.profile_var,
+            command=self.toggle_profile,
+        ).pack(fill=tk.X, pady=2)
         ttk.Button(
             action_frame, text="🔧 Probar Email", command=self.probar_email
         ).pack(fill=tk.X, pady=2)
@@ -182,42 +231,46 @@ class BautismoApp:
             row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0)
         )
 
-        # Create Treeview
-        columns = ("ID", "Nombre", "Email", "Fecha", "Iglesia", "Certificado", "Email")
-        self.tree = ttk.Treeview(
-            list_frame, columns=columns, show="headings", height=10
-        )
-
-        # Define headings
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Nombre", text="Nombre")
-        self.tree.heading("Email", text="Email")
-        self.tree.heading("Fecha", text="Fecha Bautismo")
-        self.tree.heading("Iglesia", text="Iglesia")
-        self.tree.heading("Certificado", text="Certificado")
-        self.tree.heading("Email", text="Email Enviado")
+        # Only the rows on screen are read from the database
+        self.records = RecordList(list_frame, self.db)
+        self.records.pack(fill=tk.BOTH, expand=True)
 
-        # Define columns
-        self.tree.column("ID", width=50)
-        self.tree.column("Nombre", width=150)
-        self.tree.column("Email", width=150)
-        self.tree.column("Fecha", width=100)
-        self.tree.column("Iglesia", width=100)
-        self.tree.column("Certificado", width=80)
-        self.tree.column("Email", width=80)
+        # Bind double click to edit
+        self.records.bind("<Double-1>", self.editar_bautismo)
 
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(
-            list_frame, orient=tk.VERTICAL, command=self.tree.yview
+        # Jobs panel
+        jobs_frame = ttk.LabelFrame(
+            self.main_frame, text="⚙️ Trabajos", padding="10"
+        )
+        jobs_frame.grid(
+            row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0)
         )
-        self.tree.configure(yscrollcommand=scrollbar.set)
-
-        # Pack tree and scrollbar
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        # Bind double click to edit
-        self.tree.bind("<Double-1>", self.editar_bautismo)
+        self.jobs_tree = ttk.Treeview(
+            jobs_frame,
+            columns=("trabajo", "estado", "progreso"),
+            show="headings",
+            height=4,
+        )
+        self.jobs_tree.heading("trabajo", text="Trabajo")
+        self.jobs_tree.heading("estado", text="Estado")
+        self.jobs_tree.heading("progreso", text="Progreso")
+        self.jobs_tree.column("trabajo", width=170)
+        self.jobs_tree.column("estado", width=90)
+        self.jobs_tree.column("progreso", width=450)
+        self.jobs_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        jobs_buttons = ttk.Frame(jobs_frame)
+        jobs_buttons.pack(side=tk.RIGHT, fill=tk.Y, padx=(10, 0))
+        ttk.Button(jobs_buttons, text="⏸️ Pausar", command=self.pausar_trabajo).pack(
+            fill=tk.X, pady=2
+        )
+        ttk.Button(
+            jobs_buttons, text="▶️ Reanudar", command=self.reanudar_trabajo
+        ).pack(fill=tk.X, pady=2)
+        ttk.Button(
+            jobs_buttons, text="⏹️ Cancelar", command=self.cancelar_proceso
+        ).pack(fill=tk.X, pady=2)
 
     def guardar_bautismo(self):
         """Save new baptism record"""
@@ -244,8 +297,7 @@ class BautismoApp:
         if self.db.agregar_bautismo(nombre, email, fecha, iglesia, celula, lider):
             messagebox.showinfo("Éxito", "Bautismo registrado correctamente")
             self.limpiar_formulario()
-            self.load_bautismos()
-            self.update_stats()
+            self.apply_changes()
         else:
             messagebox.showerror("Error", "Error al guardar el bautismo")
 
@@ -260,35 +312,40 @@ class BautismoApp:
         self.nombre_entry.focus()
 
     def load_bautismos(self):
-        """Load baptism records into treeview"""
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        # Load from database
-        bautismos = self.db.obtener_bautismos()
-        for bautismo in bautismos:
-            certificado = "✅" if bautismo["certificado_generado"] else "❌"
-            email = "✅" if bautismo["email_enviado"] else "❌"
-
-            self.tree.insert(
-                "",
-                "end",
-                values=(
-                    bautismo["id"],
-                    bautismo["nombre_completo"],
-                    bautismo["email"],
-                    bautismo["fecha_bautismo"],
-                    bautismo["iglesia"] or "",
-                    certificado,
-                    email,
-                ),
-            )
+        """Reload the records shown in the list"""
+        self.records.refresh()
+
+    def apply_changes(self):
+        """Show what changed in the database since the last refresh"""
+        cambios = self.db.obtener_cambios_vista(self.change_id)
+        if cambios is None:
+            # Too many changes to replay one by one
+            self.change_id = self.db.ultimo_cambio_vista()
+            self.load_bautismos()
+            self.update_stats()
+            return
+        if cambios["ultimo"] == self.change_id:
+            return
+        self.change_id = cambios["ultimo"]
+        self.records.apply_changes(cambios)
+        for key, delta in cambios["estadisticas"].items():
+            self.stats[key] += delta
+        self.stats["completados"] = self.stats["total"] - self.stats["pendientes"]
+        self.show_stats()
+
+    def poll_changes(self):
+        """Apply changes made by batches, the edit window or other programs"""
+        self.apply_changes()
+        self.root.after(CHANGES_MS, self.poll_changes)
 
     def update_stats(self):
         """Update statistics display"""
-        stats = self.db.obtener_estadisticas()
+        self.stats = self.db.obtener_estadisticas()
+        self.show_stats()
 
+    def show_stats(self):
+        """Draw the statistics in self.stats"""
+        stats = self.stats
         stats_text = f"""
 📊 ESTADÍSTICAS
 
@@ -296,6 +353,7 @@ class BautismoApp:
 📄 Certificados pendientes: {stats['pendientes']}
 ✅ Certificados completados: {stats['completados']}
 📧 Emails enviados: {stats['emails_enviados']}
+⛔ Emails rechazados: {stats['emails_rechazados']}
         """
 
         self.stats_text.config(state=tk.NORMAL)
@@ -305,11 +363,8 @@ class BautismoApp:
 
     def editar_bautismo(self, event):
         """Edit baptism record"""
-        selection = self.tree.selection()
-        if selection:
-            item = self.tree.item(selection[0])
-            bautismo_id = item["values"][0]
-
+        bautismo_id = self.records.selected_record_id()
+        if bautismo_id is not None:
             # Get baptism data from database
             bautismo_data = self.db.obtener_bautismo_por_id(bautismo_id)
 
@@ -334,11 +389,8 @@ class BautismoApp:
 
     def editar_seleccionado(self):
         """Edit selected baptism record (button click)"""
-        selection = self.tree.selection()
-        if selection:
-            item = self.tree.item(selection[0])
-            bautismo_id = item["values"][0]
-
+        bautismo_id = self.records.selected_record_id()
+        if bautismo_id is not None:
             # Get baptism data from database
             bautismo_data = self.db.obtener_bautismo_por_id(bautismo_id)
 
@@ -361,165 +413,331 @@ class BautismoApp:
                 "Advertencia", "Por favor selecciona un bautismo para editar"
             )
 
+    def poll_ui(self):
+        """Run what the worker threads posted since the last frame"""
+        self.ui.process()
+        self.root.after(UI_FRAME_MS, self.poll_ui)
+
+    def set_status(self, text):
+        """Show text in the status line; safe from any thread"""
+        # Only the latest status of each frame is drawn
+        self.ui.update("status", self.progress_var.set, text)
+
+    def start_job(self, kind, title, target, *args):
+        """Start a background job unless one of the same kind is running"""
+        job = self.jobs.start(kind, title, target, *args)
+        if job is None:
+            messagebox.showinfo("Info", f"Ya hay un trabajo de {kind} en curso")
+        return job
+
+    def report(self, job, text):
+        """Show text in the status line and as the job's last message"""
+        job.message = text
+        self.set_status(text)
+
+    def selected_jobs(self):
+        """Jobs selected in the panel, or every running job"""
+        jobs = [self.jobs.get(int(iid)) for iid in self.jobs_tree.selection()]
+        return [job for job in jobs if job is not None] or self.jobs.active()
+
+    def cancelar_proceso(self):
+        """Stop the selected jobs (or all) after the items in progress"""
+        jobs = [job for job in self.selected_jobs() if job.active]
+        for job in jobs:
+            job.cancel()
+        if jobs:
+            self.set_status("⏹️ Cancelando...")
+
+    def pausar_trabajo(self):
+        """Pause the selected jobs (or all) after the items in progress"""
+        for job in self.selected_jobs():
+            job.pause()
+
+    def reanudar_trabajo(self):
+        """Resume the selected paused jobs (or all)"""
+        for job in self.selected_jobs():
+            job.resume()
+
+    def show_jobs(self):
+        """Draw the state and progress of each job in the panel"""
+        jobs = list(self.jobs.jobs)
+        shown = {str(job.id) for job in jobs}
+        for iid in self.jobs_tree.get_children():
+            if iid not in shown:
+                self.jobs_tree.delete(iid)
+        for job in jobs:
+            progreso = job.progress_text() if job.active else ""
+            values = (job.title, job.state, progreso or job.message)
+            if self.jobs_tree.exists(str(job.id)):
+                self.jobs_tree.item(str(job.id), values=values)
+            else:
+                self.jobs_tree.insert("", 0, iid=str(job.id), values=values)
+
+    def poll_jobs(self):
+        """Refresh throughput and ETA of the running jobs"""
+        self.show_jobs()
+        self.root.after(JOBS_MS, self.poll_jobs)
+
+    def toggle_profile(self):
+        """Remember the profile checkbox outside Tk"""
+        self.profile_batches = self.profile_var.get()
+
+    def start_profiler(self):
+        """Profile the next batch if the checkbox is set"""
+        if not self.profile_batches:
+            return None
+        return StageProfiler(profile_dir()).start()
+
+    def finish_profiler(self, profiler):
+        """Write the profiles and return a line for the completion message"""
+        if profiler is None:
+            return ""
+        if not profiler.stop():
+            return ""
+        for line in profiler.report():
+            logger.info(line)
+        return f"\nPerfil guardado en {profiler.output_dir}"
+
     def generar_certificados_threaded(self):
-        """Generate certificates in a separate thread"""
-        thread = threading.Thread(target=self.generar_certificados)
-        thread.daemon = True
-        thread.start()
-
-    def generar_certificados(self):
-        """Generate certificates for pending baptisms"""
-        self.progress_var.set("🔄 Generando certificados...")
-        self.root.update()
+        """Generate certificates in a background job"""
+        self.start_job(
+            "generación",
+            "🖨️ Generar certificados",
+            self.procesar_certificados,
+            False,
+        )
 
-        bautismos_pendientes = self.db.obtener_bautismos_pendientes()
+    def generar_y_enviar_threaded(self):
+        """Generate and send certificates in a background job"""
+        self.start_job(
+            "generación", "🚀 Generar y enviar", self.procesar_certificados, True
+        )
+
+    def procesar_certificados(self, job, enviar=False):
+        """Generate pending certificates, optionally sending each as it is ready"""
+        self.report(job, "🔄 Generando certificados...")
+
+        # Records taken by another running job are left to it
+        bautismos_pendientes = job.claim(self.db.obtener_bautismos_pendientes())
 
         if not bautismos_pendientes:
-            self.progress_var.set("ℹ️ No hay certificados pendientes")
-            messagebox.showinfo("Info", "No hay certificados pendientes de generar")
+            self.report(job, "ℹ️ No hay certificados pendientes")
+            self.ui.call(
+                messagebox.showinfo, "Info", "No hay certificados pendientes de generar"
+            )
             return
 
         # Check if template exists
         template_path = "data/template.pdf"
         if not os.path.exists(template_path):
-            self.progress_var.set("❌ Plantilla no encontrada")
-            messagebox.showerror(
-                "Error", f"No se encontró la plantilla: {template_path}"
+            self.report(job, "❌ Plantilla no encontrada")
+            self.ui.call(
+                messagebox.showerror,
+                "Error",
+                f"No se encontró la plantilla: {template_path}",
             )
             return
 
-        # Create output directory
-        os.makedirs("output", exist_ok=True)
-
-        generados = 0
-        total = len(bautismos_pendientes)
-
-        for i, bautismo in enumerate(bautismos_pendientes, 1):
-            try:
-                self.progress_var.set(
-                    f"🔄 Generando {i}/{total}: {bautismo['nombre_completo']}"
+        email_config = None
+        if enviar:
+            email_config = load_email_config()
+            if not test_email_configuration(email_config):
+                self.report(job, "❌ Configuración de email inválida")
+                self.ui.call(
+                    messagebox.showerror,
+                    "Error",
+                    "Configuración de email no válida:\n"
+                    + "\n".join(email_config.errors),
                 )
-                self.root.update()
-
-                # Generate certificate
-                safe_name = "".join(
-                    c
-                    for c in bautismo["nombre_completo"]
-                    if c.isalnum() or c in (" ", "-", "_")
-                ).rstrip()
-                output_path = f"output/certificado_{safe_name}.pdf"
-
-                if generate_certificate(
-                    bautismo["nombre_completo"],
-                    bautismo["fecha_bautismo"],
-                    bautismo["iglesia"] or "Iglesia Default",
-                    template_path,
-                    output_path,
-                ):
-                    self.db.marcar_certificado_generado(bautismo["id"])
-                    generados += 1
+                return
 
-            except Exception as e:
-                print(
-                    f"Error generando certificado para {bautismo['nombre_completo']}: {e}"
-                )
-
-        self.progress_var.set(f"✅ Generados {generados}/{total} certificados")
-        messagebox.showinfo(
-            "Completado", f"Se generaron {generados} de {total} certificados"
+        def progress(stage, done, total):
+            job.progress(stage, done, total)
+            if stage == "generación":
+                self.set_status(f"🔄 Generando {job.tracker.text(stage)}")
+            else:
+                self.set_status(f"📧 Enviando {job.tracker.text(stage)}")
+
+        # PDFs keep rendering while earlier emails wait on the SMTP server
+        profiler = self.start_profiler()
+        processor = job.attach(
+            BatchProcessor(
+                db=self.db,
+                config=email_config,
+                template_path=template_path,
+                progress=progress,
+                profiler=profiler,
+            )
         )
-        self.load_bautismos()
-        self.update_stats()
+        try:
+            summary = processor.generate(bautismos_pendientes, send=enviar)
+        finally:
+            profile_message = self.finish_profiler(profiler)
+        for line in processor.last_report:
+            logger.info(line)
+
+        total = len(bautismos_pendientes)
+        generados = summary["generated"]
+        if summary["cancelled"]:
+            self.report(job, f"⏹️ Cancelado: {generados}/{total} certificados")
+        else:
+            self.report(job, f"✅ Generados {generados}/{total} certificados")
+        message = f"Se generaron {generados} de {total} certificados"
+        if enviar:
+            if email_config.transport == "spool":
+                message += f"\nEmails encolados: {summary['queued']}"
+            else:
+                message += (
+                    f"\nEmails enviados: {summary['sent']}"
+                    f"\nPara reintentar: {summary['deferred']}"
+                    f"\nFallidos: {summary['failed']}"
+                )
+        message += profile_message
+        self.ui.call(messagebox.showinfo, "Completado", message)
+        self.ui.call(self.apply_changes)
 
     def enviar_emails_threaded(self):
-        """Send emails in a separate thread"""
-        thread = threading.Thread(target=self.enviar_emails)
-        thread.daemon = True
-        thread.start()
+        """Send emails in a background job"""
+        self.start_job("envío", "📧 Enviar emails", self.enviar_emails)
 
-    def enviar_emails(self):
+    def enviar_emails(self, job):
         """Send emails for generated certificates"""
-        self.progress_var.set("🔄 Verificando configuración de email...")
-        self.root.update()
-
-        # Test email configuration
-        if not test_email_configuration():
-            self.progress_var.set("❌ Configuración de email inválida")
-            messagebox.showerror("Error", "Configuración de email no válida")
+        self.report(job, "🔄 Verificando configuración de email...")
+
+        # Load configuration once for the whole batch
+        email_config = load_email_config()
+        if not test_email_configuration(email_config):
+            self.report(job, "❌ Configuración de email inválida")
+            self.ui.call(
+                messagebox.showerror,
+                "Error",
+                "Configuración de email no válida:\n" + "\n".join(email_config.errors),
+            )
             return
 
-        # Test connection
-        success, message = test_email_connection()
+        # Test connection (not needed when emails only go to the spool)
+        spool_mode = email_config.transport == "spool"
+        success, message = (
+            (True, "") if spool_mode else test_email_connection(email_config)
+        )
         if not success:
-            self.progress_var.set("❌ Error de conexión")
-            messagebox.showerror(
+            self.report(job, "❌ Error de conexión")
+            self.ui.call(
+                messagebox.showerror,
                 "Error de Conexión",
                 f"No se pudo conectar al servidor de email:\n{message}",
             )
             return
 
-        bautismos = self.db.obtener_bautismos()
-        enviados = 0
-        total_enviables = 0
-
-        # Count sendable emails
-        for bautismo in bautismos:
-            if bautismo["certificado_generado"] and not bautismo["email_enviado"]:
-                total_enviables += 1
+        # Permanently rejected addresses are skipped until the email is edited
+        bautismos = job.claim(self.db.obtener_emails_pendientes())
+        total_enviables = len(bautismos)
 
         if total_enviables == 0:
-            self.progress_var.set("ℹ️ No hay emails para enviar")
-            messagebox.showinfo("Info", "No hay emails pendientes de envío")
+            self.report(job, "ℹ️ No hay emails para enviar")
+            self.ui.call(
+                messagebox.showinfo, "Info", "No hay emails pendientes de envío"
+            )
             return
 
-        for i, bautismo in enumerate(bautismos, 1):
-            if bautismo["certificado_generado"] and not bautismo["email_enviado"]:
-                try:
-                    self.progress_var.set(
-                        f"📧 Enviando {enviados + 1}/{total_enviables}: {bautismo['email']}"
-                    )
-                    self.root.update()
-
-                    safe_name = "".join(
-                        c
-                        for c in bautismo["nombre_completo"]
-                        if c.isalnum() or c in (" ", "-", "_")
-                    ).rstrip()
-                    certificate_path = f"output/certificado_{safe_name}.pdf"
-
-                    if os.path.exists(certificate_path):
-                        if send_baptism_congratulations_email(
-                            bautismo["email"],
-                            bautismo["nombre_completo"],
-                            certificate_path,
-                        ):
-                            self.db.marcar_email_enviado(bautismo["id"])
-                            enviados += 1
-
-                except Exception as e:
-                    print(f"Error enviando email a {bautismo['email']}: {e}")
-
-        self.progress_var.set(f"✅ Enviados {enviados}/{total_enviables} emails")
-        messagebox.showinfo(
-            "Completado", f"Se enviaron {enviados} de {total_enviables} emails"
+        def progress(stage, done, total):
+            job.progress(stage, done, total)
+            action = "Encolando" if spool_mode else "Enviando"
+            self.set_status(f"📧 {action} {job.tracker.text(stage)}")
+
+        # Certificates for the same address go out together, grouped by
+        # provider so Hotmail/Outlook throttling does not hold back others
+        profiler = self.start_profiler()
+        processor = job.attach(
+            BatchProcessor(
+                db=self.db, config=email_config, progress=progress, profiler=profiler
+            )
         )
-        self.load_bautismos()
-        self.update_stats()
+        try:
+            summary = processor.send(bautismos)
+        finally:
+            profile_message = self.finish_profiler(profiler)
+
+        if spool_mode:
+            enviados = summary["queued"]
+            self.report(job, f"📥 Encolados {enviados}/{total_enviables} emails")
+            self.ui.call(
+                messagebox.showinfo,
+                "Completado",
+                f"Se encolaron {enviados} de {total_enviables} emails en "
+                f"{email_config.spool_dir}\nUse \"Enviar Cola\" para entregarlos"
+                + profile_message,
+            )
+        else:
+            enviados = summary["sent"]
+            self.report(job, f"✅ Enviados {enviados}/{total_enviables} emails")
+            self.ui.call(
+                messagebox.showinfo,
+                "Completado",
+                f"Se enviaron {enviados} de {total_enviables} emails "
+                f"({summary['messages']} mensajes)" + profile_message,
+            )
+        self.ui.call(self.apply_changes)
+
+    def enviar_cola_threaded(self):
+        """Deliver the email spool in a background job"""
+        self.start_job("cola", "📤 Enviar cola", self.enviar_cola)
+
+    def enviar_cola(self, job):
+        """Deliver emails queued in the spool directory"""
+        self.report(job, "🔄 Verificando configuración de email...")
+
+        email_config = load_email_config()
+        if not test_email_configuration(email_config):
+            self.report(job, "❌ Configuración de email inválida")
+            self.ui.call(
+                messagebox.showerror,
+                "Error",
+                "Configuración de email no válida:\n" + "\n".join(email_config.errors),
+            )
+            return
+
+        def progress(stage, done, total):
+            job.progress(stage, done, total)
+            self.set_status(f"📤 Enviando cola {job.tracker.text(stage)}")
+
+        processor = job.attach(
+            BatchProcessor(db=self.db, config=email_config, progress=progress)
+        )
+        summary = processor.flush_spool()
+        if summary["total"] == 0:
+            self.report(job, "ℹ️ La cola está vacía")
+            self.ui.call(messagebox.showinfo, "Info", "No hay emails en cola")
+            return
+
+        self.report(job, f"✅ Enviados {summary['sent']}/{summary['total']} de la cola")
+        self.ui.call(
+            messagebox.showinfo,
+            "Completado",
+            f"Enviados: {summary['sent']}\n"
+            f"Para reintentar: {summary['deferred']}\n"
+            f"Rechazados: {summary['failed']}",
+        )
+        self.ui.call(self.apply_changes)
 
     def probar_email(self):
         """Test email configuration and connection"""
         self.progress_var.set("🔄 Probando configuración de email...")
         self.root.update()
 
-        if not test_email_configuration():
+        email_config = load_email_config(force_reload=True)
+        if not test_email_configuration(email_config):
             self.progress_var.set("❌ Configuración inválida")
-            messagebox.showerror("Error", "Configuración de email no válida")
+            messagebox.showerror(
+                "Error",
+                "Configuración de email no válida:\n" + "\n".join(email_config.errors),
+            )
             return
 
         self.progress_var.set("🔄 Probando conexión...")
         self.root.update()
 
-        success, message = test_email_connection()
+        success, message = test_email_connection(email_config)
         if success:
             self.progress_var.set("✅ Conexión exitosa")
             messagebox.showinfo(
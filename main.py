@@ -35,7 +35,8 @@ def main():
         try:
             from cli_app import run_cli
 
-            run_cli()
+            # Subcommands return an exit status for cron jobs
+            return run_cli() or 0
         except ImportError as e:
             print(f"❌ Error: No se pudo cargar la versión CLI: {e}")
             return 1
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Lista virtual de bautismos para la ventana principal
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from services.record_pages import RecordPager
+
+# (column id, heading, width, sort key in DatabaseService.ORDENES)
+COLUMNS = (
+    ("id", "ID", 60, "id"),
+    ("nombre", "Nombre", 180, "nombre"),
+    ("email", "Email", 180, "email"),
+    ("fecha", "Fecha Bautismo", 110, "fecha"),
+    ("iglesia", "Iglesia", 120, "iglesia"),
+    ("certificado", "Certificado", 80, "certificado"),
+    ("enviado", "Email Enviado", 90, "enviado"),
+)
+
+
+def record_values(bautismo):
+    """Treeview values of a record"""
+    return (
+        bautismo["id"],
+        bautismo["nombre_completo"],
+        bautismo["email"],
+        bautismo["fecha_bautismo"],
+        bautismo["iglesia"] or "",
+        "✅" if bautismo["certificado_generado"] else "❌",
+        "✅" if bautismo["email_enviado"] else "❌",
+    )
+
+
+class RecordList:
+    def __init__(self, parent, db_service, page_size=100):
+        """
+        Treeview that only holds the rows on screen.
+
+        The Treeview has one item per visible row; scrolling reuses those
+        items with the records of the new position, read through a
+        RecordPager. The scrollbar stands for the whole table.
+
+        :param parent: Parent widget
+        :param db_service: Database service instance
+        :param page_size: Records read from the database at a time
+        """
+        self.pager = RecordPager(db_service, page_size=page_size)
+        self.offset = 0
+        self.visible = 10
+        self.selected_id = None
+        self._rows = []
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(
+            self.frame,
+            columns=[column for column, *_ in COLUMNS],
+            show="headings",
+            height=self.visible,
+            selectmode="browse",
+        )
+        for column, heading, width, orden in COLUMNS:
+            self.tree.heading(
+                column, text=heading, command=lambda orden=orden: self.sort_by(orden)
+            )
+            self.tree.column(column, width=width)
+
+        self.scrollbar = ttk.Scrollbar(
+            self.frame, orient=tk.VERTICAL, command=self.on_scrollbar
+        )
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Up>", lambda event: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-self.visible) or "break")
+        self.tree.bind("<Next>", lambda event: self.scroll(self.visible) or "break")
+        self.tree.bind("<Home>", lambda event: self.show(0) or "break")
+        self.tree.bind("<End>", lambda event: self.show(self.pager.count()) or "break")
+        self._update_headings()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def bind(self, sequence, callback):
+        self.tree.bind(sequence, callback)
+
+    def refresh(self):
+        """Read the records again, keeping the position and the selection"""
+        self.pager.refresh()
+        self.show(self.offset)
+
+    def apply_changes(self, cambios):
+        """Show the changes read from the change log, keeping the position"""
+        if self.selected_id in cambios["borrados"]:
+            self.selected_id = None
+        self.pager.apply_changes(cambios)
+        self.show(self.offset)
+
+    def sort_by(self, orden):
+        """Sort by a column; clicking it again reverses the order"""
+        descendente = orden == self.pager.orden and not self.pager.descendente
+        self.pager.sort(orden, descendente)
+        self._update_headings()
+        self.show(0)
+
+    def _update_headings(self):
+        for column, heading, _, orden in COLUMNS:
+            if orden == self.pager.orden:
+                heading += " ▼" if self.pager.descendente else " ▲"
+            self.tree.heading(column, text=heading)
+
+    def show(self, offset):
+        """Fill the visible items with the records from position offset"""
+        total = self.pager.count()
+        self.offset = max(0, min(offset, total - self.visible))
+        self._rows = self.pager.rows(self.offset, self.visible)
+
+        items = self.tree.get_children()
+        for index, bautismo in enumerate(self._rows):
+            if index < len(items):
+                self.tree.item(items[index], values=record_values(bautismo))
+            else:
+                self.tree.insert(
+                    "", "end", iid=str(index), values=record_values(bautismo)
+                )
+        if len(items) > len(self._rows):
+            self.tree.delete(*items[len(self._rows) :])
+
+        selected = [
+            str(index)
+            for index, bautismo in enumerate(self._rows)
+            if bautismo["id"] == self.selected_id
+        ]
+        if tuple(self.tree.selection()) != tuple(selected):
+            self.tree.selection_set(selected)
+
+        if total:
+            self.scrollbar.set(
+                self.offset / total, (self.offset + len(self._rows)) / total
+            )
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.show(self.offset + rows)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.show(int(float(amount) * self.pager.count()))
+        elif unit == "pages":
+            self.scroll(int(amount) * self.visible)
+        else:
+            self.scroll(int(amount))
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        """Show as many rows as fit in the new height"""
+        bbox = self.tree.bbox(self.tree.get_children()[0]) if self._rows else None
+        if not bbox:
+            return
+        top, height = bbox[1], bbox[3]
+        visible = max(1, (event.height - top) // height)
+        if visible != self.visible:
+            self.visible = visible
+            self.show(self.offset)
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_id = self._rows[int(selection[0])]["id"]
+
+    def move_selection(self, step):
+        """Arrow keys: move the selection, scrolling at the edges"""
+        selection = self.tree.selection()
+        index = int(selection[0]) + step if selection else 0
+        if index < 0:
+            self.scroll(-1)
+            index = 0
+        elif index >= len(self._rows):
+            self.scroll(1)
+            index = len(self._rows) - 1
+        if self._rows:
+            self.selected_id = self._rows[index]["id"]
+            self.tree.selection_set(str(index))
+            self.tree.focus(str(index))
+        return "break"
+
+    def selected_record_id(self):
+        """Id of the selected record (even if scrolled out of view), or None"""
+        return self.selected_id
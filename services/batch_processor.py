@@ -0,0 +1,524 @@
+"""
+Procesamiento por lotes de certificados para Certificador de Bautismos
+
+Reúne en un solo lugar el ciclo "nombre seguro -> ruta del certificado ->
+generate_certificate -> marcar -> enviar -> marcar" que usan la línea de
+comandos, la ventana principal y la ventana de edición. Todos los puntos de
+entrada comparten así el pipeline por etapas, el envío agrupado por
+dominio, los recibos de envío y la cancelación.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from services.mail_batch import deliver_certificates
+from services.mail_config import load_email_config
+from services.mail_service import SendResult
+from services.mail_spool import flush_spool
+from services.pdf_service import generate_certificate, remove_partial_outputs
+from services.pipeline import CertificatePipeline
+from services.run_state import FileRunStore, RunCheckpoint, config_hash, record_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = os.path.join("data", "template.pdf")
+DEFAULT_OUTPUT_DIR = "output"
+DEFAULT_CHURCH = "Iglesia Default"
+RUNS_FILENAME = ".ejecuciones.json"
+
+
+def safe_name(name):
+    """Nombre apto para usar en un archivo"""
+    return "".join(c for c in name if c.isalnum() or c in (" ", "-", "_")).rstrip()
+
+
+def certificate_path(name, output_dir=DEFAULT_OUTPUT_DIR):
+    """Ruta del certificado de una persona"""
+    return os.path.join(output_dir, f"certificado_{safe_name(name)}.pdf")
+
+
+def validate_baptism_date(baptism_date_str):
+    """
+    Validate if baptism date has passed or is today.
+
+    :param baptism_date_str: Date in DD/MM/YYYY format
+    :return: True if date has passed or is today, False otherwise
+    """
+    try:
+        baptism_date = datetime.strptime(baptism_date_str, "%d/%m/%Y")
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        return baptism_date <= today
+    except Exception as e:
+        logger.warning("❌ Error validando fecha %s: %s", baptism_date_str, e)
+        return False
+
+
+class BatchProcessor:
+    """
+    Generar, enviar y regenerar certificados con las mismas reglas en
+    todas las pantallas.
+
+    :param db: DatabaseService para guardar el estado (None en modo Excel)
+    :param config: EmailConfig; por defecto la del .env
+    :param template_path: Plantilla PDF
+    :param output_dir: Carpeta de los certificados
+    :param workers: Hilos de generación de PDF
+    :param connections: Conexiones SMTP por proveedor (por defecto, según
+        la política de cada uno)
+    :param queue_size: Capacidad de las colas entre etapas
+    :param validate_dates: Omitir bautismos con fecha futura o inválida
+    :param skip_existing: No volver a generar certificados que ya existen
+    :param progress: Callback opcional progress(etapa, hechos, total)
+    :param session_factory: Fábrica de sesiones SMTP; un MailSessionPool
+        conserva las conexiones entre lotes (modo servicio)
+    :param profiler: StageProfiler opcional para perfilar cada etapa
+    :param record_timings: Guardar en bautismo_events el tiempo de cada paso
+        de cada registro (plantilla, relleno, guardado, MIME, SMTP, BD)
+    :param metrics: BatchMetrics opcional (ver services.metrics)
+    """
+
+    def __init__(
+        self,
+        db=None,
+        config=None,
+        template_path=DEFAULT_TEMPLATE,
+        output_dir=DEFAULT_OUTPUT_DIR,
+        workers=2,
+        connections=None,
+        queue_size=32,
+        validate_dates=False,
+        skip_existing=False,
+        progress=None,
+        session_factory=None,
+        profiler=None,
+        record_timings=True,
+        metrics=None,
+    ):
+        self.db = db
+        self.config = config or load_email_config()
+        self.template_path = template_path
+        self.output_dir = output_dir
+        self.workers = workers
+        self.connections = connections
+        self.queue_size = queue_size
+        self.validate_dates = validate_dates
+        self.skip_existing = skip_existing
+        self.progress = progress
+        self.session_factory = session_factory
+        self.profiler = profiler
+        self.record_timings = record_timings
+        self.metrics = metrics
+        self.last_report = []
+        # StageStats del pipeline en curso (para mostrar p95 en vivo)
+        self.stages = {}
+        self._cancel = threading.Event()
+        # Sin marcar mientras el lote está en pausa
+        self._running = threading.Event()
+        self._running.set()
+
+    def cancel(self):
+        """Detener el lote después de los elementos en curso"""
+        self._cancel.set()
+        # Un lote en pausa también tiene que enterarse
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def pause(self):
+        """Pausar el lote: cada hilo se detiene al terminar el elemento en curso"""
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def _report(self, stage, done, total):
+        """Avisar del progreso y esperar aquí mientras el lote está en pausa"""
+        if self.progress:
+            self.progress(stage, done, total)
+        self._running.wait()
+
+    def certificate_path(self, record):
+        if record.get("nombre_archivo"):
+            # Ya calculado por la validación previa del Excel
+            return os.path.join(
+                self.output_dir, f"certificado_{record['nombre_archivo']}.pdf"
+            )
+        return certificate_path(record["nombre_completo"], self.output_dir)
+
+    def render(self, record, force=False):
+        """
+        Generar el certificado de un registro.
+
+        :param force: Generar aunque el certificado ya exista
+        :return: Ruta del certificado, o None si se omitió o falló
+        """
+        name = record["nombre_completo"]
+        baptism_date = record["fecha_bautismo"]
+        extra = {"record_id": record.get("id"), "stage": "generación"}
+
+        logger.debug("👤 Procesando: %s", name, extra=extra)
+
+        # Skip if no baptism date
+        if not baptism_date:
+            logger.info(
+                "📅 %s: Sin fecha de bautismo, saltando...",
+                name,
+                extra={**extra, "outcome": "skipped"},
+            )
+            return None
+
+        # Validate baptism date
+        if self.validate_dates and not validate_baptism_date(baptism_date):
+            logger.info(
+                "📅 %s: Fecha de bautismo futura (%s), saltando...",
+                name,
+                baptism_date,
+                extra={**extra, "outcome": "skipped"},
+            )
+            return None
+
+        output_path = self.certificate_path(record)
+        if self.skip_existing and not force and os.path.exists(output_path):
+            if record.get("id") is None:
+                # In Excel mode the file is the only sign the row was processed
+                logger.debug(
+                    "📄 %s: Certificado ya existe, saltando...",
+                    name,
+                    extra={**extra, "outcome": "skipped"},
+                )
+                return None
+            # Certificates are written atomically, so an existing file is
+            # complete: reuse it for a record that is still pending
+            logger.debug(
+                "📄 %s: Certificado ya existe, se reutiliza",
+                name,
+                extra={**extra, "outcome": "reused"},
+            )
+            return output_path
+
+        logger.debug("🖨️  Generando PDF para %s...", name, extra=extra)
+        if (
+            generate_certificate(
+                name,
+                baptism_date,
+                record.get("iglesia") or DEFAULT_CHURCH,
+                self.template_path,
+                output_path,
+            )
+            and os.path.exists(output_path)
+            and os.path.getsize(output_path) > 0
+        ):
+            return output_path
+
+        logger.error(
+            "❌ Error generando certificado para %s",
+            name,
+            extra={**extra, "outcome": "failed"},
+        )
+        return None
+
+    def _check_template(self):
+        if not os.path.exists(self.template_path):
+            logger.error(
+                "❌ Error: No se encontró la plantilla PDF en %s", self.template_path
+            )
+            return False
+        os.makedirs(self.output_dir, exist_ok=True)
+        removed = remove_partial_outputs(self.output_dir)
+        if removed:
+            logger.info("🧹 %d certificados a medio escribir eliminados", removed)
+        return True
+
+    def _run_store(self):
+        if self.db is not None:
+            return self.db
+        return FileRunStore(os.path.join(self.output_dir, RUNS_FILENAME))
+
+    def _config_hash(self, send, scope=None):
+        try:
+            template = os.stat(self.template_path)
+            template_id = (template.st_size, template.st_mtime_ns)
+        except OSError:
+            template_id = None
+        values = {
+            "template": [self.template_path, template_id],
+            "output_dir": os.path.abspath(self.output_dir),
+            "validate_dates": self.validate_dates,
+            "skip_existing": self.skip_existing,
+            "send": send,
+            "scope": scope,
+        }
+        if send:
+            values["email"] = {
+                key: value
+                for key, value in self.config.as_dict().items()
+                if key != "password"
+            }
+        return config_hash(values)
+
+    def _start_run(self, records, send, resume, total=None, scope=None):
+        """
+        Registrar la ejecución, o retomar la última si resume y es compatible.
+
+        Una lista se ordena por clave; un generador (lectura por streaming)
+        debe producir los registros ya ordenados y se filtra sin consumirlo.
+
+        :return: (registros a procesar, RunCheckpoint o None)
+        """
+        streaming = not isinstance(records, list)
+        if not streaming:
+            if any(record_key(record) is None for record in records):
+                return records, None
+            records = sorted(records, key=record_key)
+            total = len(records)
+
+        mode = "db" if self.db is not None else "excel"
+        store = self._run_store()
+        current_hash = self._config_hash(send, scope)
+
+        if resume:
+            previous = store.obtener_run_pendiente(mode)
+            if previous is None:
+                logger.info("ℹ️  No hay una ejecución interrumpida: se procesa todo")
+            elif previous["config_hash"] != current_hash:
+                logger.warning(
+                    "⚠️  La configuración cambió desde la ejecución interrumpida: "
+                    "se empieza de nuevo"
+                )
+            else:
+                last_key = previous["ultimo_id"]
+                if last_key is not None:
+                    records = (r for r in records if record_key(r) > last_key)
+                    if not streaming:
+                        records = list(records)
+                logger.info(
+                    "↩️  Reanudando la ejecución %s después del registro %s%s",
+                    previous["id"],
+                    last_key,
+                    "" if streaming else f" ({len(records)} por procesar)",
+                )
+                checkpoint = RunCheckpoint(
+                    store,
+                    previous["id"],
+                    base=previous["contadores"],
+                    last_key=last_key,
+                )
+                return self._watch(records, checkpoint, streaming), checkpoint
+
+        run_id = store.crear_run(mode, current_hash, total)
+        if run_id is None:
+            return records, None
+        checkpoint = RunCheckpoint(store, run_id)
+        return self._watch(records, checkpoint, streaming), checkpoint
+
+    @staticmethod
+    def _watch(records, checkpoint, streaming):
+        if streaming:
+            return checkpoint.watch(records)
+        for record in records:
+            checkpoint.expect(record_key(record))
+        return records
+
+    def _can_send(self):
+        return self.config.transport == "spool" or self.config.is_valid
+
+    def generate(
+        self,
+        records,
+        send=True,
+        resume=False,
+        total=None,
+        scope=None,
+        track_run=True,
+        run_id=None,
+    ):
+        """
+        Generar los certificados y, si send, enviarlos a medida que están listos.
+
+        Sin configuración de email válida solo se generan. La ejecución queda
+        registrada con puntos de control; con resume se retoma la última que
+        no terminó si su configuración coincide con la actual.
+
+        :param records: Lista de registros, o un generador ordenado por
+            record_key (p. ej. read_excel_records) que se consume a medida
+            que avanza la generación
+        :param total: Número estimado de registros si records es un generador
+        :param scope: Filtros con los que se eligieron los registros; una
+            ejecución solo se reanuda con los mismos
+        :param track_run: Registrar la ejecución con puntos de control (el
+            modo servicio no lo necesita: cada ciclo es pequeño)
+        :param run_id: Sin track_run, ejecución a la que pertenecen los
+            tiempos de cada registro (la del modo servicio)
+        :return: Resumen del pipeline (generados, omitidos, enviados, ...),
+            o None si falta la plantilla. "totals" incluye lo hecho por la
+            ejecución que se reanudó.
+        """
+        if not self._check_template():
+            return None
+
+        send = send and self._can_send()
+        if isinstance(records, tuple):
+            records = list(records)
+        checkpoint = None
+        if track_run:
+            records, checkpoint = self._start_run(records, send, resume, total, scope)
+
+        pipeline = CertificatePipeline(
+            self.render,
+            db=self.db,
+            config=self.config if send else None,
+            render_workers=self.workers,
+            queue_size=self.queue_size,
+            progress=self._report,
+            connections=self.connections,
+            stop_event=self._cancel,
+            checkpoint=checkpoint,
+            session_factory=self.session_factory,
+            profiler=self.profiler,
+            record_timings=self.record_timings,
+            metrics=self.metrics,
+            run_id=run_id,
+        )
+        self.stages = pipeline.stages
+        status = "completed"
+        try:
+            summary = pipeline.run(records, total=total)
+            if summary["cancelled"]:
+                status = "cancelled"
+        except KeyboardInterrupt:
+            logger.warning("⏹️  Cancelado: se terminaron los envíos en curso")
+            summary = pipeline.summary
+            summary["cancelled"] = True
+            status = "interrupted"
+        self.last_report = pipeline.report()
+        if self.metrics is not None:
+            self.metrics.batch_finished(status)
+
+        if checkpoint is not None:
+            summary["run_id"] = checkpoint.run_id
+            summary["totals"] = checkpoint.finish(status, summary)
+            if status != "completed":
+                logger.info("💡 Para continuar donde quedó, ejecuta: python main.py --resume")
+        return summary
+
+    def send(self, records):
+        """
+        Enviar (o encolar) los certificados ya generados de los registros.
+
+        Los registros sin certificado en disco se omiten.
+
+        :return: Resumen con registros enviados, encolados, fallidos y aplazados
+        """
+        items = []
+        for record in records:
+            path = self.certificate_path(record)
+            if os.path.exists(path):
+                items.append((record, path))
+            else:
+                logger.warning(
+                    "⚠️ No se encontró el certificado de %s",
+                    record["nombre_completo"],
+                    extra={
+                        "record_id": record.get("id"),
+                        "stage": "envío",
+                        "outcome": "missing",
+                    },
+                )
+
+        def progress(done, total, group, result):
+            self._report("envío", done, total)
+
+        # Los tiempos de cada envío quedan en su propia ejecución
+        run_id = None
+        if self.db is not None and self.record_timings and items:
+            run_id = self.db.crear_run("envío", None, len(items))
+
+        summary = deliver_certificates(
+            self.db,
+            items,
+            config=self.config,
+            progress=progress,
+            cancel=self._cancel,
+            session_factory=self.session_factory,
+            profiler=self.profiler,
+            record_timings=self.record_timings,
+            metrics=self.metrics,
+            run_id=run_id,
+        )
+        summary["missing"] = len(records) - len(items)
+        summary["cancelled"] = self.cancelled
+        if run_id is not None:
+            summary["run_id"] = run_id
+            self.db.finalizar_run(
+                run_id,
+                "cancelled" if self.cancelled else "completed",
+                {key: summary[key] for key in ("sent", "queued", "failed", "deferred")},
+            )
+        if self.metrics is not None:
+            self.metrics.batch_finished("cancelled" if self.cancelled else "completed")
+        return summary
+
+    def flush_spool(self, limit=None):
+        """Entregar los emails de la cola en disco"""
+        def progress(done, total, path, ok):
+            self._report("cola", done, total)
+
+        return flush_spool(
+            db=self.db,
+            config=self.config,
+            connections=self.connections,
+            limit=limit,
+            progress=progress,
+            cancel=self._cancel,
+        )
+
+    def regenerate(self, record):
+        """
+        Volver a generar el certificado de un registro, reemplazando el anterior.
+
+        :return: Ruta del certificado, o None si falló
+        """
+        if not self._check_template():
+            return None
+        if self.db is not None and record.get("id") is not None:
+            self.db.regenerar_certificado(record["id"])
+        path = self.render(record, force=True)
+        if path and self.db is not None and record.get("id") is not None:
+            self.db.marcar_certificado_generado(record["id"])
+        return path
+
+    def resend(self, record):
+        """
+        Reenviar el certificado de un único registro.
+
+        :return: SendResult del envío (en modo cola, SENT si quedó encolado)
+        """
+        path = self.certificate_path(record)
+        if not os.path.exists(path):
+            return SendResult(SendResult.ERROR, message="No se encontró el certificado")
+
+        results = []
+        deliver_certificates(
+            self.db,
+            [(record, path)],
+            config=self.config,
+            progress=lambda done, total, group, result: results.append(result),
+            cancel=self._cancel,
+        )
+        if not results:
+            return SendResult(SendResult.TRANSIENT, message="El envío quedó pendiente")
+        result = results[-1]
+        if not isinstance(result, SendResult):
+            # En modo cola el resultado es la ruta del .eml
+            if result:
+                return SendResult(SendResult.SENT, message=result)
+            return SendResult(SendResult.ERROR, message="No se pudo encolar el email")
+        return result
@@ -1,8 +1,12 @@
 import sqlite3
 import os
+import json
+import logging
 from datetime import datetime
 from typing import List, Dict, Optional
 
+logger = logging.getLogger(__name__)
+
 
 class DatabaseService:
     def __init__(self, db_path: str = "bautismos.db"):
@@ -33,8 +37,291 @@ class DatabaseService:
             """
             )
 
+            # Columns added after the first release
+            existing = {
+                row[1] for row in cursor.execute("PRAGMA table_info(bautismos)")
+            }
+            for column, definition in self.EXTRA_COLUMNS:
+                if column not in existing:
+                    cursor.execute(
+                        f"ALTER TABLE bautismos ADD COLUMN {column} {definition}"
+                    )
+
+            # Send receipts: one row per record and delivery attempt, written
+            # as 'pending' before talking to the server and updated with the
+            # server's answer afterwards
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bautismo_envios (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bautismo_id INTEGER NOT NULL,
+                    message_id TEXT NOT NULL,
+                    destinatario TEXT NOT NULL,
+                    intento INTEGER NOT NULL DEFAULT 1,
+                    estado TEXT NOT NULL DEFAULT 'pending',
+                    respuesta TEXT,
+                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    fecha_respuesta TIMESTAMP,
+                    UNIQUE (bautismo_id, message_id)
+                )
+            """
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_envios_message_id "
+                "ON bautismo_envios (message_id)"
+            )
+
+            # Batch runs and their checkpoints: ultimo_id is the highest record
+            # id such that every earlier record of the run has finished
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bautismo_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    modo TEXT NOT NULL,
+                    config_hash TEXT,
+                    estado TEXT NOT NULL DEFAULT 'running',
+                    total INTEGER DEFAULT 0,
+                    ultimo_id INTEGER,
+                    contadores TEXT,
+                    fecha_inicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    fecha_actualizacion TIMESTAMP,
+                    fecha_fin TIMESTAMP
+                )
+            """
+            )
+
+            # Change log for the watch mode: triggers record which rows need
+            # work, so the watcher reads the delta instead of rescanning
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bautismo_cambios (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bautismo_id INTEGER NOT NULL,
+                    operacion TEXT NOT NULL,
+                    fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
+            cursor.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_bautismos_cambio_insert
+                AFTER INSERT ON bautismos
+                BEGIN
+                    INSERT INTO bautismo_cambios (bautismo_id, operacion)
+                    VALUES (NEW.id, 'insert');
+                END
+            """
+            )
+            # Only changes that leave work to do: a certificate to (re)generate
+            # or an unsent email to a new address. Marking a certificate as
+            # generated or an email as sent is not logged.
+            cursor.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_bautismos_cambio_update
+                AFTER UPDATE OF nombre_completo, email, fecha_bautismo, iglesia,
+                                certificado_generado
+                ON bautismos
+                WHEN NEW.certificado_generado = 0
+                  OR (NEW.email IS NOT OLD.email AND NEW.email_enviado = 0)
+                BEGIN
+                    INSERT INTO bautismo_cambios (bautismo_id, operacion)
+                    VALUES (NEW.id, 'update');
+                END
+            """
+            )
+            # Only the watcher purges the log, and most installs never run
+            # it: drop the entries older than the latest CAMBIOS_MAX, every
+            # 1000 entries. A watcher that falls behind sees the hole.
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_cambios_poda
+                AFTER INSERT ON bautismo_cambios
+                WHEN NEW.id % 1000 = 0
+                BEGIN
+                    DELETE FROM bautismo_cambios
+                    WHERE id <= NEW.id - {self.CAMBIOS_MAX};
+                END
+            """
+            )
+
+            # Change log for the main window: every insert, delete and update
+            # of a shown column, with what it changes in obtener_estadisticas,
+            # so the window refreshes only the rows that changed. Nobody
+            # consumes it: a trigger drops the entries older than the latest
+            # VISTA_CAMBIOS_MAX, every 1000 entries.
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bautismo_cambios_vista (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bautismo_id INTEGER NOT NULL,
+                    operacion TEXT NOT NULL,
+                    columnas INTEGER NOT NULL DEFAULT 0,
+                    d_total INTEGER NOT NULL DEFAULT 0,
+                    d_pendientes INTEGER NOT NULL DEFAULT 0,
+                    d_enviados INTEGER NOT NULL DEFAULT 0,
+                    d_rechazados INTEGER NOT NULL DEFAULT 0
+                )
+            """
+            )
+            for statement in self._vista_triggers():
+                cursor.execute(statement)
+
+            # Timing events: one row per record and measured step (template
+            # load, fill, save, MIME build, SMTP send, DB update, ...) of a run
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bautismo_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bautismo_id INTEGER,
+                    run_id INTEGER,
+                    etapa TEXT NOT NULL,
+                    duracion REAL NOT NULL,
+                    resultado TEXT,
+                    plantilla TEXT,
+                    fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_run "
+                "ON bautismo_events (run_id, etapa)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_bautismo "
+                "ON bautismo_events (bautismo_id)"
+            )
+
+            # Indexes behind the CLI filters (see _filtros_sql)
+            for statement in self.INDEXES:
+                cursor.execute(statement)
+
             conn.commit()
 
+    # Baptism dates are stored as DD/MM/YYYY; this expression turns them into
+    # YYYY-MM-DD so ranges can be compared (and indexed) as text
+    FECHA_BAUTISMO_ISO = (
+        "(substr(fecha_bautismo, 7, 4) || '-' || substr(fecha_bautismo, 4, 2)"
+        " || '-' || substr(fecha_bautismo, 1, 2))"
+    )
+
+    INDEXES = (
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_certificado "
+        "ON bautismos (certificado_generado, id)",
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_envio "
+        "ON bautismos (email_enviado, certificado_generado, id)",
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_iglesia "
+        "ON bautismos (iglesia COLLATE NOCASE, id)",
+        f"CREATE INDEX IF NOT EXISTS idx_bautismos_fecha "
+        f"ON bautismos ({FECHA_BAUTISMO_ISO}, id)",
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_nombre_fecha "
+        "ON bautismos (nombre_completo, fecha_bautismo)",
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_nombre "
+        "ON bautismos (nombre_completo, id)",
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_email "
+        "ON bautismos (email, id)",
+        "CREATE INDEX IF NOT EXISTS idx_bautismos_enviado "
+        "ON bautismos (email_enviado, id)",
+    )
+
+    # Columns the record list can be sorted by, as indexed expressions
+    ORDENES = {
+        "id": "id",
+        "nombre": "nombre_completo",
+        "email": "email",
+        "fecha": FECHA_BAUTISMO_ISO,
+        "iglesia": "iglesia COLLATE NOCASE",
+        "certificado": "certificado_generado",
+        "enviado": "email_enviado",
+    }
+
+    # Columns of the main window (ORDENES keys); bit i of
+    # bautismo_cambios_vista.columnas is set when the i-th one changed
+    VISTA_COLUMNAS = (
+        ("nombre", "nombre_completo"),
+        ("email", "email"),
+        ("fecha", "fecha_bautismo"),
+        ("iglesia", "iglesia"),
+        ("certificado", "certificado_generado"),
+        ("enviado", "email_enviado"),
+    )
+    VISTA_CAMBIOS_MAX = 10000
+    CAMBIOS_MAX = 10000
+
+    def _vista_triggers(self):
+        """Triggers that fill bautismo_cambios_vista"""
+
+        def contadores(row):
+            # Counts of obtener_estadisticas (0 or 1) for the OLD or NEW row
+            return (
+                f"IFNULL({row}.certificado_generado = 0, 0)",
+                f"IFNULL({row}.email_enviado = 1, 0)",
+                f"IFNULL({row}.email_enviado = 0 AND {row}.email_estado IS 'permanent'"
+                f" AND {row}.email_fallo_destino IS {row}.email, 0)",
+            )
+
+        nuevos, viejos = contadores("NEW"), contadores("OLD")
+        insertados = ", ".join(nuevos)
+        borrados = ", ".join(f"-{counter}" for counter in viejos)
+        actualizados = ", ".join(f"{new} - {old}" for new, old in zip(nuevos, viejos))
+        columnas = " + ".join(
+            f"((OLD.{column} IS NOT NEW.{column}) << {bit})"
+            for bit, (_, column) in enumerate(self.VISTA_COLUMNAS)
+        )
+        vigiladas = ", ".join(column for _, column in self.VISTA_COLUMNAS)
+        return (
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_bautismos_vista_insert
+            AFTER INSERT ON bautismos
+            BEGIN
+                INSERT INTO bautismo_cambios_vista (bautismo_id, operacion,
+                    d_total, d_pendientes, d_enviados, d_rechazados)
+                VALUES (NEW.id, 'insert', 1, {insertados});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_bautismos_vista_delete
+            AFTER DELETE ON bautismos
+            BEGIN
+                INSERT INTO bautismo_cambios_vista (bautismo_id, operacion,
+                    d_total, d_pendientes, d_enviados, d_rechazados)
+                VALUES (OLD.id, 'delete', -1, {borrados});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_bautismos_vista_update
+            AFTER UPDATE OF {vigiladas}, email_estado, email_fallo_destino
+            ON bautismos
+            BEGIN
+                INSERT INTO bautismo_cambios_vista (bautismo_id, operacion,
+                    columnas, d_pendientes, d_enviados, d_rechazados)
+                VALUES (NEW.id, 'update', {columnas}, {actualizados});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_cambios_vista_poda
+            AFTER INSERT ON bautismo_cambios_vista
+            WHEN NEW.id % 1000 = 0
+            BEGIN
+                DELETE FROM bautismo_cambios_vista
+                WHERE id <= NEW.id - {self.VISTA_CAMBIOS_MAX};
+            END
+            """,
+        )
+
+    # Email delivery outcome of the last attempt: estado is a SendResult
+    # status and email_fallo_destino the address it applied to
+    EXTRA_COLUMNS = (
+        ("email_estado", "TEXT"),
+        ("email_error", "TEXT"),
+        ("email_fallo_destino", "TEXT"),
+    )
+
+    # Records whose current address was permanently rejected are skipped
+    # until the email is edited
+    SIN_RECHAZO_PERMANENTE = """
+        NOT (email_estado IS 'permanent' AND email_fallo_destino IS email)
+    """
+
     def agregar_bautismo(
         self,
         nombre: str,
@@ -58,9 +345,51 @@ class DatabaseService:
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"Error agregando bautismo: {e}")
+            logger.error("Error agregando bautismo: %s", e)
             return False
 
+    def agregar_bautismos(self, registros: List[Dict]) -> int:
+        """
+        Add several records in one transaction.
+
+        Records already in the database (same name and baptism date) are
+        skipped, so importing the same sheet twice adds nothing.
+
+        :return: Number of records added
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    INSERT INTO bautismos (nombre_completo, email, fecha_bautismo, iglesia, celula, lider)
+                    SELECT ?, ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM bautismos
+                        WHERE nombre_completo = ? AND fecha_bautismo = ?
+                    )
+                """,
+                    [
+                        (
+                            r["nombre_completo"],
+                            r.get("email") or "",
+                            r["fecha_bautismo"],
+                            r.get("iglesia") or "",
+                            r.get("celula") or "",
+                            r.get("lider") or "",
+                            r["nombre_completo"],
+                            r["fecha_bautismo"],
+                        )
+                        for r in registros
+                    ],
+                )
+                conn.commit()
+                # rowcount leaves out the rows added by the bautismo_cambios triggers
+                return cursor.rowcount
+        except Exception as e:
+            logger.error("Error agregando bautismos: %s", e)
+            return 0
+
     def obtener_bautismos(self, limit: int = 100) -> List[Dict]:
         """Get all baptism records"""
         try:
@@ -78,7 +407,7 @@ class DatabaseService:
 
                 return [dict(row) for row in cursor.fetchall()]
         except Exception as e:
-            print(f"Error obteniendo bautismos: {e}")
+            logger.error("Error obteniendo bautismos: %s", e)
             return []
 
     def obtener_bautismos_pendientes(self) -> List[Dict]:
@@ -97,7 +426,7 @@ class DatabaseService:
 
                 return [dict(row) for row in cursor.fetchall()]
         except Exception as e:
-            print(f"Error obteniendo bautismos pendientes: {e}")
+            logger.error("Error obteniendo bautismos pendientes: %s", e)
             return []
 
     def marcar_certificado_generado(self, bautismo_id: int, generated: bool = True) -> bool:
@@ -116,7 +445,7 @@ class DatabaseService:
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"Error marcando certificado: {e}")
+            logger.error("Error marcando certificado: %s", e)
             return False
 
     def marcar_email_enviado(self, bautismo_id: int) -> bool:
@@ -127,7 +456,8 @@ class DatabaseService:
                 cursor.execute(
                     """
                     UPDATE bautismos 
-                    SET email_enviado = 1 
+                    SET email_enviado = 1, email_estado = 'sent',
+                        email_error = NULL, email_fallo_destino = NULL
                     WHERE id = ?
                 """,
                     (bautismo_id,),
@@ -135,38 +465,566 @@ class DatabaseService:
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"Error marcando email: {e}")
+            logger.error("Error marcando email: %s", e)
+            return False
+
+    def marcar_emails_enviados(self, bautismo_ids: List[int]) -> bool:
+        """Mark several emails as sent in a single update"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    UPDATE bautismos 
+                    SET email_enviado = 1, email_estado = 'sent',
+                        email_error = NULL, email_fallo_destino = NULL
+                    WHERE id = ?
+                """,
+                    [(bautismo_id,) for bautismo_id in bautismo_ids],
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error marcando emails: %s", e)
+            return False
+
+    def registrar_fallos_email(
+        self, bautismo_ids: List[int], estado: str, error: str, email: str
+    ) -> bool:
+        """Store the same failed delivery outcome for several records"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    UPDATE bautismos
+                    SET email_estado = ?, email_error = ?, email_fallo_destino = ?
+                    WHERE id = ?
+                """,
+                    [(estado, error, email, bautismo_id) for bautismo_id in bautismo_ids],
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error registrando fallo de email: %s", e)
+            return False
+
+    # Record states accepted by the estado filter
+    ESTADOS = {
+        "pendientes": "certificado_generado = 0",
+        "por_enviar": "certificado_generado = 1 AND email_enviado = 0 AND email <> ''",
+        # A generated certificate without an address has nothing left to do
+        "sin_terminar": (
+            "(certificado_generado = 0 OR (email_enviado = 0 AND email <> ''))"
+        ),
+        "enviados": "email_enviado = 1",
+    }
+
+    def _filtros_sql(
+        self,
+        estado: Optional[str] = None,
+        iglesia: Optional[str] = None,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+        ids: Optional[List[int]] = None,
+    ):
+        """
+        WHERE clause and parameters for the record filters.
+
+        :param estado: One of ESTADOS; por_enviar and sin_terminar leave out
+            permanently rejected addresses
+        :param iglesia: Church name (case-insensitive)
+        :param desde: First baptism date, YYYY-MM-DD
+        :param hasta: Last baptism date, YYYY-MM-DD
+        :param ids: Record ids
+        """
+        conditions, params = [], []
+        if estado:
+            conditions.append(self.ESTADOS[estado])
+            if estado in ("por_enviar", "sin_terminar"):
+                conditions.append(
+                    f"(certificado_generado = 0 OR {self.SIN_RECHAZO_PERMANENTE})"
+                )
+        if iglesia:
+            conditions.append("iglesia = ? COLLATE NOCASE")
+            params.append(iglesia)
+        if desde:
+            conditions.append(f"{self.FECHA_BAUTISMO_ISO} >= ?")
+            params.append(desde)
+        if hasta:
+            conditions.append(f"{self.FECHA_BAUTISMO_ISO} <= ?")
+            params.append(hasta)
+        if ids is not None:
+            # A single JSON parameter, whatever the number of ids
+            conditions.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([int(i) for i in ids]))
+        where = " AND ".join(conditions) if conditions else "1 = 1"
+        return where, params
+
+    def buscar_bautismos(
+        self, limit: Optional[int] = None, after_id: int = 0, **filtros
+    ) -> List[Dict]:
+        """
+        Get the records matching the filters (see _filtros_sql), by id.
+
+        :param limit: Maximum number of records
+        :param after_id: Only records with a greater id (keyset pagination)
+        """
+        where, params = self._filtros_sql(**filtros)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    SELECT * FROM bautismos
+                    WHERE id > ? AND {where}
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                    [after_id, *params, -1 if limit is None else limit],
+                )
+
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error buscando bautismos: %s", e)
+            return []
+
+    def iterar_bautismos(
+        self, limit: Optional[int] = None, page_size: int = 500, **filtros
+    ):
+        """
+        Yield the records matching the filters one page at a time.
+
+        Pages are read by id (WHERE id > last) instead of OFFSET, so records
+        updated while the batch runs are neither skipped nor repeated.
+        """
+        after_id, remaining = 0, limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = self.buscar_bautismos(limit=size, after_id=after_id, **filtros)
+            if not page:
+                return
+            yield from page
+            after_id = page[-1]["id"]
+            if remaining is not None:
+                remaining -= len(page)
+            if len(page) < size:
+                return
+
+    def contar_bautismos(self, **filtros) -> int:
+        """Count the records matching the filters (see _filtros_sql)"""
+        where, params = self._filtros_sql(**filtros)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT COUNT(*) FROM bautismos WHERE {where}", params)
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error("Error contando bautismos: %s", e)
+            return 0
+
+    def pagina_bautismos(
+        self,
+        orden: str = "id",
+        descendente: bool = False,
+        despues: Optional[tuple] = None,
+        offset: int = 0,
+        limit: int = 100,
+        **filtros,
+    ) -> List[Dict]:
+        """
+        Get one page of records sorted by a column (see ORDENES).
+
+        Each record carries its sort key in "clave_orden". The next page
+        starts after the last record's (clave_orden, id), so reading page
+        after page stays fast at any depth; offset is only for jumping to a
+        page whose previous one was not read.
+
+        :param orden: Key of ORDENES
+        :param descendente: Sort from the largest value
+        :param despues: (clave_orden, id) of the last record of the previous page
+        :param offset: Records to skip when despues is not given
+        :param limit: Page size
+        """
+        columna = self.ORDENES[orden]
+        where, params = self._filtros_sql(**filtros)
+        direccion = "DESC" if descendente else "ASC"
+        if despues is not None:
+            valor, ultimo_id = despues
+            # SQLite sorts NULL first: it comes last when descending
+            if valor is None and descendente:
+                where += f" AND {columna} IS NULL AND id < ?"
+                params += [ultimo_id]
+            elif valor is None:
+                where += f" AND ({columna} IS NOT NULL OR id > ?)"
+                params += [ultimo_id]
+            elif descendente:
+                where += (
+                    f" AND ({columna} < ? OR ({columna} = ? AND id < ?)"
+                    f" OR {columna} IS NULL)"
+                )
+                params += [valor, valor, ultimo_id]
+            else:
+                where += f" AND ({columna} > ? OR ({columna} = ? AND id > ?))"
+                params += [valor, valor, ultimo_id]
+            offset = 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    SELECT *, {columna} AS clave_orden FROM bautismos
+                    WHERE {where}
+                    ORDER BY {columna} {direccion}, id {direccion}
+                    LIMIT ? OFFSET ?
+                """,
+                    [*params, limit, offset],
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error obteniendo página de bautismos: %s", e)
+            return []
+
+    def obtener_emails_pendientes(self) -> List[Dict]:
+        """Get records with a generated certificate whose email can be sent"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    SELECT * FROM bautismos
+                    WHERE certificado_generado = 1 AND email_enviado = 0
+                      AND {self.SIN_RECHAZO_PERMANENTE}
+                    ORDER BY id
+                """
+                )
+
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error obteniendo emails pendientes: %s", e)
+            return []
+
+    def siguiente_intento_envio(self, bautismo_ids: List[int]) -> int:
+        """
+        Attempt number for the next email to these records.
+
+        Attempts that never got an answer from the server stay 'pending' and
+        are not counted, so a resend after a crash reuses the same number and
+        therefore the same Message-ID.
+        """
+        if not bautismo_ids:
+            return 1
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                placeholders = ",".join("?" for _ in bautismo_ids)
+                cursor.execute(
+                    f"""
+                    SELECT MAX(intento) FROM bautismo_envios
+                    WHERE bautismo_id IN ({placeholders}) AND estado != 'pending'
+                """,
+                    list(bautismo_ids),
+                )
+                return (cursor.fetchone()[0] or 0) + 1
+        except Exception as e:
+            logger.error("Error obteniendo intento de envío: %s", e)
+            return 1
+
+    def registrar_envio_pendiente(
+        self, bautismo_ids: List[int], message_id: str, email: str, intento: int = 1
+    ) -> bool:
+        """Record that a message is about to be handed to the SMTP server"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    INSERT INTO bautismo_envios
+                        (bautismo_id, message_id, destinatario, intento)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (bautismo_id, message_id) DO UPDATE
+                    SET estado = 'pending', respuesta = NULL, fecha_respuesta = NULL
+                    WHERE estado != 'accepted'
+                """,
+                    [(i, message_id, email, intento) for i in bautismo_ids],
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error registrando envío: %s", e)
+            return False
+
+    def registrar_envio_aceptado(self, message_id: str, respuesta: str = "") -> bool:
+        """
+        Store the server's acceptance of a message and mark its records as
+        sent in the same transaction
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE bautismo_envios
+                    SET estado = 'accepted',
+                        respuesta = COALESCE(NULLIF(?, ''), respuesta),
+                        fecha_respuesta = COALESCE(fecha_respuesta, CURRENT_TIMESTAMP)
+                    WHERE message_id = ?
+                """,
+                    (respuesta, message_id),
+                )
+                cursor.execute(
+                    """
+                    UPDATE bautismos
+                    SET email_enviado = 1, email_estado = 'sent',
+                        email_error = NULL, email_fallo_destino = NULL
+                    WHERE id IN (
+                        SELECT bautismo_id FROM bautismo_envios WHERE message_id = ?
+                    )
+                """,
+                    (message_id,),
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error registrando envío aceptado: %s", e)
+            return False
+
+    def registrar_envio_fallido(self, message_id: str, estado: str, error: str) -> bool:
+        """Store the server's refusal (or the error) for a message"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE bautismo_envios
+                    SET estado = ?, respuesta = ?, fecha_respuesta = CURRENT_TIMESTAMP
+                    WHERE message_id = ?
+                """,
+                    (estado, error, message_id),
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error registrando envío fallido: %s", e)
             return False
 
+    def envio_aceptado(self, message_id: str) -> bool:
+        """Whether the server already accepted a message with this Message-ID"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT 1 FROM bautismo_envios
+                    WHERE message_id = ? AND estado = 'accepted'
+                    LIMIT 1
+                """,
+                    (message_id,),
+                )
+                return cursor.fetchone() is not None
+        except Exception as e:
+            logger.error("Error consultando envío: %s", e)
+            return False
+
+    def crear_run(
+        self, modo: str, config_hash: str, total: Optional[int]
+    ) -> Optional[int]:
+        """Start a batch run record and return its id"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    INSERT INTO bautismo_runs (modo, config_hash, total, fecha_actualizacion)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                    (modo, config_hash, total),
+                )
+                conn.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logger.error("Error creando ejecución: %s", e)
+            return None
+
+    def obtener_run_pendiente(self, modo: str) -> Optional[Dict]:
+        """Get the latest run of this mode that did not complete"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT * FROM bautismo_runs
+                    WHERE modo = ?
+                    ORDER BY id DESC
+                    LIMIT 1
+                """,
+                    (modo,),
+                )
+                row = cursor.fetchone()
+                if row is None or row["estado"] == "completed":
+                    return None
+                run = dict(row)
+                run["contadores"] = json.loads(run["contadores"] or "{}")
+                return run
+        except Exception as e:
+            logger.error("Error obteniendo ejecución pendiente: %s", e)
+            return None
+
+    def actualizar_run(self, run_id: int, ultimo_id, contadores: Dict) -> bool:
+        """Save a checkpoint of a run"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE bautismo_runs
+                    SET ultimo_id = ?, contadores = ?,
+                        fecha_actualizacion = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """,
+                    (ultimo_id, json.dumps(contadores), run_id),
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error guardando punto de control: %s", e)
+            return False
+
+    def finalizar_run(self, run_id: int, estado: str, contadores: Dict) -> bool:
+        """Close a run as completed, cancelled or interrupted"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE bautismo_runs
+                    SET estado = ?, contadores = ?,
+                        fecha_actualizacion = CURRENT_TIMESTAMP,
+                        fecha_fin = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """,
+                    (estado, json.dumps(contadores), run_id),
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error finalizando ejecución: %s", e)
+            return False
+
+    def registrar_eventos(self, eventos: List[tuple]) -> bool:
+        """
+        Save timing events in a single transaction.
+
+        :param eventos: (bautismo_id, run_id, etapa, duracion, resultado,
+            plantilla) tuples, as produced by services.timings.EventRecorder
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    INSERT INTO bautismo_events
+                        (bautismo_id, run_id, etapa, duracion, resultado, plantilla)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                    eventos,
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error guardando tiempos: %s", e)
+            return False
+
+    def ultimo_run_con_eventos(self) -> Optional[int]:
+        """Id of the latest run that recorded timing events"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MAX(run_id) FROM bautismo_events")
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error("Error leyendo tiempos: %s", e)
+            return None
+
+    def obtener_eventos(
+        self, run_id: Optional[int] = None, min_duracion: float = 0.0, **filtros
+    ) -> List[Dict]:
+        """
+        Get the timing events of the records matching the filters.
+
+        :param run_id: Only the events of this run
+        :param min_duracion: Only events that took at least this many seconds
+        :return: Events with the record's church and name, slowest first
+        """
+        where, params = self._filtros_sql(**filtros)
+        conditions, values = ["e.duracion >= ?"], [min_duracion]
+        if run_id is not None:
+            conditions.append("e.run_id = ?")
+            values.append(run_id)
+        if any(value is not None for value in filtros.values()):
+            conditions.append(f"e.bautismo_id IN (SELECT id FROM bautismos WHERE {where})")
+            values.extend(params)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    SELECT e.bautismo_id, e.run_id, e.etapa, e.duracion,
+                           e.resultado, e.plantilla, e.fecha,
+                           NULLIF(b.iglesia, '') AS iglesia,
+                           b.nombre_completo
+                    FROM bautismo_events e
+                    LEFT JOIN bautismos b ON b.id = e.bautismo_id
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY e.duracion DESC
+                """,
+                    values,
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error leyendo tiempos: %s", e)
+            return []
+
     def eliminar_bautismo(self, bautismo_id: int) -> bool:
         """Delete a baptism record"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM bautismos WHERE id = ?", (bautismo_id,))
+                cursor.execute(
+                    "DELETE FROM bautismo_envios WHERE bautismo_id = ?", (bautismo_id,)
+                )
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"Error eliminando bautismo: {e}")
+            logger.error("Error eliminando bautismo: %s", e)
             return False
 
-    def exportar_a_excel(self, excel_path: str) -> bool:
-        """Export database to Excel format"""
+    def exportar_a_excel(self, excel_path: str, **filtros) -> bool:
+        """Export database to Excel format, optionally only the filtered records"""
         try:
             import pandas as pd
         except ImportError:
-            print("Error: pandas no está instalado. Instale con: pip install pandas openpyxl")
+            logger.error("Error: pandas no está instalado. Instale con: pip install pandas openpyxl")
             return False
         
+        where, params = self._filtros_sql(**filtros)
         try:
             with sqlite3.connect(self.db_path) as conn:
                 df = pd.read_sql_query(
-                    """
+                    f"""
                     SELECT nombre_completo, email, fecha_bautismo, iglesia, celula, lider
                     FROM bautismos 
+                    WHERE {where}
                     ORDER BY fecha_registro DESC
                 """,
                     conn,
+                    params=params,
                 )
 
                 # Rename columns to match expected format
@@ -181,38 +1039,70 @@ class DatabaseService:
                 df.to_excel(excel_path, index=False)
                 return True
         except Exception as e:
-            print(f"Error exportando a Excel: {e}")
+            logger.error("Error exportando a Excel: %s", e)
             return False
 
-    def obtener_estadisticas(self) -> Dict:
-        """Get database statistics"""
+    def obtener_estadisticas(self, **filtros) -> Dict:
+        """Get database statistics, optionally for the filtered records only"""
+        where, params = self._filtros_sql(**filtros)
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-
-                # Total records
-                cursor.execute("SELECT COUNT(*) FROM bautismos")
-                total = cursor.fetchone()[0]
-
-                # Pending certificates
                 cursor.execute(
-                    "SELECT COUNT(*) FROM bautismos WHERE certificado_generado = 0"
+                    f"""
+                    SELECT COUNT(*),
+                           COALESCE(SUM(certificado_generado = 0), 0),
+                           COALESCE(SUM(email_enviado = 1), 0),
+                           COALESCE(SUM(email_enviado = 0
+                                        AND NOT {self.SIN_RECHAZO_PERMANENTE}), 0)
+                    FROM bautismos
+                    WHERE {where}
+                """,
+                    params,
                 )
-                pendientes = cursor.fetchone()[0]
-
-                # Sent emails
-                cursor.execute("SELECT COUNT(*) FROM bautismos WHERE email_enviado = 1")
-                emails_enviados = cursor.fetchone()[0]
+                total, pendientes, emails_enviados, emails_rechazados = cursor.fetchone()
 
                 return {
                     "total": total,
                     "pendientes": pendientes,
                     "emails_enviados": emails_enviados,
+                    "emails_rechazados": emails_rechazados,
                     "completados": total - pendientes,
                 }
         except Exception as e:
-            print(f"Error obteniendo estadísticas: {e}")
-            return {"total": 0, "pendientes": 0, "emails_enviados": 0, "completados": 0}
+            logger.error("Error obteniendo estadísticas: %s", e)
+            return {
+                "total": 0,
+                "pendientes": 0,
+                "emails_enviados": 0,
+                "emails_rechazados": 0,
+                "completados": 0,
+            }
+
+    def estadisticas_por_iglesia(self, **filtros) -> List[Dict]:
+        """Record, pending and sent counts per church"""
+        where, params = self._filtros_sql(**filtros)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    SELECT COALESCE(NULLIF(iglesia, ''), '(sin iglesia)') AS iglesia,
+                           COUNT(*) AS total,
+                           SUM(certificado_generado = 0) AS pendientes,
+                           SUM(email_enviado = 1) AS emails_enviados
+                    FROM bautismos
+                    WHERE {where}
+                    GROUP BY 1
+                    ORDER BY total DESC
+                """,
+                    params,
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error obteniendo estadísticas por iglesia: %s", e)
+            return []
 
     def obtener_bautismo_por_id(self, bautismo_id: int) -> Optional[Dict]:
         """Get a specific baptism record by ID"""
@@ -227,7 +1117,7 @@ class DatabaseService:
                 row = cursor.fetchone()
                 return dict(row) if row else None
         except Exception as e:
-            print(f"Error obteniendo bautismo por ID: {e}")
+            logger.error("Error obteniendo bautismo por ID: %s", e)
             return None
 
     def actualizar_bautismo(
@@ -248,15 +1138,27 @@ class DatabaseService:
                     """
                     UPDATE bautismos 
                     SET nombre_completo = ?, email = ?, fecha_bautismo = ?, 
-                        iglesia = ?, celula = ?, lider = ?
+                        iglesia = ?, celula = ?, lider = ?,
+                        email_estado = CASE WHEN email = ? THEN email_estado END,
+                        email_error = CASE WHEN email = ? THEN email_error END
                     WHERE id = ?
                     """,
-                    (nombre, email, fecha_bautismo, iglesia, celula, lider, bautismo_id)
+                    (
+                        nombre,
+                        email,
+                        fecha_bautismo,
+                        iglesia,
+                        celula,
+                        lider,
+                        email,
+                        email,
+                        bautismo_id,
+                    ),
                 )
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"Error actualizando bautismo: {e}")
+            logger.error("Error actualizando bautismo: %s", e)
             return False
 
     def regenerar_certificado(self, bautismo_id: int) -> bool:
@@ -271,5 +1173,152 @@ class DatabaseService:
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"Error regenerando certificado: {e}")
+            logger.error("Error regenerando certificado: %s", e)
+            return False
+
+    def regenerar_certificados(self, bautismo_ids: List[int]) -> bool:
+        """Mark several certificates as not generated in a single update"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "UPDATE bautismos SET certificado_generado = 0 WHERE id = ?",
+                    [(bautismo_id,) for bautismo_id in bautismo_ids],
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error regenerando certificados: %s", e)
+            return False
+
+    def ultimo_cambio(self) -> int:
+        """Id of the latest change log entry (0 if there are none)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                # Not MAX(id): the watcher empties the table as it goes
+                cursor.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'bautismo_cambios'"
+                )
+                row = cursor.fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            logger.error("Error leyendo cambios: %s", e)
+            return 0
+
+    def obtener_cambios(self, desde_id: int, limit: int = 1000):
+        """
+        Get the records changed after a change log entry.
+
+        :return: (distinct record ids, id of the last entry read); the ids
+            are None when entries after desde_id were already pruned (the
+            caller must rescan the records)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT id, bautismo_id FROM bautismo_cambios
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                    (desde_id, limit),
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    return [], desde_id
+                # Entries are only deleted up to an id: a hole means pruning
+                if rows[0][0] != desde_id + 1:
+                    return None, rows[-1][0]
+                ids = list(dict.fromkeys(bautismo_id for _, bautismo_id in rows))
+                return ids, rows[-1][0]
+        except Exception as e:
+            logger.error("Error leyendo cambios: %s", e)
+            return [], desde_id
+
+    def purgar_cambios(self, hasta_id: int) -> bool:
+        """Delete the change log entries that were already processed"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM bautismo_cambios WHERE id <= ?", (hasta_id,))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error("Error purgando cambios: %s", e)
             return False
+
+    def ultimo_cambio_vista(self) -> int:
+        """Id of the latest main window change log entry (0 if there are none)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM bautismo_cambios_vista"
+                )
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error("Error leyendo cambios: %s", e)
+            return 0
+
+    def obtener_cambios_vista(self, desde_id: int) -> Optional[Dict]:
+        """
+        Summarize the record changes after a main window change log entry.
+
+        :return: None when entries after desde_id were already pruned (the
+            window must reload everything); otherwise a dict with ultimo
+            (last entry read), insertados, actualizados and borrados (sets of
+            record ids), columnas (ORDENES keys changed by the updates) and
+            estadisticas (change of each obtener_estadisticas count)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT id, bautismo_id, operacion, columnas,
+                           d_total, d_pendientes, d_enviados, d_rechazados
+                    FROM bautismo_cambios_vista
+                    WHERE id > ?
+                    ORDER BY id
+                """,
+                    (desde_id,),
+                )
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.error("Error leyendo cambios: %s", e)
+            return None
+
+        # Entries are only deleted from the oldest: a hole means pruning
+        if rows and rows[0][0] != desde_id + 1:
+            return None
+        cambios = {
+            "ultimo": rows[-1][0] if rows else desde_id,
+            "insertados": set(),
+            "actualizados": set(),
+            "borrados": set(),
+            "columnas": set(),
+            "estadisticas": dict.fromkeys(
+                ("total", "pendientes", "emails_enviados", "emails_rechazados"), 0
+            ),
+        }
+        mascara = 0
+        estadisticas = cambios["estadisticas"]
+        for _, bautismo_id, operacion, columnas, *deltas in rows:
+            if operacion == "insert":
+                cambios["insertados"].add(bautismo_id)
+            elif operacion == "delete":
+                cambios["borrados"].add(bautismo_id)
+            else:
+                cambios["actualizados"].add(bautismo_id)
+                mascara |= columnas
+            for key, delta in zip(estadisticas, deltas):
+                estadisticas[key] += delta
+        cambios["columnas"] = {
+            orden
+            for bit, (orden, _) in enumerate(self.VISTA_COLUMNAS)
+            if mascara & (1 << bit)
+        }
+        return cambios
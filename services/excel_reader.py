@@ -0,0 +1,134 @@
+"""
+Lectura por streaming del Excel de certificados para Certificador de Bautismos
+
+openpyxl en modo solo lectura recorre la hoja fila a fila sin cargarla
+entera en memoria, así el pipeline empieza a generar PDF mientras el resto
+del archivo todavía se está leyendo, y la memoria no crece con el número
+de filas.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+
+# Columna del Excel -> campo del registro
+COLUMNS = {
+    "nombre completo": "nombre_completo",
+    "Fecha de bautizmo": "fecha_bautismo",
+    "Email": "email",
+    # Se usa la célula como nombre de la iglesia
+    "celula": "iglesia",
+}
+REQUIRED_COLUMNS = ("nombre completo", "Fecha de bautizmo", "Email")
+
+# Columnas del Excel que genera DatabaseService.exportar_a_excel
+EXPORT_COLUMNS = {
+    "Nombre Completo": "nombre_completo",
+    "Fecha de Bautismo": "fecha_bautismo",
+    "Email": "email",
+    "Iglesia": "iglesia",
+    "Célula": "celula",
+    "Líder": "lider",
+}
+EXPORT_REQUIRED_COLUMNS = ("Nombre Completo", "Fecha de Bautismo", "Email")
+
+SHEET_FORMATS = (
+    (COLUMNS, REQUIRED_COLUMNS),
+    (EXPORT_COLUMNS, EXPORT_REQUIRED_COLUMNS),
+)
+FIELDS = ("nombre_completo", "fecha_bautismo", "email", "iglesia", "celula", "lider")
+
+
+class ExcelRow(namedtuple("ExcelRow", ("fila",) + FIELDS)):
+    """Una fila de datos del Excel; fila es su número en la hoja"""
+
+    __slots__ = ()
+
+    def as_record(self):
+        """Registro con las mismas claves que los de la base de datos"""
+        record = {"id": None, **self._asdict()}
+        record["email"] = record["email"] or ""
+        return record
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        # Las celdas con formato de fecha llegan como datetime
+        return value.strftime("%d/%m/%Y")
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _positions(header):
+    """Columna de cada campo de FIELDS (None si falta) según el encabezado"""
+    for columns, required in SHEET_FORMATS:
+        if all(name in header for name in required):
+            by_field = {
+                field: header.index(name)
+                for name, field in columns.items()
+                if name in header
+            }
+            return [by_field.get(field) for field in FIELDS]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    raise ValueError(f"Faltan columnas en el Excel: {', '.join(missing)}")
+
+
+class ExcelReader:
+    """
+    Filas de datos de una hoja de Excel, leídas a medida que se piden.
+
+    Acepta la hoja de certificados original y la que genera la exportación
+    de la base de datos.
+
+    :param path: Ruta del archivo .xlsx
+    :param sheet: Nombre de la hoja (por defecto, la activa)
+    """
+
+    def __init__(self, path, sheet=None):
+        self.path = path
+        self.sheet = sheet
+        self.estimated_rows = None
+
+    def __iter__(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportError(
+                "openpyxl no está instalado. Instale con: pip install openpyxl"
+            )
+
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            sheet = workbook[self.sheet] if self.sheet else workbook.active
+            rows = sheet.iter_rows(values_only=True)
+            header = [_text(value) for value in next(rows, ())]
+            positions = _positions(header)
+            # Según la dimensión guardada en el archivo; puede no estar
+            self.estimated_rows = max(0, (sheet.max_row or 1) - 1) or None
+
+            for number, values in enumerate(rows, start=2):
+                fields = [
+                    _text(values[i]) if i is not None and i < len(values) else None
+                    for i in positions
+                ]
+                if not any(fields):
+                    continue
+                if not fields[0]:
+                    logger.warning("⚠️ Fila %d: sin nombre, se omite", number)
+                    continue
+                yield ExcelRow(number, *fields)
+        finally:
+            workbook.close()
+
+
+def read_excel_records(path, sheet=None):
+    """Registros del Excel (ver ExcelRow.as_record), uno a uno"""
+    for row in ExcelReader(path, sheet):
+        yield row.as_record()
@@ -0,0 +1,134 @@
+"""
+Validación previa de las filas del Excel para Certificador de Bautismos
+
+Antes de generar ningún PDF, las filas se validan por bloques con
+operaciones de pandas sobre columnas enteras (fechas, emails y nombres de
+archivo) en lugar de fila por fila. Las filas que no se pueden procesar
+quedan en un informe de rechazos con su número de fila y el motivo.
+"""
+
+import csv
+import os
+import re
+import pandas as pd
+from services.excel_reader import ExcelRow
+
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+# Lo que safe_name() quita de un nombre para usarlo en un archivo
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w \-]")
+
+
+class ExcelValidator:
+    """
+    Filtrar las filas del Excel por bloques y anotar las rechazadas.
+
+    :param chunk_size: Filas validadas a la vez
+    :param check_dates: Rechazar fechas futuras o con formato inválido
+    :param allow_future: Aceptar fechas futuras (p. ej. al importar)
+    :param today: Fecha de referencia (por defecto, hoy)
+    """
+
+    REPORT_FIELDS = ("fila", "nombre_completo", "motivo")
+
+    def __init__(self, chunk_size=1000, check_dates=True, allow_future=False, today=None):
+        self.chunk_size = max(1, chunk_size)
+        self.check_dates = check_dates
+        self.allow_future = allow_future
+        self.today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+        self.accepted = 0
+        self.rejected = []
+        self.warnings = []
+
+    def validate(self, frame):
+        """
+        Validar un bloque de filas.
+
+        :param frame: DataFrame con las columnas de ExcelRow
+        :return: Registros aceptados (con nombre_archivo ya calculado)
+        """
+        names = frame["nombre_completo"].fillna("").astype(str)
+        safe_names = names.str.replace(UNSAFE_FILENAME_CHARS, "", regex=True).str.rstrip()
+        emails = frame["email"].fillna("").astype(str).str.strip()
+        raw_dates = frame["fecha_bautismo"]
+        dates = pd.to_datetime(raw_dates, format="%d/%m/%Y", errors="coerce")
+
+        # El primer motivo que aplica es el que queda en el informe
+        reasons = pd.Series("", index=frame.index)
+        checks = [(safe_names == "", "nombre no válido para un archivo")]
+        checks.append((raw_dates.isna(), "sin fecha de bautismo"))
+        if self.check_dates:
+            checks.append((dates.isna(), "fecha inválida"))
+            if not self.allow_future:
+                checks.append((dates > self.today, "fecha futura"))
+        for mask, reason in reversed(checks):
+            reasons = reasons.mask(mask, reason)
+
+        bad_email = (emails != "") & ~emails.str.match(EMAIL_PATTERN)
+        rejected = reasons != ""
+
+        for fila, name, reason in zip(
+            frame["fila"][rejected], names[rejected], reasons[rejected]
+        ):
+            self.rejected.append(
+                {"fila": fila, "nombre_completo": name, "motivo": reason}
+            )
+        warned = bad_email & ~rejected
+        for fila, name, email in zip(frame["fila"][warned], names[warned], emails[warned]):
+            self.warnings.append(
+                {
+                    "fila": fila,
+                    "nombre_completo": name,
+                    "motivo": f"email inválido ({email}): no se envía",
+                }
+            )
+
+        accepted = frame.assign(
+            email=emails.mask(bad_email, ""), nombre_archivo=safe_names, id=None
+        )[~rejected]
+        self.accepted += len(accepted)
+        # Una columna sin ningún valor llega como NaN; los registros usan None
+        accepted = accepted.astype(object).where(accepted.notna(), None)
+        return accepted.to_dict("records")
+
+    def records(self, rows):
+        """
+        Registros válidos de un iterable de ExcelRow, validados por bloques.
+
+        Cada bloque se valida entero antes de pasar sus registros a la
+        generación de PDF.
+        """
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield from self.validate(pd.DataFrame(chunk, columns=ExcelRow._fields))
+                chunk = []
+        if chunk:
+            yield from self.validate(pd.DataFrame(chunk, columns=ExcelRow._fields))
+
+    def reason_counts(self):
+        """Filas rechazadas por motivo"""
+        counts = {}
+        for entry in self.rejected:
+            counts[entry["motivo"]] = counts.get(entry["motivo"], 0) + 1
+        return counts
+
+    def save_report(self, path):
+        """
+        Guardar rechazos y avisos en un CSV.
+
+        :return: Ruta del informe, o None si no hay nada que informar
+        """
+        entries = self.rejected + self.warnings
+        if not entries:
+            # Que no quede el informe de una ejecución anterior
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(sorted(entries, key=lambda entry: entry["fila"]))
+        return path
@@ -0,0 +1,234 @@
+"""
+Trabajos en segundo plano para Certificador de Bautismos
+
+La ventana principal lanza la generación, el envío y la entrega de la cola
+como trabajos de JobManager:
+
+- Solo puede haber un trabajo de cada tipo a la vez: un segundo clic en
+  "Generar Certificados" no empieza otro lote sobre los mismos registros.
+- Cada trabajo reserva sus registros (claim); un trabajo de otro tipo que
+  corre al mismo tiempo no los toma. Así se puede enviar lo ya generado
+  mientras se generan otros certificados, sin enviar nada dos veces.
+- Se pueden pausar, reanudar y cancelar. El trabajo no se interrumpe a la
+  fuerza: su BatchProcessor se detiene después de los registros en curso.
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+from services.progress import ProgressTracker
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "en curso"
+PAUSED = "en pausa"
+CANCELLING = "cancelando"
+DONE = "terminado"
+CANCELLED = "cancelado"
+FAILED = "error"
+
+FINISHED_STATES = (DONE, CANCELLED, FAILED)
+
+
+class Job:
+    """
+    Un trabajo en segundo plano y su progreso.
+
+    :param manager: JobManager que lo lanzó
+    :param kind: Tipo de trabajo (solo uno de cada tipo a la vez)
+    :param title: Nombre que ve el usuario
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, manager, kind, title):
+        self.id = next(self._ids)
+        self.manager = manager
+        self.kind = kind
+        self.title = title
+        self.state = RUNNING
+        self.message = ""
+        self.stage = None
+        self.started = time.time()
+        self.finished = None
+        self.tracker = ProgressTracker()
+        self.processor = None
+        # Ids de los registros reservados (ver JobManager.claim)
+        self.claimed = set()
+        self._cancelled = False
+        self._paused = False
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.state not in FINISHED_STATES
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def attach(self, processor):
+        """Controlar este BatchProcessor con pause/resume/cancel"""
+        with self._lock:
+            self.processor = processor
+            # Lo pedido antes de que empezara el lote
+            if self._cancelled:
+                processor.cancel()
+            elif self._paused:
+                processor.pause()
+        return processor
+
+    def claim(self, records):
+        """Registros que no reservó otro trabajo en curso (ver JobManager.claim)"""
+        return self.manager.claim(self, records)
+
+    def progress(self, stage, done, total):
+        """Aviso de progreso del lote (mismo formato que BatchProcessor.progress)"""
+        self.stage = stage
+        self.tracker.update(stage, done, total)
+
+    def pause(self):
+        with self._lock:
+            if self.state != RUNNING:
+                return
+            self._paused = True
+            self.state = PAUSED
+            if self.processor is not None:
+                self.processor.pause()
+        self.manager.changed(self)
+
+    def resume(self):
+        with self._lock:
+            if self.state != PAUSED:
+                return
+            self._paused = False
+            self.state = RUNNING
+            if self.processor is not None:
+                self.processor.resume()
+        self.manager.changed(self)
+
+    def cancel(self):
+        with self._lock:
+            if not self.active:
+                return
+            self._cancelled = True
+            self.state = CANCELLING
+            if self.processor is not None:
+                self.processor.cancel()
+        self.manager.changed(self)
+
+    def progress_text(self):
+        """Hechos/total, ritmo y tiempo restante de la etapa actual"""
+        if self.stage is None:
+            return ""
+        return f"{self.stage} {self.tracker.text(self.stage)}"
+
+    def _finish(self, state, message=None):
+        with self._lock:
+            self.state = state
+            if message is not None:
+                self.message = message
+            self.finished = time.time()
+
+
+class JobManager:
+    """
+    Trabajos en segundo plano de la ventana principal.
+
+    :param on_change: Callback opcional on_change(job) al empezar, pausar,
+        reanudar, cancelar o terminar un trabajo; se llama desde el hilo
+        que hizo el cambio
+    :param keep: Trabajos terminados que se siguen mostrando
+    """
+
+    def __init__(self, on_change=None, keep=10):
+        self.on_change = on_change
+        self.keep = keep
+        self.jobs = []
+        # id de registro -> trabajo que lo reservó
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def start(self, kind, title, target, *args):
+        """
+        Lanzar target(job, *args) en un hilo.
+
+        :return: El Job, o None si ya hay un trabajo de ese tipo en curso
+        """
+        with self._lock:
+            if any(job.kind == kind and job.active for job in self.jobs):
+                return None
+            finished = [other for other in self.jobs if not other.active]
+            for old in finished[: max(0, len(finished) - self.keep + 1)]:
+                self.jobs.remove(old)
+            job = Job(self, kind, title)
+            self.jobs.append(job)
+
+        thread = threading.Thread(
+            target=self._run, args=(job, target, args), daemon=True
+        )
+        thread.start()
+        self.changed(job)
+        return job
+
+    def _run(self, job, target, args):
+        try:
+            target(job, *args)
+            job._finish(CANCELLED if job.cancelled else DONE)
+        except Exception as e:
+            logger.error("❌ Error en el trabajo %s: %s", job.title, e)
+            logger.debug("Error completo", exc_info=True)
+            job._finish(FAILED, str(e))
+        finally:
+            self.release(job)
+        self.changed(job)
+
+    def active(self, kind=None):
+        """Trabajos en curso (de un tipo, o todos)"""
+        with self._lock:
+            return [
+                job
+                for job in self.jobs
+                if job.active and (kind is None or job.kind == kind)
+            ]
+
+    def get(self, job_id):
+        with self._lock:
+            for job in self.jobs:
+                if job.id == job_id:
+                    return job
+        return None
+
+    def claim(self, job, records):
+        """
+        Reservar para job los registros que no tiene otro trabajo en curso.
+
+        :return: Los registros reservados (los demás se dejan fuera)
+        """
+        with self._lock:
+            claimed = []
+            for record in records:
+                owner = self._claims.setdefault(record["id"], job)
+                if owner is job:
+                    job.claimed.add(record["id"])
+                    claimed.append(record)
+        skipped = len(records) - len(claimed)
+        if skipped:
+            logger.info(
+                "⏭️  %s: %d registros ya están en otro trabajo", job.title, skipped
+            )
+        return claimed
+
+    def release(self, job):
+        """Liberar los registros reservados por job"""
+        with self._lock:
+            for record_id in job.claimed:
+                if self._claims.get(record_id) is job:
+                    del self._claims[record_id]
+            job.claimed = set()
+
+    def changed(self, job):
+        if self.on_change is not None:
+            self.on_change(job)
@@ -0,0 +1,114 @@
+"""
+Registro (logging) para Certificador de Bautismos
+
+Todos los servicios escriben con logging en lugar de print. En la consola
+solo aparece lo importante (INFO y superior: avisos, errores y el resumen
+de cada lote); el detalle de cada campo, plantilla y mensaje queda en
+DEBUG. Así un lote grande no pasa el tiempo escribiendo en la consola y
+los errores no se pierden entre miles de líneas.
+
+Los mensajes por registro llevan campos estructurados (extra=...):
+
+    record_id  id del bautismo (None en modo Excel)
+    stage      etapa: generación, envío, base de datos, ...
+    duration   segundos que tardó
+    outcome    resultado: generated, sent, failed, skipped, ...
+
+Con un archivo de log (--log-file o LOG_FILE) cada mensaje queda además
+como una línea JSON con esos campos, para analizarlo después.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+
+LOGGER_NAME = "services"
+STRUCTURED_FIELDS = ("record_id", "stage", "duration", "outcome")
+
+# Atributos propios de logging.LogRecord: lo demás viene de extra=...
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_handlers = []
+_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un objeto JSON por línea con el mensaje y sus campos estructurados"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if isinstance(entry.get("duration"), float):
+            entry["duration"] = round(entry["duration"], 4)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """El mensaje tal cual, como los print de antes; en DEBUG, con el módulo"""
+
+    def format(self, record):
+        message = super().format(record)
+        if record.levelno < logging.INFO:
+            return f"[{record.name.rsplit('.', 1)[-1]}] {message}"
+        return message
+
+
+def configure_logging(level=None, log_file=None, stream=None):
+    """
+    Configurar el registro de los servicios; se puede llamar más de una vez.
+
+    :param level: Nivel de la consola ("DEBUG", "INFO", "WARNING", ...);
+        por defecto LOG_LEVEL del entorno o INFO
+    :param log_file: Archivo JSON-lines con todos los mensajes (DEBUG
+        incluido); por defecto LOG_FILE del entorno, o ninguno
+    :param stream: Salida de la consola (por defecto sys.stdout)
+    :return: Logger raíz de los servicios
+    """
+    level = level or os.environ.get("LOG_LEVEL") or "INFO"
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Nivel de log inválido: {level}")
+    log_file = log_file or os.environ.get("LOG_FILE") or None
+
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        for handler in _handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        _handlers.clear()
+
+        console = logging.StreamHandler(stream or sys.stdout)
+        console.setLevel(level)
+        console.setFormatter(ConsoleFormatter("%(message)s"))
+        _handlers.append(console)
+
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+            file_handler = logging.FileHandler(log_file, encoding="utf-8")
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(JsonLinesFormatter())
+            _handlers.append(file_handler)
+
+        for handler in _handlers:
+            logger.addHandler(handler)
+        # Sin archivo, los logger.debug() de los servicios no cuestan nada
+        logger.setLevel(min(handler.level for handler in _handlers))
+        logger.propagate = False
+    return logger
@@ -0,0 +1,348 @@
+"""
+Envío por lotes de certificados para Certificador de Bautismos
+
+Antes de enviar, los certificados pendientes se agrupan por dirección de
+destino: las familias que comparten un email reciben un solo mensaje con
+varios PDF adjuntos (hasta EMAIL_MAX_ATTACHMENT_MB), en lugar de una
+transacción SMTP por persona. Solo se agrupan registros dados de alta
+dentro de la misma ventana de tiempo (EMAIL_COALESCE_WINDOW_HOURS).
+
+Cada email lleva un Message-ID determinista que se guarda en
+bautismo_envios antes de enviarlo, junto con la respuesta del servidor
+después. Si el proceso se interrumpe entre la entrega y la actualización
+de la base de datos, el siguiente lote reenvía con el mismo Message-ID.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from services.mail_config import load_email_config
+from services.mail_scheduler import DomainScheduler, MailJob
+from services.mail_service import SendResult, certificate_message_id
+from services.mail_spool import spool_certificates_email
+from services.timings import EventRecorder, timer
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_email(address):
+    """Dirección normalizada para agrupar (sin espacios ni mayúsculas)"""
+    return (address or "").strip().lower()
+
+
+def _registered_at(record):
+    value = record.get("fecha_registro")
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+class CertificateGroup:
+    """Certificados que salen en un mismo email"""
+
+    def __init__(self, recipient):
+        self.recipient = recipient
+        self.records = []
+        self.paths = []
+        self.size = 0
+        self.first_registered = None
+
+    @property
+    def ids(self):
+        return [r["id"] for r in self.records if r.get("id") is not None]
+
+    @property
+    def names(self):
+        return [r["nombre_completo"] for r in self.records]
+
+    def add(self, record, path, size):
+        if not self.records:
+            self.first_registered = _registered_at(record)
+        self.records.append(record)
+        self.paths.append(path)
+        self.size += size
+
+    def __len__(self):
+        return len(self.records)
+
+
+def coalesce_certificates(items, window_hours=24.0, max_bytes=18 * 1024 * 1024):
+    """
+    Agrupar certificados por dirección de destino.
+
+    :param items: Lista de (registro, ruta_certificado); la ruta puede ser
+        None si el PDF todavía no existe
+    :param window_hours: Horas máximas entre el primer y el último registro
+        de un grupo (0 = un email por certificado)
+    :param max_bytes: Tamaño máximo de adjuntos por email
+    :return: Lista de CertificateGroup en el orden del primer registro; los
+        registros sin email van cada uno en su propio grupo
+    """
+    groups = []
+    open_groups = {}
+
+    for record, path in items:
+        recipient = record["email"].strip()
+        key = normalize_email(recipient)
+        try:
+            size = os.path.getsize(path) if path else 0
+        except OSError:
+            size = 0
+
+        # Sin dirección no hay nada que agrupar
+        group = open_groups.get(key) if key and window_hours > 0 else None
+        if group is not None:
+            registered = _registered_at(record)
+            outside_window = (
+                registered is not None
+                and group.first_registered is not None
+                and abs((registered - group.first_registered).total_seconds())
+                > window_hours * 3600
+            )
+            if outside_window or group.size + size > max_bytes:
+                group = None
+
+        if group is None:
+            group = CertificateGroup(recipient)
+            groups.append(group)
+            if key:
+                open_groups[key] = group
+        group.add(record, path, size)
+
+    return groups
+
+
+def permanently_rejected(record):
+    """True si la dirección actual del registro fue rechazada de forma permanente"""
+    return (
+        record.get("email_estado") == SendResult.PERMANENT
+        and record.get("email_fallo_destino") == record.get("email")
+    )
+
+
+def new_delivery_summary(records=0, messages=0):
+    """Resumen vacío de una entrega de certificados"""
+    return {
+        "records": records,
+        "messages": messages,
+        "sent": 0,
+        "queued": 0,
+        "failed": 0,
+        "deferred": 0,
+    }
+
+
+class GroupDelivery:
+    """
+    Funciones send/on_result del DomainScheduler para grupos de certificados.
+
+    Con base de datos, cada email queda registrado como pendiente antes de
+    enviarlo y como aceptado (con la respuesta del servidor) después; sus
+    registros se marcan como enviados en la misma transacción.
+
+    :param db: DatabaseService para actualizar el estado (puede ser None)
+    :param config: EmailConfig con el remitente
+    :param summary: Resumen a actualizar (ver new_delivery_summary)
+    :param progress: Callback opcional progress(done, total, group, result)
+    """
+
+    def __init__(self, db, config, summary, progress=None):
+        self.db = db
+        self.config = config
+        self.summary = summary
+        self.progress = progress
+        self.done = 0
+        self._lock = threading.Lock()
+        self._message_ids = {}
+
+    def message_id_for(self, group):
+        """Message-ID del grupo, registrado como pendiente la primera vez"""
+        # Calculado una vez por grupo: los reintentos usan el mismo Message-ID
+        if id(group) not in self._message_ids:
+            attempt = self.db.siguiente_intento_envio(group.ids)
+            message_id = certificate_message_id(
+                self.config, group.ids, group.recipient, attempt
+            )
+            self.db.registrar_envio_pendiente(
+                group.ids, message_id, group.recipient, attempt
+            )
+            self._message_ids[id(group)] = message_id
+        return self._message_ids[id(group)]
+
+    def send(self, session, job):
+        group = job.payload
+        tracked = self.db is not None and group.ids
+        message_id = self.message_id_for(group) if tracked else None
+        return session.send_certificates(
+            group.recipient, group.names, group.paths, message_id=message_id
+        )
+
+    def on_result(self, job, result):
+        db = self.db
+        group = job.payload
+        # Resultado final: el id() del grupo puede reutilizarse para otro
+        message_id = self._message_ids.pop(id(group), None)
+        if result:
+            if message_id:
+                db.registrar_envio_aceptado(
+                    message_id, f"{result.code} {result.message}".strip()
+                )
+            elif db is not None and group.ids:
+                db.marcar_emails_enviados(group.ids)
+            logger.debug(
+                "✅ Email enviado exitosamente a %s%s",
+                group.recipient,
+                f" ({len(group)} certificados)" if len(group) > 1 else "",
+                extra={"record_id": group.ids, "stage": "envío", "outcome": "sent"},
+            )
+            key = "sent"
+        else:
+            # Un error de red puede ocurrir después de que el servidor aceptó
+            # el mensaje: el envío queda pendiente y se reintenta con el mismo ID
+            if message_id and result.status != SendResult.NETWORK:
+                db.registrar_envio_fallido(message_id, result.status, result.message)
+            if db is not None and group.ids:
+                db.registrar_fallos_email(
+                    group.ids, result.status, result.message, group.recipient
+                )
+            logger.warning(
+                "❌ Error enviando email a %s (%s): %s",
+                group.recipient,
+                result.status,
+                result.message,
+                extra={
+                    "record_id": group.ids,
+                    "stage": "envío",
+                    "outcome": result.status,
+                },
+            )
+            permanent = result.status in (SendResult.PERMANENT, SendResult.ERROR)
+            key = "failed" if permanent else None
+        with self._lock:
+            if key:
+                self.summary[key] += len(group)
+            self.done += 1
+            current = self.done
+        if self.progress:
+            self.progress(current, self.summary["messages"], group, result)
+
+
+def spool_group(group, config):
+    """Encolar un grupo en disco; el flusher marca los registros más tarde"""
+    return spool_certificates_email(
+        group.recipient,
+        group.names,
+        group.paths,
+        bautismo_ids=group.ids,
+        config=config,
+    )
+
+
+def deliver_certificates(
+    db,
+    items,
+    config=None,
+    progress=None,
+    cancel=None,
+    session_factory=None,
+    profiler=None,
+    record_timings=False,
+    metrics=None,
+    run_id=None,
+):
+    """
+    Enviar (o encolar) los certificados agrupados por destinatario.
+
+    En modo smtp los grupos se entregan por el planificador por dominio
+    (ver GroupDelivery).
+
+    :param db: DatabaseService para actualizar el estado (puede ser None)
+    :param items: Lista de (registro, ruta_certificado)
+    :param config: EmailConfig a usar
+    :param progress: Callback opcional progress(done, total, group, result)
+    :param cancel: threading.Event opcional; al activarse no se envía nada más
+    :param session_factory: Fábrica de sesiones SMTP (ver DomainScheduler)
+    :param profiler: StageProfiler opcional; los envíos cuentan como "envío"
+    :param record_timings: Guardar en bautismo_events el tiempo de cada envío
+        y de sus pasos (solo con base de datos; ver services.timings)
+    :param metrics: BatchMetrics opcional con los resultados y latencias
+    :param run_id: Ejecución a la que pertenecen los tiempos (ver
+        DatabaseService.crear_run)
+    :return: Resumen con registros enviados, encolados, fallidos y aplazados
+    """
+    config = config or load_email_config()
+    stage = profiler.stage if profiler is not None else lambda name: nullcontext()
+    groups = coalesce_certificates(
+        items,
+        window_hours=config.coalesce_window_hours,
+        max_bytes=int(config.max_attachment_mb * 1024 * 1024),
+    )
+    summary = new_delivery_summary(len(items), len(groups))
+    if not groups:
+        return summary
+
+    if len(groups) < len(items):
+        logger.info("📦 %d certificados agrupados en %d emails", len(items), len(groups))
+
+    if config.transport == "spool":
+        for i, group in enumerate(groups, 1):
+            if cancel is not None and cancel.is_set():
+                break
+            with stage("envío"):
+                ok = spool_group(group, config)
+            summary["queued" if ok else "failed"] += len(group)
+            if metrics is not None:
+                metrics.email("queued" if ok else "failed", len(group))
+            if progress:
+                progress(i, len(groups), group, ok)
+        return summary
+
+    delivery = GroupDelivery(db, config, summary, progress)
+    recorder = None
+    if db is not None and record_timings:
+        recorder = EventRecorder(db.registrar_eventos, run_id)
+
+    def timing(group):
+        return recorder.context(group.ids) if recorder else nullcontext()
+
+    def send(session, job):
+        start = time.perf_counter()
+        result = None
+        try:
+            with timing(job.payload), stage("envío"):
+                result = delivery.send(session, job)
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            if recorder is not None:
+                status = getattr(result, "status", "error")
+                recorder.add("envío", duration, status, job.payload.ids)
+            if metrics is not None:
+                metrics.send_attempt(duration)
+
+    def on_result(job, result):
+        with timing(job.payload), timer("base de datos"):
+            delivery.on_result(job, result)
+        if metrics is not None:
+            metrics.email(result.status, len(job.payload))
+
+    scheduler = DomainScheduler(
+        config,
+        send,
+        on_result=on_result,
+        stop_event=cancel,
+        session_factory=session_factory,
+    )
+    scheduler.run([MailJob(group.recipient, group) for group in groups])
+    if recorder is not None:
+        recorder.flush()
+
+    # Lo que no se envió ni falló de forma definitiva queda para otra vez
+    summary["deferred"] = summary["records"] - summary["sent"] - summary["failed"]
+    return summary
@@ -0,0 +1,291 @@
+"""
+Configuración de email para Certificador de Bautismos
+
+La configuración se lee una sola vez desde .env y el entorno, se valida
+al cargarse y solo se vuelve a leer cuando el archivo .env cambia.
+"""
+
+import os
+import threading
+import time
+from dotenv import dotenv_values, find_dotenv
+
+
+TLS_MODES = ("starttls", "ssl", "none")
+TRANSPORTS = ("smtp", "spool")
+
+
+class EmailConfig:
+    """
+    Configuración de email validada.
+
+    No se modifica después de crearla (la comparten varios hilos): para
+    cambiar algún valor se usa replace(), que devuelve una copia validada.
+    """
+
+    def __init__(
+        self,
+        sender=None,
+        password=None,
+        smtp_server="smtp.gmail.com",
+        smtp_port=587,
+        tls_mode="starttls",
+        timeout=30.0,
+        rate_per_minute=0,
+        max_per_connection=0,
+        transport="smtp",
+        spool_dir=os.path.join("output", "spool"),
+        domain_limits=None,
+        coalesce_window_hours=24.0,
+        max_attachment_mb=18.0,
+        source=None,
+    ):
+        self.sender = sender
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.tls_mode = tls_mode
+        self.timeout = timeout
+        self.rate_per_minute = rate_per_minute
+        self.max_per_connection = max_per_connection
+        self.transport = transport
+        self.spool_dir = spool_dir
+        self.domain_limits = dict(domain_limits or {})
+        self.coalesce_window_hours = coalesce_window_hours
+        self.max_attachment_mb = max_attachment_mb
+        self.source = source
+        # Valores de .env que no se pudieron leer (ver from_mapping)
+        self.parse_errors = []
+        self.errors = self.validate()
+
+    @classmethod
+    def from_mapping(cls, values, source=None):
+        """Construir la configuración a partir de un diccionario de variables"""
+        errors = []
+
+        def as_int(key, default):
+            raw = values.get(key)
+            if raw in (None, ""):
+                return default
+            try:
+                return int(raw)
+            except ValueError:
+                errors.append(f"{key} debe ser un número entero (valor: {raw!r})")
+                return default
+
+        def as_float(key, default):
+            raw = values.get(key)
+            if raw in (None, ""):
+                return default
+            try:
+                return float(raw)
+            except ValueError:
+                errors.append(f"{key} debe ser un número (valor: {raw!r})")
+                return default
+
+        domain_limits = {}
+        for item in (values.get("EMAIL_DOMAIN_LIMITS") or "").split(","):
+            if not item.strip():
+                continue
+            try:
+                domain, limits = item.split("=")
+                concurrency, rate = limits.split("/")
+                domain_limits[domain.strip().lower()] = (int(concurrency), int(rate))
+            except ValueError:
+                errors.append(
+                    f"EMAIL_DOMAIN_LIMITS: entrada inválida {item.strip()!r} "
+                    "(formato: dominio=conexiones/por_minuto)"
+                )
+
+        smtp_port = as_int("SMTP_PORT", 587)
+        tls_mode = (values.get("SMTP_TLS") or "").strip().lower()
+        if not tls_mode:
+            tls_mode = "ssl" if smtp_port == 465 else "starttls"
+
+        config = cls(
+            sender=values.get("EMAIL_SENDER") or None,
+            password=values.get("EMAIL_PASSWORD") or None,
+            smtp_server=values.get("SMTP_SERVER") or "smtp.gmail.com",
+            smtp_port=smtp_port,
+            tls_mode=tls_mode,
+            timeout=as_float("SMTP_TIMEOUT", 30.0),
+            rate_per_minute=as_int("EMAIL_RATE_PER_MINUTE", 0),
+            max_per_connection=as_int("EMAIL_MAX_PER_CONNECTION", 0),
+            transport=(values.get("EMAIL_TRANSPORT") or "smtp").strip().lower(),
+            spool_dir=values.get("EMAIL_SPOOL_DIR") or os.path.join("output", "spool"),
+            domain_limits=domain_limits,
+            coalesce_window_hours=as_float("EMAIL_COALESCE_WINDOW_HOURS", 24.0),
+            max_attachment_mb=as_float("EMAIL_MAX_ATTACHMENT_MB", 18.0),
+            source=source,
+        )
+        config.parse_errors = errors
+        config.errors = errors + config.errors
+        return config
+
+    def validate(self):
+        """Validar la configuración y devolver la lista de errores"""
+        errors = []
+        if not self.sender:
+            errors.append("EMAIL_SENDER no está configurado")
+        elif "@" not in self.sender:
+            errors.append(f"EMAIL_SENDER no es un email válido: {self.sender}")
+        if not self.password:
+            errors.append("EMAIL_PASSWORD no está configurado")
+        if not self.smtp_server:
+            errors.append("SMTP_SERVER no está configurado")
+        if not 0 < self.smtp_port < 65536:
+            errors.append(f"SMTP_PORT fuera de rango: {self.smtp_port}")
+        if self.tls_mode not in TLS_MODES:
+            errors.append(
+                f"SMTP_TLS debe ser uno de {', '.join(TLS_MODES)} (valor: {self.tls_mode})"
+            )
+        if self.timeout <= 0:
+            errors.append("SMTP_TIMEOUT debe ser mayor que cero")
+        if self.rate_per_minute < 0:
+            errors.append("EMAIL_RATE_PER_MINUTE no puede ser negativo")
+        if self.max_per_connection < 0:
+            errors.append("EMAIL_MAX_PER_CONNECTION no puede ser negativo")
+        for domain, (concurrency, rate) in self.domain_limits.items():
+            if concurrency < 1 or rate < 0:
+                errors.append(f"EMAIL_DOMAIN_LIMITS: límites inválidos para {domain}")
+        if self.coalesce_window_hours < 0:
+            errors.append("EMAIL_COALESCE_WINDOW_HOURS no puede ser negativo")
+        if self.max_attachment_mb <= 0:
+            errors.append("EMAIL_MAX_ATTACHMENT_MB debe ser mayor que cero")
+        if self.transport not in TRANSPORTS:
+            errors.append(
+                f"EMAIL_TRANSPORT debe ser uno de {', '.join(TRANSPORTS)} (valor: {self.transport})"
+            )
+        return errors
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    @property
+    def has_credentials(self):
+        return bool(self.sender and self.password)
+
+    def replace(self, **changes):
+        """Copia de la configuración con algunos valores cambiados"""
+        values = self.as_dict()
+        values.update(changes)
+        config = EmailConfig(source=self.source, **values)
+        # Un valor mal escrito en .env sigue invalidando la copia
+        config.parse_errors = list(self.parse_errors)
+        config.errors = config.parse_errors + config.errors
+        return config
+
+    def as_dict(self):
+        """Representación compatible con el antiguo get_email_config()"""
+        return {
+            "sender": self.sender,
+            "password": self.password,
+            "smtp_server": self.smtp_server,
+            "smtp_port": self.smtp_port,
+            "tls_mode": self.tls_mode,
+            "timeout": self.timeout,
+            "rate_per_minute": self.rate_per_minute,
+            "max_per_connection": self.max_per_connection,
+            "transport": self.transport,
+            "spool_dir": self.spool_dir,
+            "domain_limits": dict(self.domain_limits),
+            "coalesce_window_hours": self.coalesce_window_hours,
+            "max_attachment_mb": self.max_attachment_mb,
+        }
+
+    def __repr__(self):
+        return (
+            f"EmailConfig(sender={self.sender!r}, smtp_server={self.smtp_server!r}, "
+            f"smtp_port={self.smtp_port}, tls_mode={self.tls_mode!r})"
+        )
+
+
+CONFIG_KEYS = (
+    "EMAIL_SENDER",
+    "EMAIL_PASSWORD",
+    "SMTP_SERVER",
+    "SMTP_PORT",
+    "SMTP_TLS",
+    "SMTP_TIMEOUT",
+    "EMAIL_RATE_PER_MINUTE",
+    "EMAIL_MAX_PER_CONNECTION",
+    "EMAIL_TRANSPORT",
+    "EMAIL_SPOOL_DIR",
+    "EMAIL_DOMAIN_LIMITS",
+    "EMAIL_COALESCE_WINDOW_HOURS",
+    "EMAIL_MAX_ATTACHMENT_MB",
+)
+
+
+class EmailConfigLoader:
+    """
+    Carga la configuración una vez y la recarga solo si .env cambia.
+
+    Las variables del entorno del proceso tienen prioridad sobre el archivo,
+    igual que con load_dotenv().
+    """
+
+    # Cada cuánto se vuelve a buscar un .env que no existía
+    SEARCH_INTERVAL = 5.0
+
+    def __init__(self, dotenv_path=None):
+        self._explicit_path = dotenv_path
+        self._path = None
+        self._mtime = None
+        self._last_search = 0.0
+        self._config = None
+        self._lock = threading.Lock()
+
+    def _find_path(self):
+        if self._explicit_path:
+            return self._explicit_path
+        return find_dotenv(usecwd=True) or None
+
+    def _stat(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _needs_reload(self):
+        if self._config is None:
+            return True
+        if self._path is None:
+            return time.monotonic() - self._last_search >= self.SEARCH_INTERVAL
+        return self._stat(self._path) != self._mtime
+
+    def _load(self):
+        if self._path is None or self._stat(self._path) is None:
+            self._path = self._find_path()
+            self._last_search = time.monotonic()
+
+        file_values = {}
+        if self._path:
+            self._mtime = self._stat(self._path)
+            if self._mtime is not None:
+                file_values = dotenv_values(self._path)
+
+        values = {}
+        for key in CONFIG_KEYS:
+            if key in os.environ:
+                values[key] = os.environ[key]
+            elif file_values.get(key) is not None:
+                values[key] = file_values[key]
+
+        self._config = EmailConfig.from_mapping(values, source=self._path)
+
+    def get(self, force_reload=False):
+        """Devolver la configuración, recargando solo si es necesario"""
+        with self._lock:
+            if force_reload or self._needs_reload():
+                self._load()
+            return self._config
+
+
+_default_loader = EmailConfigLoader()
+
+
+def load_email_config(force_reload=False):
+    """Obtener la configuración de email compartida por el proceso"""
+    return _default_loader.get(force_reload=force_reload)
@@ -0,0 +1,392 @@
+"""
+Planificador de envíos por dominio de destino
+
+Agrupa los emails pendientes por proveedor del destinatario (Gmail,
+Hotmail/Outlook, Yahoo, ...). Cada proveedor tiene su propia cola, número
+de conexiones y límite de envíos por minuto, de modo que un proveedor lento
+o estricto no bloquea las entregas al resto.
+
+Cuando un proveedor responde con un aplazamiento (421/450/451/452) su cola
+reduce la velocidad automáticamente y el mensaje se reintenta más tarde;
+tras envíos correctos la velocidad se recupera poco a poco.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from services.mail_service import (
+    MailSession,
+    SendResult,
+    classify_send_error,
+    smtp_error_code,
+)
+
+logger = logging.getLogger(__name__)
+
+# Dominios que comparten la misma infraestructura de entrega
+PROVIDER_GROUPS = {
+    "outlook": (
+        "hotmail.com",
+        "hotmail.es",
+        "hotmail.com.ar",
+        "outlook.com",
+        "outlook.es",
+        "live.com",
+        "live.com.ar",
+        "msn.com",
+    ),
+    "gmail": ("gmail.com", "googlemail.com"),
+    "yahoo": ("yahoo.com", "yahoo.es", "yahoo.com.ar", "ymail.com"),
+}
+
+_DOMAIN_TO_GROUP = {
+    domain: group for group, domains in PROVIDER_GROUPS.items() for domain in domains
+}
+
+DEFERRAL_CODES = (421, 450, 451, 452)
+
+# Espera máxima entre envíos a un proveedor que está aplazando mensajes
+MAX_BACKOFF_INTERVAL = 300.0
+MIN_BACKOFF_INTERVAL = 5.0
+
+
+class DomainPolicy:
+    """Límites de entrega para un dominio o proveedor"""
+
+    def __init__(self, concurrency=2, rate_per_minute=0):
+        self.concurrency = max(1, concurrency)
+        self.rate_per_minute = max(0, rate_per_minute)
+
+    @property
+    def interval(self):
+        return 60.0 / self.rate_per_minute if self.rate_per_minute else 0.0
+
+    def __repr__(self):
+        return f"DomainPolicy(concurrency={self.concurrency}, rate_per_minute={self.rate_per_minute})"
+
+
+# Hotmail/Outlook y Yahoo penalizan ráfagas desde una misma cuenta
+DEFAULT_POLICIES = {
+    "outlook": DomainPolicy(concurrency=1, rate_per_minute=20),
+    "yahoo": DomainPolicy(concurrency=1, rate_per_minute=20),
+}
+
+
+def recipient_domain(address):
+    """Dominio normalizado del destinatario"""
+    return address.rsplit("@", 1)[-1].strip().lower() if address else ""
+
+
+def delivery_group(address):
+    """Proveedor de entrega del destinatario (o su dominio si no es conocido)"""
+    domain = recipient_domain(address)
+    return _DOMAIN_TO_GROUP.get(domain, domain)
+
+
+def is_deferral(error):
+    """True si el servidor pidió reintentar más tarde"""
+    return smtp_error_code(error) in DEFERRAL_CODES
+
+
+class MailJob:
+    """Un email a entregar y los datos que necesita la función de envío"""
+
+    def __init__(self, recipient, payload=None):
+        self.recipient = recipient
+        self.payload = payload
+        self.group = delivery_group(recipient)
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"MailJob({self.recipient!r}, attempts={self.attempts})"
+
+
+class _DomainLane:
+    """Cola de un proveedor con su ritmo adaptativo"""
+
+    def __init__(self, group, policy):
+        self.group = group
+        self.policy = policy
+        self.jobs = deque()
+        self.base_interval = policy.interval
+        self.interval = self.base_interval
+        self.next_slot = 0.0
+        self.deferrals = 0
+        self.workers = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+
+    def take(self, closed, stopping):
+        """Siguiente trabajo; espera nuevos mientras no se cierre la entrada"""
+        with self.lock:
+            while not self.jobs and not closed.is_set() and not stopping():
+                self.ready.wait(0.5)
+            return self.jobs.popleft() if self.jobs else None
+
+    def put(self, job):
+        with self.lock:
+            self.jobs.append(job)
+            self.ready.notify()
+
+    def requeue(self, job):
+        self.put(job)
+
+    def wake(self):
+        with self.lock:
+            self.ready.notify_all()
+
+    def wait_for_slot(self, stopping):
+        """Esperar el turno de envío respetando el intervalo actual"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        while not stopping():
+            delay = slot - time.monotonic()
+            if delay <= 0:
+                return
+            with self.lock:
+                self.ready.wait(min(delay, 0.5))
+
+    def slow_down(self):
+        with self.lock:
+            self.deferrals += 1
+            self.interval = min(
+                max(self.interval * 2, MIN_BACKOFF_INTERVAL), MAX_BACKOFF_INTERVAL
+            )
+
+    def speed_up(self):
+        with self.lock:
+            if self.interval > self.base_interval:
+                self.interval = max(self.base_interval, self.interval * 0.75)
+
+
+class DomainScheduler:
+    """
+    Entrega trabajos agrupados por proveedor con límites independientes.
+
+    :param config: EmailConfig para abrir las sesiones SMTP
+    :param send: Función send(session, job) que entrega un trabajo o lanza
+        excepción; puede devolver el SendResult con la respuesta del servidor
+    :param policies: Diccionario proveedor/dominio -> DomainPolicy
+    :param max_attempts: Intentos por mensaje ante aplazamientos o errores de red
+    :param on_result: Callback on_result(job, result) con el SendResult final,
+        llamado desde los hilos de envío
+    :param concurrency: Conexiones por proveedor, reemplaza las de cada política
+    :param max_pending: Trabajos aceptados y sin resultado como máximo;
+        submit() espera cuando se alcanza (0 = sin límite)
+    :param stop_event: threading.Event compartido para cancelar desde fuera;
+        el planificador solo lo lee (un error de autenticación detiene los
+        envíos, no a quien lo comparte)
+    :param session_factory: Crea la sesión de cada hilo de envío a partir
+        de la configuración (MailSession, o un MailSessionPool)
+
+    Se puede usar de dos formas: run(jobs) con todos los trabajos de una vez,
+    o start() / submit(job) / finish() para recibir trabajos mientras otra
+    etapa los va produciendo.
+    """
+
+    def __init__(
+        self,
+        config,
+        send,
+        policies=None,
+        max_attempts=3,
+        on_result=None,
+        concurrency=None,
+        session_factory=MailSession,
+        max_pending=0,
+        stop_event=None,
+    ):
+        self.config = config
+        self.send = send
+        self.max_attempts = max(1, max_attempts)
+        self.on_result = on_result
+        self.concurrency = concurrency
+        self.session_factory = session_factory or MailSession
+        self.default_policy = DomainPolicy(
+            concurrency=2, rate_per_minute=config.rate_per_minute
+        )
+        self.policies = dict(DEFAULT_POLICIES)
+        for domain, (concurrency, rate) in config.domain_limits.items():
+            self.policies[domain] = DomainPolicy(concurrency, rate)
+        if policies:
+            self.policies.update(policies)
+        self._cancel = stop_event
+        self._stop = threading.Event()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self._lanes = {}
+        self._threads = []
+        self.summary = {}
+
+    @property
+    def connections(self):
+        """Hilos de envío (una conexión SMTP cada uno) abiertos hasta ahora"""
+        return len(self._threads)
+
+    @property
+    def queued(self):
+        """Trabajos esperando su turno en las colas de los proveedores"""
+        return sum(len(lane.jobs) for lane in list(self._lanes.values()))
+
+    def policy_for(self, group):
+        policy = self.policies.get(group, self.default_policy)
+        if self.concurrency:
+            policy = DomainPolicy(self.concurrency, policy.rate_per_minute)
+        return policy
+
+    def stop(self):
+        """Pedir que los hilos terminen después del envío en curso"""
+        self._stop.set()
+        for lane in list(self._lanes.values()):
+            lane.wake()
+
+    def _stopping(self):
+        """True si se llamó a stop() o se canceló desde fuera"""
+        return self._stop.is_set() or (
+            self._cancel is not None and self._cancel.is_set()
+        )
+
+    def _record(self, job, result):
+        if result:
+            outcome = "sent"
+        elif result.retryable or result.status == SendResult.AUTH:
+            outcome = "deferred"
+        else:
+            outcome = "failed"
+        with self._lock:
+            stats = self.summary.setdefault(
+                job.group, {"sent": 0, "failed": 0, "deferred": 0, "deferrals": 0}
+            )
+            stats[outcome] += 1
+        try:
+            if self.on_result:
+                self.on_result(job, result)
+        finally:
+            if self._pending is not None:
+                self._pending.release()
+
+    def _worker(self, lane):
+        # Los límites los aplica la cola del proveedor, no la sesión
+        session = self.session_factory(self.config.replace(rate_per_minute=0))
+        try:
+            while not self._stopping():
+                job = lane.take(self._closed, self._stopping)
+                if job is None:
+                    return
+                lane.wait_for_slot(self._stopping)
+                if self._stopping():
+                    lane.requeue(job)
+                    return
+
+                job.attempts += 1
+                try:
+                    sent = self.send(session, job)
+                except Exception as e:
+                    result = classify_send_error(e)
+                    if result.status == SendResult.AUTH:
+                        # Sin credenciales válidas ningún envío va a funcionar
+                        logger.error("❌ Error de autenticación, deteniendo envíos: %s", e)
+                        self.stop()
+                        self._record(job, result)
+                        return
+                    if is_deferral(e):
+                        lane.slow_down()
+                        logger.warning(
+                            "⏳ %s aplazó el envío a %s (%s); reduciendo a 1 email cada %.0fs",
+                            lane.group,
+                            job.recipient,
+                            result.code,
+                            lane.interval,
+                        )
+                    if result.code == 421 or result.status == SendResult.NETWORK:
+                        # El servidor cerró la sesión o hubo un error de red
+                        session.close()
+                    if result.retryable and job.attempts < self.max_attempts:
+                        lane.requeue(job)
+                    else:
+                        self._record(job, result)
+                    continue
+
+                lane.speed_up()
+                if not isinstance(sent, SendResult):
+                    sent = SendResult(SendResult.SENT)
+                self._record(job, sent)
+        finally:
+            # Una sesión de MailSessionPool vuelve al pool abierta
+            session.release()
+
+    def start(self):
+        """Empezar a aceptar trabajos con submit()"""
+        self._closed.clear()
+        return self
+
+    def submit(self, job):
+        """
+        Añadir un trabajo a la cola de su proveedor.
+
+        Abre otra conexión para el proveedor si todavía no tiene las que
+        permite su política. Con max_pending, espera a que termine algún
+        envío antes de aceptar más.
+        """
+        if self._pending is not None:
+            while not self._pending.acquire(timeout=0.5):
+                if self._stopping():
+                    # Ya no se envía nada: queda como aplazado en finish()
+                    break
+        with self._lock:
+            lane = self._lanes.get(job.group)
+            if lane is None:
+                lane = self._lanes[job.group] = _DomainLane(
+                    job.group, self.policy_for(job.group)
+                )
+            lane.put(job)
+            if lane.workers < lane.policy.concurrency and not self._stopping():
+                lane.workers += 1
+                thread = threading.Thread(target=self._worker, args=(lane,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def finish(self):
+        """
+        Dejar de aceptar trabajos y esperar a que terminen los envíos.
+
+        :return: Resumen por proveedor con enviados, fallidos y aplazados
+        """
+        self._closed.set()
+        for lane in list(self._lanes.values()):
+            lane.wake()
+        for thread in list(self._threads):
+            thread.join()
+
+        for group, lane in self._lanes.items():
+            stats = self.summary.setdefault(
+                group, {"sent": 0, "failed": 0, "deferred": 0, "deferrals": 0}
+            )
+            stats["deferrals"] = lane.deferrals
+            # Trabajos que quedaron en cola por una parada anticipada
+            stats["deferred"] += len(lane.jobs)
+            lane.jobs.clear()
+        return self.summary
+
+    def run(self, jobs):
+        """
+        Entregar todos los trabajos y esperar a que terminen.
+
+        :return: Resumen por proveedor con enviados, fallidos y aplazados
+        """
+        self.start()
+        for job in jobs:
+            self.submit(job)
+        return self.finish()
+
+    def totals(self):
+        """Totales de todos los proveedores"""
+        totals = {"sent": 0, "failed": 0, "deferred": 0}
+        for stats in self.summary.values():
+            for key in totals:
+                totals[key] += stats[key]
+        return totals
@@ -2,53 +2,160 @@
 Servicio de envío de emails para Certificador de Bautismos
 """
 
+import hashlib
+import logging
 import os
+import socket
+import threading
+import time
 import yagmail
 import smtplib
+from yagmail.error import YagAddressError, YagInvalidEmailAddress
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from email.utils import formataddr
-from dotenv import load_dotenv
+from email.utils import formataddr, formatdate
+from services.mail_config import load_email_config
+from services.timings import timer
 
+logger = logging.getLogger(__name__)
 
-def get_email_config():
-    """Obtener configuración de email desde .env"""
-    load_dotenv()
+class SendResult:
+    """
+    Resultado de un envío.
+
+    Es verdadero solo si el servidor aceptó el mensaje, así que se puede
+    usar igual que el antiguo True/False.
+    """
+
+    SENT = "sent"
+    PERMANENT = "permanent"  # 5xx: el destinatario o el mensaje fue rechazado
+    TRANSIENT = "transient"  # 4xx: el servidor pide reintentar más tarde
+    AUTH = "auth"  # credenciales rechazadas
+    NETWORK = "network"  # sin conexión, timeout o conexión cerrada
+    ERROR = "error"  # configuración, archivo u otro error local
+
+    def __init__(self, status, code=None, message="", size=0):
+        self.status = status
+        self.code = code
+        self.message = message
+        # Bytes del mensaje enviado
+        self.size = size
+
+    def __bool__(self):
+        return self.status == self.SENT
+
+    @property
+    def retryable(self):
+        """True si tiene sentido volver a intentarlo en otra ejecución"""
+        return self.status in (self.TRANSIENT, self.NETWORK)
+
+    def __repr__(self):
+        return f"SendResult({self.status!r}, code={self.code}, message={self.message!r})"
+
+
+def smtp_error_code(error):
+    """Código SMTP de una excepción de smtplib, si lo tiene"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return min(codes) if codes else None
+    return getattr(error, "smtp_code", None)
+
+
+def classify_send_error(error):
+    """Convertir una excepción de envío en un SendResult"""
+    code = smtp_error_code(error)
+    message = str(error)
+
+    if isinstance(error, smtplib.SMTPAuthenticationError) or code == 530:
+        return SendResult(SendResult.AUTH, code, message)
+    if isinstance(error, (YagAddressError, YagInvalidEmailAddress)):
+        return SendResult(SendResult.PERMANENT, code, message)
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return SendResult(SendResult.NETWORK, code, message)
+    if code is not None and 500 <= code < 600:
+        return SendResult(SendResult.PERMANENT, code, message)
+    if code is not None and 400 <= code < 500:
+        return SendResult(SendResult.TRANSIENT, code, message)
+    if isinstance(error, (OSError, socket.timeout)):
+        return SendResult(SendResult.NETWORK, code, message)
+    return SendResult(SendResult.ERROR, code, message)
 
-    return {
-        "sender": os.getenv("EMAIL_SENDER"),
-        "password": os.getenv("EMAIL_PASSWORD"),
-        "smtp_server": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
-        "smtp_port": int(os.getenv("SMTP_PORT", "587")),
-    }
+
+def get_email_config():
+    """Obtener configuración de email desde .env (como diccionario)"""
+    return load_email_config().as_dict()
 
 
-def test_email_configuration():
+def test_email_configuration(config=None):
     """Probar si la configuración de email está disponible"""
-    config = get_email_config()
-    return bool(config["sender"] and config["password"])
+    config = config or load_email_config()
+    return config.is_valid
+
+
+def _open_yagmail(config):
+    """Crear cliente yagmail con la configuración indicada"""
+    return yagmail.SMTP(
+        user=config.sender,
+        password=config.password,
+        host=config.smtp_server,
+        port=config.smtp_port,
+        smtp_starttls=config.tls_mode == "starttls",
+        smtp_ssl=config.tls_mode == "ssl",
+        timeout=config.timeout,
+    )
+
+
+class _ReceiptMixin:
+    """Guarda la respuesta del servidor al final del DATA de cada envío"""
+
+    last_reply = None
+
+    def data(self, msg):
+        code, response = super().data(msg)
+        self.last_reply = (code, response)
+        return code, response
+
+
+class _ReceiptSMTP(_ReceiptMixin, smtplib.SMTP):
+    pass
+
+
+class _ReceiptSMTP_SSL(_ReceiptMixin, smtplib.SMTP_SSL):
+    pass
+
+
+def _connect_smtp(config):
+    """Abrir una conexión SMTP autenticada según el modo TLS configurado"""
+    if config.tls_mode == "ssl":
+        server = _ReceiptSMTP_SSL(
+            config.smtp_server, config.smtp_port, timeout=config.timeout
+        )
+    else:
+        server = _ReceiptSMTP(
+            config.smtp_server, config.smtp_port, timeout=config.timeout
+        )
+        if config.tls_mode == "starttls":
+            server.starttls()
+            server.ehlo()
+    server.login(config.sender, config.password)
+    return server
 
 
-def test_email_connection():
+def test_email_connection(config=None):
     """Probar conexión de email enviando un email de prueba"""
     try:
-        config = get_email_config()
-        if not config["sender"] or not config["password"]:
-            return False, "Configuración de email no válida"
+        config = config or load_email_config()
+        if not config.is_valid:
+            return False, "Configuración de email no válida: " + "; ".join(
+                config.errors
+            )
 
-        yag = yagmail.SMTP(
-            user=config["sender"],
-            password=config["password"],
-            host=config["smtp_server"],
-            port=config["smtp_port"],
-            smtp_starttls=True,
-            smtp_ssl=False,
-        )
+        yag = _open_yagmail(config)
 
         # Enviar email de prueba
         yag.send(
-            to=config["sender"],  # Enviar a sí mismo
+            to=config.sender,  # Enviar a sí mismo
             subject="Prueba de Certificador de Bautismos",
             contents="Este es un email de prueba para verificar la configuración del Certificador de Bautismos.",
         )
@@ -60,8 +167,305 @@ def test_email_connection():
         return False, f"Error de conexión: {str(e)}"
 
 
+EMAIL_SUBJECT = "¡Felicitaciones por tu bautismo!"
+
+
+def _congratulations_body(recipient_name):
+    """Cuerpo del email de felicitaciones"""
+    return f"""
+    ¡Hola {recipient_name}!
+    
+    ¡Felicitaciones por tu bautismo! Es un momento muy especial en tu vida espiritual.
+    
+    Adjunto encontrarás tu certificado de bautismo como recordatorio de este día tan importante.
+    
+    Que Dios te bendiga en tu nueva vida en Cristo.
+    
+    Con amor,
+    Tu iglesia
+    """
+
+
+def _group_congratulations_body(recipient_names):
+    """Cuerpo del email cuando varios certificados van a la misma dirección"""
+    if len(recipient_names) > 1:
+        names = ", ".join(recipient_names[:-1]) + " y " + recipient_names[-1]
+    else:
+        names = recipient_names[0]
+    return f"""
+    ¡Hola {names}!
+    
+    ¡Felicitaciones por su bautismo! Es un momento muy especial en su vida espiritual.
+    
+    Adjuntos encontrarán sus certificados de bautismo como recordatorio de este día tan importante.
+    
+    Que Dios los bendiga en su nueva vida en Cristo.
+    
+    Con amor,
+    Tu iglesia
+    """
+
+
+def certificate_message_id(config, bautismo_ids, recipient_email, attempt=1):
+    """
+    Message-ID determinista para el email de uno o varios registros.
+
+    El mismo conjunto de registros, destinatario e intento produce siempre el
+    mismo Message-ID, así que reenviar un mensaje cuyo resultado se perdió
+    no genera un email distinto para el cliente de correo del destinatario.
+
+    :param config: EmailConfig con el remitente (su dominio va en el ID)
+    :param bautismo_ids: IDs de los registros incluidos en el email
+    :param recipient_email: Email del destinatario
+    :param attempt: Número de intento de envío (empieza en 1)
+    :return: Message-ID entre <>
+    """
+    ids = sorted(int(i) for i in bautismo_ids)
+    key = f"{','.join(map(str, ids))}|{recipient_email.strip().lower()}|{attempt}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    domain = config.sender.split("@")[-1] if config.sender else "localhost"
+    return f"<bautismo.{'-'.join(map(str, ids))}.{attempt}.{digest}@{domain}>"
+
+
+def build_certificate_message(
+    config, recipient_email, recipient_name, certificate_path, message_id=None
+):
+    """
+    Construir el mensaje MIME con el certificado adjunto
+
+    :param config: EmailConfig con el remitente
+    :param recipient_email: Email del destinatario
+    :param recipient_name: Nombre del destinatario
+    :param certificate_path: Ruta al certificado PDF
+    :param message_id: Message-ID a usar (opcional)
+    :return: MIMEMultipart listo para enviar
+    """
+    return build_certificates_message(
+        config, recipient_email, [recipient_name], [certificate_path], message_id
+    )
+
+
+def build_certificates_message(
+    config, recipient_email, recipient_names, certificate_paths, message_id=None
+):
+    """
+    Construir un único mensaje MIME con uno o varios certificados adjuntos
+
+    :param config: EmailConfig con el remitente
+    :param recipient_email: Email del destinatario
+    :param recipient_names: Nombres de las personas bautizadas
+    :param certificate_paths: Rutas a sus certificados PDF
+    :param message_id: Message-ID a usar; sin él, lo asigna el servidor
+    :return: MIMEMultipart listo para enviar
+    """
+    msg = MIMEMultipart()
+    msg["From"] = formataddr(("Certificador de Bautismos", config.sender))
+    msg["To"] = recipient_email
+    msg["Subject"] = EMAIL_SUBJECT
+    if message_id:
+        msg["Message-ID"] = message_id
+        msg["Date"] = formatdate(localtime=True)
+
+    # Headers adicionales para mejorar la entrega
+    msg["X-Mailer"] = "Certificador de Bautismos v1.0"
+    msg["X-Priority"] = "3"
+    msg["X-MSMail-Priority"] = "Normal"
+    msg["Importance"] = "normal"
+
+    if len(recipient_names) == 1:
+        body = _congratulations_body(recipient_names[0])
+    else:
+        body = _group_congratulations_body(recipient_names)
+    msg.attach(MIMEText(body, "plain", "utf-8"))
+
+    # Adjuntar archivos PDF
+    for certificate_path in certificate_paths:
+        with open(certificate_path, "rb") as f:
+            pdf_attachment = MIMEApplication(f.read(), _subtype="pdf")
+            pdf_attachment.add_header(
+                "Content-Disposition",
+                "attachment",
+                filename=os.path.basename(certificate_path),
+            )
+            msg.attach(pdf_attachment)
+
+    return msg
+
+
+class MailSession:
+    """
+    Sesión SMTP reutilizable para enviar varios emails por una misma conexión.
+
+    Recibe la configuración de forma explícita, respeta los límites de envío
+    (EMAIL_RATE_PER_MINUTE y EMAIL_MAX_PER_CONNECTION) y se reconecta si el
+    servidor cierra la conexión.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or load_email_config()
+        self._server = None
+        self._sent_on_connection = 0
+        self._last_send = 0.0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """Abrir la conexión si no está abierta"""
+        if self._server is None:
+            if not self.config.is_valid:
+                raise ValueError(
+                    "Configuración de email no válida: "
+                    + "; ".join(self.config.errors)
+                )
+            self._server = _connect_smtp(self.config)
+            self._sent_on_connection = 0
+        return self._server
+
+    def close(self):
+        """Cerrar la conexión SMTP"""
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def release(self):
+        """Terminar de usar la sesión (en una sesión normal, cerrarla)"""
+        self.close()
+
+    def _throttle(self):
+        if self.config.rate_per_minute > 0:
+            interval = 60.0 / self.config.rate_per_minute
+            wait = self._last_send + interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        if (
+            self.config.max_per_connection > 0
+            and self._sent_on_connection >= self.config.max_per_connection
+        ):
+            self.close()
+
+    def send_message(self, msg, recipients):
+        """
+        Enviar un mensaje ya construido por la conexión de la sesión
+
+        :param msg: Mensaje MIME, o su contenido ya serializado (bytes/str)
+        :param recipients: Lista de destinatarios
+        :return: SendResult con la respuesta de aceptación del servidor
+        """
+        data = msg
+        if not isinstance(data, (bytes, str)):
+            with timer("mime"):
+                data = msg.as_string()
+        self._throttle()
+        with timer("smtp"):
+            try:
+                server = self.open()
+                server.sendmail(self.config.sender, recipients, data)
+            except smtplib.SMTPServerDisconnected:
+                # El servidor cerró la conexión: reconectar una vez
+                self._server = None
+                server = self.open()
+                server.sendmail(self.config.sender, recipients, data)
+        self._sent_on_connection += 1
+        self._last_send = time.monotonic()
+
+        code, response = getattr(server, "last_reply", None) or (250, b"")
+        if isinstance(response, bytes):
+            response = response.decode("utf-8", "replace")
+        size = len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+        return SendResult(SendResult.SENT, code=code, message=response, size=size)
+
+    def send_certificate(
+        self, recipient_email, recipient_name, certificate_path, message_id=None
+    ):
+        """Construir y enviar el email de felicitaciones con su certificado"""
+        with timer("mime"):
+            msg = build_certificate_message(
+                self.config, recipient_email, recipient_name, certificate_path, message_id
+            ).as_string()
+        return self.send_message(msg, [recipient_email])
+
+    def send_certificates(
+        self, recipient_email, recipient_names, certificate_paths, message_id=None
+    ):
+        """Enviar varios certificados a la misma dirección en un solo email"""
+        with timer("mime"):
+            msg = build_certificates_message(
+                self.config, recipient_email, recipient_names, certificate_paths, message_id
+            ).as_string()
+        return self.send_message(msg, [recipient_email])
+
+
+class _PooledSession(MailSession):
+    def __init__(self, config, pool):
+        super().__init__(config)
+        self._pool = pool
+        self.released_at = 0.0
+
+    def release(self):
+        self._pool._release(self)
+
+
+class MailSessionPool:
+    """
+    Sesiones SMTP que siguen abiertas después de un lote para el siguiente.
+
+    Se pasa como session_factory al DomainScheduler. Al terminar un lote las
+    sesiones vuelven al pool en lugar de cerrarse; close_idle() cierra las
+    que llevan demasiado tiempo sin usarse, antes de que el servidor corte
+    la conexión por inactividad.
+
+    :param max_idle: Segundos que una sesión puede quedar abierta sin uso
+    """
+
+    def __init__(self, max_idle=60.0):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(config):
+        return repr(sorted(config.as_dict().items()))
+
+    def __call__(self, config):
+        key = self._key(config)
+        with self._lock:
+            for i, (session_key, session) in enumerate(self._idle):
+                if session_key == key:
+                    del self._idle[i]
+                    return session
+        return _PooledSession(config, self)
+
+    def _release(self, session):
+        session.released_at = time.monotonic()
+        with self._lock:
+            self._idle.append((self._key(session.config), session))
+
+    def close_idle(self, max_idle=None):
+        """Cerrar las sesiones sin uso desde hace más de max_idle segundos"""
+        limit = self.max_idle if max_idle is None else max_idle
+        now = time.monotonic()
+        with self._lock:
+            expired = [s for _, s in self._idle if now - s.released_at >= limit]
+            self._idle = [(k, s) for k, s in self._idle if now - s.released_at < limit]
+        for session in expired:
+            session.close()
+        return len(expired)
+
+    def close(self):
+        """Cerrar todas las sesiones del pool"""
+        return self.close_idle(max_idle=0)
+
+
 def send_baptism_congratulations_email(
-    recipient_email, recipient_name, certificate_path
+    recipient_email, recipient_name, certificate_path, config=None, session=None
 ):
     """
     Enviar email de felicitaciones con certificado adjunto
@@ -70,73 +474,75 @@ def send_baptism_congratulations_email(
     :param recipient_email: Email del destinatario
     :param recipient_name: Nombre del destinatario
     :param certificate_path: Ruta al certificado PDF
-    :return: True si se envió correctamente, False en caso contrario
+    :param config: EmailConfig a usar (por defecto la configuración cargada de .env)
+    :param session: MailSession abierta para reutilizar la conexión (opcional)
+    :return: SendResult (verdadero si el servidor aceptó el mensaje)
     """
     try:
-        config = get_email_config()
-        if not config["sender"] or not config["password"]:
-            print(
-                "❌ Error: EMAIL_SENDER y EMAIL_PASSWORD deben estar configurados en .env"
+        if session is not None:
+            config = session.config
+        config = config or load_email_config()
+        if not config.is_valid:
+            logger.error(
+                "❌ Error: configuración de email no válida en .env: %s",
+                "; ".join(config.errors),
             )
-            return False
+            return SendResult(SendResult.ERROR, message="; ".join(config.errors))
 
         # Verificar que el archivo existe
         if not os.path.exists(certificate_path):
-            print(f"❌ Error: No se encontró el archivo {certificate_path}")
-            return False
+            logger.error("❌ Error: No se encontró el archivo %s", certificate_path)
+            return SendResult(
+                SendResult.ERROR, message=f"No se encontró {certificate_path}"
+            )
+
+        # Con una sesión abierta se reutiliza su conexión
+        if session is not None:
+            result = session.send_certificate(
+                recipient_email, recipient_name, certificate_path
+            )
+            logger.debug("✅ Email enviado exitosamente a %s (sesión SMTP)", recipient_email)
+            return result
 
         # Intentar primero con yagmail (método original)
         try:
-            return _send_with_yagmail(
+            _send_with_yagmail(
                 config, recipient_email, recipient_name, certificate_path
             )
+            return SendResult(SendResult.SENT)
         except Exception as yag_error:
-            print(f"⚠️ Yagmail falló, intentando con SMTP directo: {yag_error}")
-            return _send_with_smtp_direct(
+            result = classify_send_error(yag_error)
+            if result.status != SendResult.ERROR:
+                # Respuesta del servidor o fallo de red: SMTP directo
+                # obtendría el mismo resultado
+                logger.error("❌ Error enviando email a %s: %s", recipient_email, yag_error)
+                return result
+            logger.warning("⚠️ Yagmail falló, intentando con SMTP directo: %s", yag_error)
+            _send_with_smtp_direct(
                 config, recipient_email, recipient_name, certificate_path
             )
+            return SendResult(SendResult.SENT)
 
     except Exception as e:
-        print(f"❌ Error enviando email: {e}")
-        return False
+        logger.error("❌ Error enviando email: %s", e)
+        return classify_send_error(e)
 
 
 def _send_with_yagmail(config, recipient_email, recipient_name, certificate_path):
     """Enviar usando yagmail (método original)"""
-    yag = yagmail.SMTP(
-        user=config["sender"],
-        password=config["password"],
-        host=config["smtp_server"],
-        port=config["smtp_port"],
-        smtp_starttls=True,
-        smtp_ssl=False,
-    )
-
-    # Asunto y contenido del email
-    subject = "¡Felicitaciones por tu bautismo!"
-    body = f"""
-    ¡Hola {recipient_name}!
-    
-    ¡Felicitaciones por tu bautismo! Es un momento muy especial en tu vida espiritual.
-    
-    Adjunto encontrarás tu certificado de bautismo como recordatorio de este día tan importante.
-    
-    Que Dios te bendiga en tu nueva vida en Cristo.
-    
-    Con amor,
-    Tu iglesia
-    """
+    yag = _open_yagmail(config)
 
     # Enviar email
-    yag.send(
-        to=recipient_email,
-        subject=subject,
-        contents=body,
-        attachments=certificate_path,
-    )
-
-    yag.close()
-    print(f"✅ Email enviado exitosamente a {recipient_email} (yagmail)")
+    try:
+        yag.send(
+            to=recipient_email,
+            subject=EMAIL_SUBJECT,
+            contents=_congratulations_body(recipient_name),
+            attachments=certificate_path,
+        )
+    finally:
+        yag.close()
+    logger.debug("✅ Email enviado exitosamente a %s (yagmail)", recipient_email)
     return True
 
 
@@ -144,69 +550,31 @@ def _send_with_smtp_direct(config, recipient_email, recipient_name, certificate_
     """Enviar usando SMTP directo con configuraciones mejoradas para Hotmail/Outlook"""
 
     # Crear mensaje
-    msg = MIMEMultipart()
-    msg["From"] = formataddr(("Certificador de Bautismos", config["sender"]))
-    msg["To"] = recipient_email
-    msg["Subject"] = "¡Felicitaciones por tu bautismo!"
-
-    # Headers adicionales para mejorar la entrega
-    msg["X-Mailer"] = "Certificador de Bautismos v1.0"
-    msg["X-Priority"] = "3"
-    msg["X-MSMail-Priority"] = "Normal"
-    msg["Importance"] = "normal"
-
-    # Cuerpo del mensaje
-    body = f"""
-    ¡Hola {recipient_name}!
-    
-    ¡Felicitaciones por tu bautismo! Es un momento muy especial en tu vida espiritual.
-    
-    Adjunto encontrarás tu certificado de bautismo como recordatorio de este día tan importante.
-    
-    Que Dios te bendiga en tu nueva vida en Cristo.
-    
-    Con amor,
-    Tu iglesia
-    """
-
-    msg.attach(MIMEText(body, "plain", "utf-8"))
-
-    # Adjuntar archivo PDF
-    with open(certificate_path, "rb") as f:
-        pdf_attachment = MIMEApplication(f.read(), _subtype="pdf")
-        pdf_attachment.add_header(
-            "Content-Disposition",
-            "attachment",
-            filename=os.path.basename(certificate_path),
-        )
-        msg.attach(pdf_attachment)
+    msg = build_certificate_message(
+        config, recipient_email, recipient_name, certificate_path
+    )
 
     # Conectar y enviar
     try:
-        server = smtplib.SMTP(config["smtp_server"], config["smtp_port"])
-        server.starttls()
-        server.login(config["sender"], config["password"])
-
-        # Configuraciones adicionales para mejorar la entrega
-        server.ehlo()
+        server = _connect_smtp(config)
 
         text = msg.as_string()
-        server.sendmail(config["sender"], recipient_email, text)
+        server.sendmail(config.sender, recipient_email, text)
         server.quit()
 
-        print(f"✅ Email enviado exitosamente a {recipient_email} (SMTP directo)")
+        logger.debug("✅ Email enviado exitosamente a %s (SMTP directo)", recipient_email)
         return True
 
     except Exception as e:
-        print(f"❌ Error con SMTP directo: {e}")
+        logger.error("❌ Error con SMTP directo: %s", e)
         raise e
 
 
-def test_email_delivery_to_hotmail():
+def test_email_delivery_to_hotmail(config=None):
     """Probar específicamente el envío a Hotmail/Outlook"""
     try:
-        config = get_email_config()
-        if not config["sender"] or not config["password"]:
+        config = config or load_email_config()
+        if not config.is_valid:
             return False, "Configuración de email no válida"
 
         # Crear un archivo de prueba
@@ -217,7 +585,7 @@ def test_email_delivery_to_hotmail():
 
         # Probar envío a la misma cuenta (para verificar que funciona)
         result = send_baptism_congratulations_email(
-            config["sender"], "Usuario de Prueba", test_file
+            config.sender, "Usuario de Prueba", test_file, config=config
         )
 
         if os.path.exists(test_file):
@@ -230,25 +598,27 @@ def test_email_delivery_to_hotmail():
 
 
 def send_email_with_alternative_service(
-    recipient_email, recipient_name, certificate_path
+    recipient_email, recipient_name, certificate_path, config=None
 ):
     """
     Método alternativo usando configuraciones más robustas para Hotmail/Outlook
     """
     try:
-        config = get_email_config()
-        if not config["sender"] or not config["password"]:
-            print("❌ Error: Configuración de email no válida")
-            return False
+        config = config or load_email_config()
+        if not config.is_valid:
+            logger.error("❌ Error: Configuración de email no válida")
+            return SendResult(SendResult.ERROR, message="; ".join(config.errors))
 
         # Verificar que el archivo existe
         if not os.path.exists(certificate_path):
-            print(f"❌ Error: No se encontró el archivo {certificate_path}")
-            return False
+            logger.error("❌ Error: No se encontró el archivo %s", certificate_path)
+            return SendResult(
+                SendResult.ERROR, message=f"No se encontró {certificate_path}"
+            )
 
         # Crear mensaje con configuraciones específicas para Hotmail
         msg = MIMEMultipart()
-        msg["From"] = formataddr(("Certificador de Bautismos", config["sender"]))
+        msg["From"] = formataddr(("Certificador de Bautismos", config.sender))
         msg["To"] = recipient_email
         msg["Subject"] = "¡Felicitaciones por tu bautismo!"
 
@@ -258,7 +628,7 @@ def send_email_with_alternative_service(
         msg["X-MSMail-Priority"] = "Normal"
         msg["Importance"] = "normal"
         msg["Message-ID"] = (
-            f"<{os.urandom(16).hex()}@{config['smtp_server'].replace('smtp.', '')}>"
+            f"<{os.urandom(16).hex()}@{config.smtp_server.replace('smtp.', '')}>"
         )
         msg["Date"] = smtplib.formatdate(localtime=True)
 
@@ -287,23 +657,21 @@ Tu iglesia"""
             msg.attach(pdf_attachment)
 
         # Conectar con configuraciones mejoradas
-        server = smtplib.SMTP(config["smtp_server"], config["smtp_port"], timeout=30)
-        server.set_debuglevel(0)  # Cambiar a 1 para debug
-        server.starttls()
-        server.ehlo()
-        server.login(config["sender"], config["password"])
+        server = _connect_smtp(config)
 
         # Enviar con configuración específica
         text = msg.as_string()
-        server.sendmail(config["sender"], [recipient_email], text)
+        server.sendmail(config.sender, [recipient_email], text)
         server.quit()
 
-        print(f"✅ Email enviado exitosamente a {recipient_email} (método alternativo)")
-        return True
+        logger.debug(
+            "✅ Email enviado exitosamente a %s (método alternativo)", recipient_email
+        )
+        return SendResult(SendResult.SENT)
 
     except Exception as e:
-        print(f"❌ Error con método alternativo: {e}")
-        return False
+        logger.error("❌ Error con método alternativo: %s", e)
+        return classify_send_error(e)
 
 
 def get_delivery_tips():
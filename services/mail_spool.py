@@ -0,0 +1,287 @@
+"""
+Cola de emails en disco para Certificador de Bautismos
+
+En modo spool (EMAIL_TRANSPORT=spool) los emails no se envían durante la
+generación: se escriben como archivos .eml (RFC 5322) en el directorio de
+cola. Más tarde flush_spool() los entrega por conexiones SMTP reutilizadas
+y marca email_enviado cuando el servidor acepta cada mensaje. El
+Message-ID de cada archivo queda registrado en bautismo_envios, así que un
+mensaje ya aceptado no se vuelve a enviar aunque siga en new/.
+
+Estructura del directorio:
+    <spool>/tmp/     escritura en curso
+    <spool>/new/     pendientes de enviar
+    <spool>/sent/    aceptados por el servidor
+    <spool>/failed/  rechazados de forma permanente o con error local
+"""
+
+import logging
+import os
+import threading
+from email.parser import BytesHeaderParser
+from email.utils import formatdate, make_msgid, getaddresses
+from services.mail_config import load_email_config
+from services.mail_scheduler import DomainScheduler, MailJob
+from services.mail_service import SendResult, build_certificates_message
+
+logger = logging.getLogger(__name__)
+
+SPOOL_FOLDERS = ("tmp", "new", "sent", "failed")
+
+
+def init_spool(spool_dir):
+    """Crear las carpetas de la cola si no existen"""
+    for folder in SPOOL_FOLDERS:
+        os.makedirs(os.path.join(spool_dir, folder), exist_ok=True)
+
+
+def _spool_filename(bautismo_ids, certificate_paths):
+    if bautismo_ids:
+        return "bautismo_" + "_".join(str(i) for i in bautismo_ids) + ".eml"
+    stem = os.path.splitext(os.path.basename(certificate_paths[0]))[0]
+    return f"{stem}.eml"
+
+
+def spool_certificate_email(
+    recipient_email,
+    recipient_name,
+    certificate_path,
+    bautismo_id=None,
+    config=None,
+):
+    """
+    Escribir el email de felicitaciones en la cola en lugar de enviarlo.
+
+    El nombre del archivo depende del registro, así que volver a encolar el
+    mismo bautismo reemplaza el mensaje anterior en vez de duplicarlo.
+
+    :return: Ruta del archivo .eml en la cola, o None si hubo un error
+    """
+    return spool_certificates_email(
+        recipient_email,
+        [recipient_name],
+        [certificate_path],
+        bautismo_ids=[bautismo_id] if bautismo_id is not None else None,
+        config=config,
+    )
+
+
+def spool_certificates_email(
+    recipient_email,
+    recipient_names,
+    certificate_paths,
+    bautismo_ids=None,
+    config=None,
+):
+    """
+    Encolar un único email con uno o varios certificados para la misma dirección.
+
+    :return: Ruta del archivo .eml en la cola, o None si hubo un error
+    """
+    try:
+        config = config or load_email_config()
+        for certificate_path in certificate_paths:
+            if not os.path.exists(certificate_path):
+                logger.error("❌ Error: No se encontró el archivo %s", certificate_path)
+                return None
+
+        msg = build_certificates_message(
+            config, recipient_email, recipient_names, certificate_paths
+        )
+        domain = config.sender.split("@")[-1] if config.sender else None
+        msg["Date"] = formatdate(localtime=True)
+        msg["Message-ID"] = make_msgid(domain=domain)
+        if bautismo_ids:
+            msg["X-Bautismo-Id"] = ",".join(str(i) for i in bautismo_ids)
+
+        init_spool(config.spool_dir)
+        filename = _spool_filename(bautismo_ids, certificate_paths)
+        tmp_path = os.path.join(config.spool_dir, "tmp", filename)
+        final_path = os.path.join(config.spool_dir, "new", filename)
+
+        # Escribir en tmp y renombrar para que el flusher nunca vea mensajes a medias
+        with open(tmp_path, "wb") as f:
+            f.write(msg.as_bytes())
+        os.replace(tmp_path, final_path)
+
+        logger.debug(
+            "📥 Email para %s encolado en %s",
+            recipient_email,
+            final_path,
+            extra={"record_id": bautismo_ids, "stage": "envío", "outcome": "queued"},
+        )
+        return final_path
+
+    except Exception as e:
+        logger.error("❌ Error encolando email para %s: %s", recipient_email, e)
+        return None
+
+
+def pending_spool_files(spool_dir):
+    """Lista ordenada de archivos pendientes en la cola"""
+    new_dir = os.path.join(spool_dir, "new")
+    if not os.path.isdir(new_dir):
+        return []
+    return sorted(
+        os.path.join(new_dir, name)
+        for name in os.listdir(new_dir)
+        if name.endswith(".eml")
+    )
+
+
+def _read_spooled(path):
+    """Leer el mensaje tal cual está en disco y sus cabeceras de envío"""
+    with open(path, "rb") as f:
+        data = f.read()
+    headers = BytesHeaderParser().parsebytes(data)
+    recipients = [address for _, address in getaddresses(headers.get_all("To", []))]
+    ids = headers.get("X-Bautismo-Id") or ""
+    bautismo_ids = [int(i) for i in ids.split(",") if i.strip()]
+    return data, recipients, bautismo_ids, headers.get("Message-ID")
+
+
+def _move(path, spool_dir, folder):
+    os.replace(path, os.path.join(spool_dir, folder, os.path.basename(path)))
+
+
+def flush_spool(
+    db=None, config=None, connections=None, limit=None, progress=None, cancel=None
+):
+    """
+    Entregar los mensajes de la cola agrupados por dominio de destino.
+
+    Cada proveedor usa sus propias conexiones SMTP reutilizadas y sus límites
+    (ver services.mail_scheduler). Los mensajes aceptados pasan a sent/ y su
+    registro se marca como enviado. Los rechazos permanentes y los errores
+    locales (un mensaje que no se puede enviar tal como está) pasan a
+    failed/; los aplazados se quedan en new/ para el siguiente intento.
+
+    :param db: DatabaseService para marcar email_enviado (opcional)
+    :param config: EmailConfig a usar
+    :param connections: Conexiones por dominio (por defecto, las de cada política)
+    :param limit: Máximo de mensajes a entregar en esta llamada
+    :param progress: Callback opcional progress(done, total, path, ok)
+    :param cancel: threading.Event opcional para detener la entrega
+    :return: Diccionario con el resumen de la entrega
+    """
+    config = config or load_email_config()
+    init_spool(config.spool_dir)
+    files = pending_spool_files(config.spool_dir)
+    if limit:
+        files = files[:limit]
+
+    summary = {"total": len(files), "sent": 0, "failed": 0, "deferred": 0}
+    if not files:
+        return summary
+
+    jobs = []
+    for path in files:
+        try:
+            _, recipients, bautismo_ids, message_id = _read_spooled(path)
+        except OSError as e:
+            logger.warning("⚠️ No se pudo leer %s: %s", path, e)
+            summary["failed"] += 1
+            continue
+        except ValueError as e:
+            # Cabecera X-Bautismo-Id inválida: no se puede enviar tal como está
+            logger.warning("❌ Mensaje inválido en la cola %s: %s", path, e)
+            _move(path, config.spool_dir, "failed")
+            summary["failed"] += 1
+            continue
+        recipient = recipients[0] if recipients else ""
+        tracked = db is not None and bautismo_ids and message_id
+        if tracked and db.envio_aceptado(message_id):
+            # Aceptado en una ejecución anterior que se cortó antes de moverlo
+            logger.info("↪️ %s ya fue aceptado por el servidor, no se reenvía", path)
+            db.registrar_envio_aceptado(message_id)
+            _move(path, config.spool_dir, "sent")
+            summary["sent"] += 1
+            continue
+        if tracked:
+            db.registrar_envio_pendiente(
+                bautismo_ids,
+                message_id,
+                recipient,
+                db.siguiente_intento_envio(bautismo_ids),
+            )
+        jobs.append(
+            MailJob(
+                recipient,
+                (path, recipients, bautismo_ids, message_id if tracked else None),
+            )
+        )
+
+    lock = threading.Lock()
+    done = [0]
+
+    def send(session, job):
+        path, recipients, _, _ = job.payload
+        with open(path, "rb") as f:
+            return session.send_message(f.read(), recipients)
+
+    def on_result(job, result):
+        path, recipients, bautismo_ids, message_id = job.payload
+        if result:
+            if message_id:
+                db.registrar_envio_aceptado(
+                    message_id, f"{result.code} {result.message}".strip()
+                )
+            elif db is not None and bautismo_ids:
+                db.marcar_emails_enviados(bautismo_ids)
+            _move(path, config.spool_dir, "sent")
+            logger.debug(
+                "✅ Email enviado a %s (cola)",
+                ", ".join(recipients),
+                extra={"record_id": bautismo_ids, "stage": "cola", "outcome": "sent"},
+            )
+        else:
+            if message_id and result.status != SendResult.NETWORK:
+                db.registrar_envio_fallido(message_id, result.status, result.message)
+            if result.status in (SendResult.PERMANENT, SendResult.ERROR):
+                # Reintentarlo daría el mismo resultado: cuenta como fallido
+                logger.warning(
+                    "❌ %s para %s: %s",
+                    "Rechazo permanente"
+                    if result.status == SendResult.PERMANENT
+                    else "Error local",
+                    path,
+                    result.message,
+                    extra={
+                        "record_id": bautismo_ids,
+                        "stage": "cola",
+                        "outcome": result.status,
+                    },
+                )
+                _move(path, config.spool_dir, "failed")
+            else:
+                logger.warning(
+                    "⚠️ Fallo temporal para %s, se reintentará: %s",
+                    path,
+                    result.message,
+                    extra={
+                        "record_id": bautismo_ids,
+                        "stage": "cola",
+                        "outcome": result.status,
+                    },
+                )
+            if db is not None and bautismo_ids:
+                db.registrar_fallos_email(
+                    bautismo_ids, result.status, result.message, job.recipient
+                )
+        with lock:
+            done[0] += 1
+            current = done[0]
+        if progress:
+            progress(current, len(files), path, bool(result))
+
+    scheduler = DomainScheduler(
+        config, send, on_result=on_result, concurrency=connections, stop_event=cancel
+    )
+    scheduler.run(jobs)
+
+    totals = scheduler.totals()
+    summary["sent"] += totals["sent"]
+    summary["failed"] += totals["failed"]
+    summary["deferred"] = totals["deferred"]
+    summary["domains"] = scheduler.summary
+    return summary
@@ -0,0 +1,334 @@
+"""
+Métricas para Certificador de Bautismos
+
+Con --metrics-file (o METRICS_FILE) el servicio y los lotes escriben cada
+pocos segundos un archivo de texto en el formato de exposición de
+Prometheus. El textfile collector de node_exporter lo publica sin que el
+certificador tenga que abrir ningún puerto:
+
+    python main.py watch --metrics-file /var/lib/node_exporter/bautismos.prom
+
+El archivo se escribe en un temporal de la misma carpeta y se renombra, así
+node_exporter nunca lee uno a medio escribir.
+
+Métricas:
+
+    bautismos_certificates_total{outcome}   certificados: generated, skipped, failed
+    bautismos_emails_total{outcome}         registros por resultado del envío:
+                                            sent, queued, permanent, transient, ...
+    bautismos_render_seconds                histograma del tiempo de generación
+    bautismos_send_seconds                  histograma del tiempo de cada envío
+    bautismos_queue_depth{queue}            elementos esperando en cada cola
+    bautismos_records{state}                registros por estado (obtener_estadisticas)
+    bautismos_batches_total{status}         lotes terminados por estado
+    bautismos_last_batch_timestamp_seconds  fin del último lote
+"""
+
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+from services.mail_spool import pending_spool_files
+
+logger = logging.getLogger(__name__)
+
+RENDER_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Métrica con etiquetas; cada combinación de valores es una serie"""
+
+    kind = "untyped"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        """(sufijo, etiquetas, valor) de cada serie"""
+        with self._lock:
+            series = sorted(self._series.items())
+        return [("", _labels(self.labels, key), value) for key, value in series]
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {_escape(self.description)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=RENDER_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._series.items()
+            )
+        samples = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                le = _labels(self.labels, key, [("le", _format_value(bound))])
+                samples.append(("_bucket", le, cumulative))
+            labels = _labels(self.labels, key)
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Conjunto de métricas que se escriben juntas"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self._add(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self._add(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=RENDER_BUCKETS):
+        return self._add(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        """Texto en el formato de exposición de Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def write_textfile(path, text):
+    """Escribir el archivo de forma atómica (temporal en la misma carpeta y renombrar)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # node_exporter solo lee *.prom: el temporal no se confunde con las métricas
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bautismos-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        # node_exporter suele correr con otro usuario
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class BatchMetrics:
+    """
+    Métricas de los lotes y del modo servicio.
+
+    El pipeline las actualiza a medida que trabaja; los valores que se leen
+    de fuera (colas y registros de la base de datos) se actualizan en
+    collect(), justo antes de escribir el archivo.
+
+    :param db: DatabaseService para los registros por estado (puede ser None)
+    :param spool_dir: Carpeta de la cola de emails en disco (puede ser None)
+    """
+
+    def __init__(self, db=None, spool_dir=None):
+        self.db = db
+        self.spool_dir = spool_dir
+        self.registry = registry = MetricsRegistry()
+        self.certificates = registry.counter(
+            "bautismos_certificates_total",
+            "Certificados procesados por resultado",
+            ["outcome"],
+        )
+        self.emails = registry.counter(
+            "bautismos_emails_total",
+            "Registros por resultado final del envío",
+            ["outcome"],
+        )
+        self.render_seconds = registry.histogram(
+            "bautismos_render_seconds",
+            "Tiempo de generación de cada certificado",
+            buckets=RENDER_BUCKETS,
+        )
+        self.send_seconds = registry.histogram(
+            "bautismos_send_seconds",
+            "Tiempo de cada intento de envío de un email",
+            buckets=SEND_BUCKETS,
+        )
+        self.queue_depth = registry.gauge(
+            "bautismos_queue_depth", "Elementos esperando en cada cola", ["queue"]
+        )
+        self.records = registry.gauge(
+            "bautismos_records", "Registros de la base de datos por estado", ["state"]
+        )
+        self.batches = registry.counter(
+            "bautismos_batches_total", "Lotes terminados por estado", ["status"]
+        )
+        self.last_batch = registry.gauge(
+            "bautismos_last_batch_timestamp_seconds",
+            "Momento (Unix) en que terminó el último lote",
+        )
+        self._queues = None
+        self._queue_names = set()
+
+    def certificate(self, outcome, seconds=None):
+        """Un certificado generado, omitido o fallido"""
+        self.certificates.inc(outcome=outcome)
+        if seconds is not None and outcome != "skipped":
+            self.render_seconds.observe(seconds)
+
+    def send_attempt(self, seconds):
+        self.send_seconds.observe(seconds)
+
+    def email(self, outcome, count=1):
+        """Resultado final del envío de count registros (un email agrupado)"""
+        self.emails.inc(count, outcome=outcome)
+
+    def batch_finished(self, status):
+        self.batches.inc(status=status)
+        self.last_batch.set(time.time())
+
+    def track_queues(self, depths):
+        """
+        Leer las colas del lote en curso.
+
+        :param depths: Función que devuelve {cola: elementos}, o None al
+            terminar el lote (las colas quedan en 0)
+        """
+        self._queues = depths
+        if depths is None:
+            for queue in self._queue_names:
+                self.queue_depth.set(0, queue=queue)
+
+    def collect(self):
+        """Actualizar las colas y los registros por estado"""
+        depths = self._queues
+        if depths is not None:
+            for queue, depth in depths().items():
+                self._queue_names.add(queue)
+                self.queue_depth.set(depth, queue=queue)
+        if self.spool_dir:
+            self.queue_depth.set(len(pending_spool_files(self.spool_dir)), queue="spool")
+        if self.db is not None:
+            stats = self.db.obtener_estadisticas()
+            for state in ("total", "pendientes", "emails_enviados", "emails_rechazados"):
+                self.records.set(stats[state], state=state)
+
+
+class MetricsExporter:
+    """
+    Hilo que escribe las métricas en un archivo cada interval segundos.
+
+    :param metrics: BatchMetrics a escribir
+    :param path: Archivo de destino (para node_exporter, terminado en .prom)
+    :param interval: Segundos entre escrituras
+    """
+
+    def __init__(self, metrics, path, interval=15.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        """Actualizar y escribir las métricas ahora"""
+        try:
+            self.metrics.collect()
+            write_textfile(self.path, self.metrics.registry.render())
+            return True
+        except Exception as e:
+            logger.warning("⚠️  No se pudieron escribir las métricas en %s: %s", self.path, e)
+            logger.debug("Error completo", exc_info=True)
+            return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.write()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dejar de escribir, después de una última escritura"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
@@ -1,8 +1,16 @@
+import io
+import json
+import logging
 import os
 import sys
+import threading
+import time
 from datetime import datetime
 from PyPDF2 import PdfReader, PdfWriter
 from PyPDF2.generic import NameObject, TextStringObject
+from services.timings import set_template, timer
+
+logger = logging.getLogger(__name__)
 
 # Try to import PyMuPDF for better text replacement
 try:
@@ -11,7 +19,7 @@ try:
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
-    print(
+    logger.warning(
         "⚠️  PyMuPDF no disponible. Instalando funcionalidad básica de reemplazo de texto."
     )
 
@@ -27,6 +35,36 @@ def get_resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+# Files read (and data derived from them), reused until the file changes;
+# in watch mode they last across batches
+_file_cache = {}
+_file_cache_lock = threading.Lock()
+
+
+def _cached(path, kind, build):
+    """Return build(path), cached until the file's mtime or size changes"""
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _file_cache_lock:
+        cached = _file_cache.get((path, kind))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    value = build(path)
+    with _file_cache_lock:
+        _file_cache[(path, kind)] = (version, value)
+    return value
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def read_cached(path):
+    """File contents, read from disk only when the file changes"""
+    return _cached(path, "bytes", _read_file)
+
+
 def format_date(date_str):
     """Convert date from DD/MM/AAAA format to 'día de mes de año' format"""
     try:
@@ -55,7 +93,7 @@ def format_date(date_str):
 
         return f"{day} de {month} de {year}"
     except Exception as e:
-        print(f"Error formatting date {date_str}: {e}")
+        logger.warning("Error formatting date %s: %s", date_str, e)
         return date_str
 
 
@@ -67,23 +105,27 @@ def get_pdf_form_fields(template_path):
     :return: Dictionary with field names and their types
     """
     try:
-        reader = PdfReader(template_path)
-        fields = {}
+        return _cached(template_path, "fields", _read_form_fields)
+    except Exception as e:
+        logger.error("❌ Error obteniendo campos del formulario: %s", e)
+        return {}
 
-        for page_num, page in enumerate(reader.pages):
-            if "/Annots" in page:
-                for field in page["/Annots"]:
-                    field_object = field.get_object()
-                    field_name = field_object.get("/T")
-                    field_type = field_object.get("/FT")
 
-                    if field_name:
-                        fields[field_name] = {"type": field_type, "page": page_num + 1}
+def _read_form_fields(template_path):
+    reader = PdfReader(io.BytesIO(read_cached(template_path)))
+    fields = {}
 
-        return fields
-    except Exception as e:
-        print(f"❌ Error obteniendo campos del formulario: {e}")
-        return {}
+    for page_num, page in enumerate(reader.pages):
+        if "/Annots" in page:
+            for field in page["/Annots"]:
+                field_object = field.get_object()
+                field_name = field_object.get("/T")
+                field_type = field_object.get("/FT")
+
+                if field_name:
+                    fields[field_name] = {"type": field_type, "page": page_num + 1}
+
+    return fields
 
 
 def fill_pdf_template(template_path, output_path, data):
@@ -95,43 +137,49 @@ def fill_pdf_template(template_path, output_path, data):
     :param data: Dictionary containing data to fill in the PDF
     """
     try:
-        # Read the template PDF
-        reader = PdfReader(template_path)
+        # Read the template PDF (the file itself is read once while unchanged)
+        with timer("plantilla"):
+            reader = PdfReader(io.BytesIO(read_cached(template_path)))
         writer = PdfWriter()
 
         # Get form fields for debugging
-        fields = get_pdf_form_fields(template_path)
-        if fields:
-            print(f"📋 Campos encontrados en el formulario: {list(fields.keys())}")
-        else:
-            print("⚠️  No se encontraron campos de formulario en el PDF")
+        if logger.isEnabledFor(logging.DEBUG):
+            fields = get_pdf_form_fields(template_path)
+            if fields:
+                logger.debug("📋 Campos encontrados en el formulario: %s", list(fields))
+            else:
+                logger.debug("⚠️  No se encontraron campos de formulario en el PDF")
 
         # Track filled fields
         filled_fields = 0
 
-        # Iterate over all pages
-        for page in reader.pages:
-            # Update the fields with data
-            if "/Annots" in page:
-                for field in page["/Annots"]:
-                    field_object = field.get_object()
-                    field_name = field_object.get("/T")
-
-                    if field_name in data:
-                        # Set the field value
-                        field_object.update(
-                            {NameObject("/V"): TextStringObject(str(data[field_name]))}
-                        )
-                        print(
-                            f"✅ Campo '{field_name}' rellenado con: {data[field_name]}"
-                        )
-                        filled_fields += 1
-                    elif field_name:
-                        print(
-                            f"⚠️  Campo '{field_name}' no tiene datos correspondientes"
-                        )
-
-            writer.add_page(page)
+        with timer("relleno") as step:
+            # Iterate over all pages
+            for page in reader.pages:
+                # Update the fields with data
+                if "/Annots" in page:
+                    for field in page["/Annots"]:
+                        field_object = field.get_object()
+                        field_name = field_object.get("/T")
+
+                        if field_name in data:
+                            # Set the field value
+                            field_object.update(
+                                {NameObject("/V"): TextStringObject(str(data[field_name]))}
+                            )
+                            logger.debug(
+                                "✅ Campo '%s' rellenado con: %s", field_name, data[field_name]
+                            )
+                            filled_fields += 1
+                        elif field_name:
+                            logger.debug(
+                                "⚠️  Campo '%s' no tiene datos correspondientes", field_name
+                            )
+
+                writer.add_page(page)
+
+            if filled_fields == 0:
+                step.outcome = "failed"
 
         # Ensure output directory exists
         output_dir = os.path.dirname(output_path)
@@ -139,23 +187,22 @@ def fill_pdf_template(template_path, output_path, data):
             os.makedirs(output_dir, exist_ok=True)
 
         # Write the filled PDF to a new file
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        with timer("guardado"):
+            with open(output_path, "wb") as output_file:
+                writer.write(output_file)
 
         if filled_fields > 0:
-            print(
-                f"✅ PDF generado con {filled_fields} campos rellenados: {output_path}"
+            logger.debug(
+                "✅ PDF generado con %d campos rellenados: %s", filled_fields, output_path
             )
             return True
         else:
-            print("⚠️  No se rellenaron campos de formulario")
+            logger.debug("⚠️  No se rellenaron campos de formulario")
             return False
 
     except Exception as e:
-        print(f"❌ Error generando PDF: {e}")
-        import traceback
-
-        print(f"Error completo: {traceback.format_exc()}")
+        logger.error("❌ Error generando PDF: %s", e)
+        logger.debug("Error completo", exc_info=True)
         return False
 
 
@@ -166,12 +213,13 @@ def improved_text_replacement(
     Improved text replacement that preserves original font properties.
     """
     if not PYMUPDF_AVAILABLE:
-        print("❌ PyMuPDF no disponible para reemplazo de texto mejorado")
+        logger.error("❌ PyMuPDF no disponible para reemplazo de texto mejorado")
         return False
 
     try:
         # Open the PDF
-        doc = fitz.open(template_path)
+        with timer("plantilla"):
+            doc = fitz.open(stream=read_cached(template_path), filetype="pdf")
 
         # Define the text to replace and their new values
         replacements = {
@@ -180,76 +228,78 @@ def improved_text_replacement(
             "El día:": f"El día: {formatted_date}",
         }
 
-        # Process each page
-        for page in doc:
-            # Get all text blocks with their properties
-            text_blocks = page.get_text("dict")
-
-            for block in text_blocks["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            original_text = span["text"].strip()
-
-                            # Check if this text needs to be replaced
-                            for pattern, replacement in replacements.items():
-                                if pattern in original_text:
-                                    print(
-                                        f"✅ Reemplazando: '{original_text}' -> '{replacement}'"
-                                    )
-
-                                    # Get original font properties
-                                    font_name = span["font"]
-                                    font_size = span["size"]
-                                    font_color = span["color"]
-
-                                    # Get the rectangle of this text
-                                    rect = fitz.Rect(span["bbox"])
-
-                                    # Remove the original text
-                                    page.add_redact_annot(rect, fill=(1, 1, 1))
-                                    page.apply_redactions()
-
-                                    # Insert new text with original properties
-                                    center_x = (rect.x0 + rect.x1) / 2
-                                    center_y = (rect.y0 + rect.y1) / 2
-
-                                    # Try to use original font, fallback to helv
-                                    try:
-                                        page.insert_text(
-                                            (center_x, center_y),
-                                            replacement,
-                                            fontsize=font_size,
-                                            fontname=font_name,
-                                            color=font_color,
-                                        )
-                                    except:
-                                        # Fallback to default font
-                                        page.insert_text(
-                                            (center_x, center_y),
+        with timer("relleno"):
+            # Process each page
+            for page in doc:
+                # Get all text blocks with their properties
+                text_blocks = page.get_text("dict")
+
+                for block in text_blocks["blocks"]:
+                    if "lines" in block:
+                        for line in block["lines"]:
+                            for span in line["spans"]:
+                                original_text = span["text"].strip()
+
+                                # Check if this text needs to be replaced
+                                for pattern, replacement in replacements.items():
+                                    if pattern in original_text:
+                                        logger.debug(
+                                            "✅ Reemplazando: '%s' -> '%s'",
+                                            original_text,
                                             replacement,
-                                            fontsize=font_size,
-                                            fontname="helv",
-                                            color=(0, 0, 0),
                                         )
 
+                                        # Get original font properties
+                                        font_name = span["font"]
+                                        font_size = span["size"]
+                                        font_color = span["color"]
+
+                                        # Get the rectangle of this text
+                                        rect = fitz.Rect(span["bbox"])
+
+                                        # Remove the original text
+                                        page.add_redact_annot(rect, fill=(1, 1, 1))
+                                        page.apply_redactions()
+
+                                        # Insert new text with original properties
+                                        center_x = (rect.x0 + rect.x1) / 2
+                                        center_y = (rect.y0 + rect.y1) / 2
+
+                                        # Try to use original font, fallback to helv
+                                        try:
+                                            page.insert_text(
+                                                (center_x, center_y),
+                                                replacement,
+                                                fontsize=font_size,
+                                                fontname=font_name,
+                                                color=font_color,
+                                            )
+                                        except:
+                                            # Fallback to default font
+                                            page.insert_text(
+                                                (center_x, center_y),
+                                                replacement,
+                                                fontsize=font_size,
+                                                fontname="helv",
+                                                color=(0, 0, 0),
+                                            )
+
         # Ensure output directory exists
         output_dir = os.path.dirname(output_path)
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir, exist_ok=True)
 
         # Save the modified PDF
-        doc.save(output_path)
-        doc.close()
+        with timer("guardado"):
+            doc.save(output_path)
+            doc.close()
 
-        print(f"✅ PDF mejorado generado: {output_path}")
+        logger.debug("✅ PDF mejorado generado: %s", output_path)
         return True
 
     except Exception as e:
-        print(f"❌ Error en reemplazo mejorado: {e}")
-        import traceback
-
-        print(f"Error completo: {traceback.format_exc()}")
+        logger.error("❌ Error en reemplazo mejorado: %s", e)
+        logger.debug("Error completo", exc_info=True)
         return False
 
 
@@ -313,11 +363,11 @@ def create_form_template(template_path):
 
         # Save the PDF
         c.save()
-        print(f"✅ Template simple creado: {template_path}")
+        logger.info("✅ Template simple creado: %s", template_path)
         return True
 
     except Exception as e:
-        print(f"❌ Error creando template: {e}")
+        logger.error("❌ Error creando template: %s", e)
         return False
 
 
@@ -334,18 +384,19 @@ def fill_pdf_with_text_replacement(
     :param church_name: Name of the church
     """
     if not PYMUPDF_AVAILABLE:
-        print("❌ PyMuPDF no disponible para reemplazo de texto")
+        logger.error("❌ PyMuPDF no disponible para reemplazo de texto")
         return False
 
     try:
         # Check if template exists and has the right patterns
         if not os.path.exists(template_path):
-            print("📝 Template no encontrado, creando uno nuevo...")
+            logger.info("📝 Template no encontrado, creando uno nuevo...")
             if not create_form_template(template_path):
                 return False
 
         # Open the PDF
-        doc = fitz.open(template_path)
+        with timer("plantilla"):
+            doc = fitz.open(template_path)
 
         # Define replacements with their font sizes and positions
         replacements = {
@@ -360,75 +411,75 @@ def fill_pdf_with_text_replacement(
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir, exist_ok=True)
 
-        # Process each page
-        for page in doc:
-            total_replacements = 0
-
-            for key, (replacement_text, fontsize, alignment) in replacements.items():
-                # Find all instances of the pattern
-                instances = page.search_for(key)
-
-                if instances:
-                    print(
-                        f"✅ Encontrado patrón '{key}' - {len(instances)} instancia(s)"
-                    )
-
-                # Replace text by first removing original, then inserting new
-                for inst in instances:
-                    # Get the original text rectangle
-                    rect = fitz.Rect(inst.x0, inst.y0, inst.x1, inst.y1)
-
-                    # First, redact (remove) the original text completely
-                    page.add_redact_annot(rect, fill=(1, 1, 1))  # White background
-
-                    # Apply redaction to remove original text
-                    page.apply_redactions()
-
-                    # Calculate position for new text
-                    if alignment == "center":
-                        center_x = (inst.x0 + inst.x1) / 2
-                        center_y = (inst.y0 + inst.y1) / 2
-                    else:
-                        center_x = inst.x0
-                        center_y = inst.y0
-
-                    # Insert the new text with proper formatting
-                    page.insert_text(
-                        (center_x, center_y),
-                        replacement_text,
-                        fontsize=fontsize,
-                        fontname="helv",
-                        color=(0, 0, 0),  # Black color
-                    )
-                    total_replacements += 1
-
-            if total_replacements == 0:
-                print("⚠️  No se encontraron patrones para reemplazar en esta página")
-            else:
-                print(f"✅ Total de reemplazos realizados: {total_replacements}")
+        with timer("relleno"):
+            # Process each page
+            for page in doc:
+                total_replacements = 0
+
+                for key, (replacement_text, fontsize, alignment) in replacements.items():
+                    # Find all instances of the pattern
+                    instances = page.search_for(key)
+
+                    if instances:
+                        logger.debug(
+                            "✅ Encontrado patrón '%s' - %d instancia(s)", key, len(instances)
+                        )
+
+                    # Replace text by first removing original, then inserting new
+                    for inst in instances:
+                        # Get the original text rectangle
+                        rect = fitz.Rect(inst.x0, inst.y0, inst.x1, inst.y1)
+
+                        # First, redact (remove) the original text completely
+                        page.add_redact_annot(rect, fill=(1, 1, 1))  # White background
+
+                        # Apply redaction to remove original text
+                        page.apply_redactions()
+
+                        # Calculate position for new text
+                        if alignment == "center":
+                            center_x = (inst.x0 + inst.x1) / 2
+                            center_y = (inst.y0 + inst.y1) / 2
+                        else:
+                            center_x = inst.x0
+                            center_y = inst.y0
+
+                        # Insert the new text with proper formatting
+                        page.insert_text(
+                            (center_x, center_y),
+                            replacement_text,
+                            fontsize=fontsize,
+                            fontname="helv",
+                            color=(0, 0, 0),  # Black color
+                        )
+                        total_replacements += 1
+
+                if total_replacements == 0:
+                    logger.debug("⚠️  No se encontraron patrones para reemplazar en esta página")
+                else:
+                    logger.debug("✅ Total de reemplazos realizados: %d", total_replacements)
 
         # Save the modified PDF
         try:
-            doc.save(output_path)
-            doc.close()
+            with timer("guardado"):
+                doc.save(output_path)
+                doc.close()
 
             # Verify the file was created and has content
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                print(f"✅ PDF generado con reemplazo de texto: {output_path}")
+                logger.debug("✅ PDF generado con reemplazo de texto: %s", output_path)
                 return True
             else:
-                print(f"❌ El archivo PDF no se creó correctamente: {output_path}")
+                logger.error("❌ El archivo PDF no se creó correctamente: %s", output_path)
                 return False
 
         except Exception as save_error:
-            print(f"❌ Error guardando PDF: {save_error}")
+            logger.error("❌ Error guardando PDF: %s", save_error)
             return False
 
     except Exception as e:
-        print(f"❌ Error en reemplazo de texto: {e}")
-        import traceback
-
-        print(f"Error completo: {traceback.format_exc()}")
+        logger.error("❌ Error en reemplazo de texto: %s", e)
+        logger.debug("Error completo", exc_info=True)
         return False
 
 
@@ -451,22 +502,21 @@ def generate_certificate(name, baptism_date, church_name, template_path, output_
     # Check if correct template exists
     if os.path.exists(correct_template_path):
         template_path = correct_template_path
-        print(f"✅ Usando template correcto: {template_path}")
+        logger.debug("✅ Usando template correcto: %s", template_path)
     else:
-        print(f"⚠️  Template correcto no encontrado, usando: {template_path}")
+        logger.debug("⚠️  Template correcto no encontrado, usando: %s", template_path)
+
+    set_template(template_path)
 
     # Try to load field mapping
     field_mapping = None
     mapping_path = os.path.join("data", "field_mapping.json")
     if os.path.exists(mapping_path):
         try:
-            import json
-
-            with open(mapping_path, "r", encoding="utf-8") as f:
-                field_mapping = json.load(f)
-            print("✅ Cargando mapeo de campos configurado")
+            field_mapping = json.loads(read_cached(mapping_path).decode("utf-8"))
+            logger.debug("✅ Cargando mapeo de campos configurado")
         except Exception as e:
-            print(f"⚠️  Error cargando mapeo: {e}")
+            logger.warning("⚠️  Error cargando mapeo: %s", e)
 
     # Prepare data for the PDF
     if field_mapping:
@@ -480,7 +530,7 @@ def generate_certificate(name, baptism_date, church_name, template_path, output_
                     data[mapped_field] = formatted_date
                 elif standard_field == "NOMBRE_IGLESIA":
                     data[mapped_field] = church_name
-        print(f"📋 Usando mapeo de campos: {list(data.keys())}")
+        logger.debug("📋 Usando mapeo de campos: %s", list(data))
     else:
         # Use default field name variations
         data = {
@@ -497,7 +547,7 @@ def generate_certificate(name, baptism_date, church_name, template_path, output_
             "PARROQUIA": church_name,
             "CONGREGACION": church_name,
         }
-        print("📋 Usando nombres de campos por defecto")
+        logger.debug("📋 Usando nombres de campos por defecto")
 
     # Add additional variations for church name field
     church_field_variations = [
@@ -518,16 +568,69 @@ def generate_certificate(name, baptism_date, church_name, template_path, output_
         for variation in church_field_variations:
             if variation not in data:
                 data[variation] = church_name
-        print(f"🔄 Agregando variaciones del campo iglesia: {church_field_variations}")
+        logger.debug(
+            "🔄 Agregando variaciones del campo iglesia: %s", church_field_variations
+        )
 
-        # First try form field method (more reliable)
-    print("🔄 Usando método de campos de formulario...")
+    # Write to a temporary file next to the final one and rename it once it
+    # is complete, so an interrupted run never leaves a partial certificate
+    partial_path = partial_output_path(output_path)
+    try:
+        if _render_certificate(
+            template_path, partial_path, data, name, formatted_date, church_name
+        ) and os.path.getsize(partial_path) > 0:
+            os.replace(partial_path, output_path)
+            return True
+        return False
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+PARTIAL_SUFFIX = ".partial"
+
+
+def partial_output_path(output_path):
+    """Temporary path used while a certificate is being written"""
+    return f"{output_path}{PARTIAL_SUFFIX}-{os.getpid()}-{threading.get_ident()}"
+
+
+def remove_partial_outputs(output_dir, max_age=3600):
+    """
+    Delete temporary certificate files left behind by an interrupted run.
+
+    Only files older than max_age seconds are removed, so a run that is
+    still writing in another process is not affected.
+
+    :return: Number of files removed
+    """
+    removed = 0
+    if not os.path.isdir(output_dir):
+        return removed
+    now = time.time()
+    for filename in os.listdir(output_dir):
+        if PARTIAL_SUFFIX + "-" not in filename:
+            continue
+        path = os.path.join(output_dir, filename)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _render_certificate(template_path, output_path, data, name, formatted_date, church_name):
+    """Try each filling method in turn until one writes output_path"""
+    # First try form field method (more reliable)
+    logger.debug("🔄 Usando método de campos de formulario...")
     if fill_pdf_template(template_path, output_path, data):
         return True
 
     # Fallback to improved text replacement method if form fields fail
     if PYMUPDF_AVAILABLE:
-        print(
+        logger.debug(
             "⚠️  Campos de formulario fallaron, intentando reemplazo de texto mejorado..."
         )
         if improved_text_replacement(
@@ -536,7 +639,7 @@ def generate_certificate(name, baptism_date, church_name, template_path, output_
             return True
 
         # If improved method fails, try original text replacement
-        print("⚠️  Reemplazo mejorado falló, intentando método original...")
+        logger.debug("⚠️  Reemplazo mejorado falló, intentando método original...")
         if fill_pdf_with_text_replacement(
             template_path, output_path, name, formatted_date, church_name
         ):
@@ -553,19 +656,22 @@ def analyze_template(template_path):
     """
     try:
         if not os.path.exists(template_path):
-            print(f"❌ Template no encontrado: {template_path}")
+            logger.error("❌ Template no encontrado: %s", template_path)
             return
 
-        print(f"🔍 Analizando template: {template_path}")
+        logger.info("🔍 Analizando template: %s", template_path)
 
         # Get form fields
         fields = get_pdf_form_fields(template_path)
 
         if fields:
-            print("📋 Campos de formulario encontrados:")
+            logger.info("📋 Campos de formulario encontrados:")
             for field_name, field_info in fields.items():
-                print(
-                    f"  - {field_name} (tipo: {field_info['type']}, página: {field_info['page']})"
+                logger.info(
+                    "  - %s (tipo: %s, página: %s)",
+                    field_name,
+                    field_info["type"],
+                    field_info["page"],
                 )
 
             # Check for church-related fields specifically
@@ -578,13 +684,13 @@ def analyze_template(template_path):
                 )
             ]
             if church_fields:
-                print(
-                    f"🏛️  Campos relacionados con iglesia encontrados: {church_fields}"
+                logger.info(
+                    "🏛️  Campos relacionados con iglesia encontrados: %s", church_fields
                 )
             else:
-                print("⚠️  No se encontraron campos específicos de iglesia")
+                logger.warning("⚠️  No se encontraron campos específicos de iglesia")
         else:
-            print("⚠️  No se encontraron campos de formulario")
+            logger.warning("⚠️  No se encontraron campos de formulario")
 
         # Check for text patterns if PyMuPDF is available
         if PYMUPDF_AVAILABLE:
@@ -608,15 +714,15 @@ def analyze_template(template_path):
                         found_patterns.append(pattern)
 
                 if found_patterns:
-                    print("📝 Patrones de texto encontrados:")
+                    logger.info("📝 Patrones de texto encontrados:")
                     for pattern in found_patterns:
-                        print(f"  - {pattern}")
+                        logger.info("  - %s", pattern)
                 else:
-                    print("⚠️  No se encontraron patrones de texto comunes")
+                    logger.warning("⚠️  No se encontraron patrones de texto comunes")
 
                 doc.close()
             except Exception as e:
-                print(f"⚠️  Error analizando texto: {e}")
+                logger.warning("⚠️  Error analizando texto: %s", e)
 
     except Exception as e:
-        print(f"❌ Error analizando template: {e}")
+        logger.error("❌ Error analizando template: %s", e)
@@ -0,0 +1,619 @@
+"""
+Motor en etapas para generar y enviar certificados
+
+Las etapas trabajan a la vez y se conectan con colas acotadas:
+
+    lectura -> generación de PDF (N hilos) -> envío por dominio -> escritor de BD
+
+Mientras un email espera la respuesta del servidor SMTP ya se están
+generando los PDF siguientes. Cuando una etapa se atrasa, las colas llenas
+frenan a la anterior (contrapresión), así la memoria no crece con el
+tamaño del lote. Los registros pueden llegar de un generador (p. ej. el
+lector de Excel por streaming): la lectura también es una etapa más.
+"""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from services.mail_batch import (
+    CertificateGroup,
+    GroupDelivery,
+    coalesce_certificates,
+    new_delivery_summary,
+    permanently_rejected,
+    spool_group,
+)
+from services.mail_scheduler import DomainScheduler, MailJob
+from services.progress import format_bytes
+from services import timings
+from services.timings import EventRecorder
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+# Registros leídos de un generador que se agrupan por destinatario a la vez
+STREAM_GROUP_SIZE = 500
+
+# Últimas duraciones que guarda cada etapa para calcular p50/p95
+LATENCY_SAMPLES = 10000
+
+
+class StageStats:
+    """Contadores, tiempos y bytes de una etapa del pipeline"""
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.count = 0
+        self.busy = 0.0
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def add(self, count=1, seconds=0.0, nbytes=0):
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter() - seconds
+            self.count += count
+            self.busy += seconds
+            self.bytes += nbytes
+            if count == 1:
+                self.samples.append(seconds)
+            self.finished = time.perf_counter()
+
+    def percentile(self, q):
+        """Duración (segundos) por debajo de la cual queda el q% de los elementos"""
+        with self._lock:
+            samples = list(self.samples)
+        return timings.percentile(samples, q)
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        """Elementos por segundo desde el primero hasta el último"""
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def utilization(self):
+        """Fracción del tiempo en que los hilos de la etapa estuvieron ocupados"""
+        if self.elapsed <= 0:
+            return 0.0
+        return min(1.0, self.busy / (self.elapsed * self.workers))
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "workers": self.workers,
+            "seconds": round(self.elapsed, 3),
+            "busy_seconds": round(self.busy, 3),
+            "per_second": round(self.throughput, 2),
+            "utilization": round(self.utilization, 2),
+            "p50_seconds": round(self.percentile(50), 4),
+            "p95_seconds": round(self.percentile(95), 4),
+            "bytes": self.bytes,
+        }
+
+    def __str__(self):
+        if self.elapsed < 0.01:
+            return f"{self.name}: {self.count}"
+        text = (
+            f"{self.name}: {self.count} en {self.elapsed:.1f}s "
+            f"({self.throughput:.1f}/s, {self.workers} hilos, "
+            f"{self.utilization:.0%} ocupados"
+        )
+        if self.samples:
+            text += (
+                f", p50 {self.percentile(50) * 1000:.0f}ms"
+                f", p95 {self.percentile(95) * 1000:.0f}ms"
+            )
+        if self.bytes:
+            text += f", {format_bytes(self.bytes)}"
+        return text + ")"
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+class _DatabaseWriter:
+    """
+    Hilo único que aplica en orden las escrituras de las demás etapas.
+
+    Se usa en lugar del DatabaseService: los métodos de WRITE_BEHIND se
+    encolan y el resto (lecturas, y registrar_envio_pendiente, que debe
+    quedar guardado antes de enviar) se llaman directamente.
+    """
+
+    # Escrituras del estado de los registros: cuentan como su paso
+    # "base de datos" para el registro en curso de quien las encola
+    RECORD_UPDATES = (
+        "marcar_certificado_generado",
+        "marcar_emails_enviados",
+        "registrar_fallos_email",
+        "registrar_envio_aceptado",
+        "registrar_envio_fallido",
+    )
+    WRITE_BEHIND = RECORD_UPDATES + ("actualizar_run", "registrar_eventos")
+
+    def __init__(self, db, stats, maxsize=0, stage=None):
+        self._db = db
+        self._stats = stats
+        self._stage = stage or (lambda name: nullcontext())
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if name in self.RECORD_UPDATES:
+            return lambda *args: self._queue.put((attr, args, timings.current()))
+        if name in self.WRITE_BEHIND:
+            return lambda *args: self._queue.put((attr, args, None))
+        return attr
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def queued(self):
+        """Escrituras esperando en la cola"""
+        return self._queue.qsize()
+
+    def wait(self):
+        """Esperar a que se apliquen las escrituras encoladas hasta ahora"""
+        self._queue.join()
+
+    def close(self):
+        """Esperar a que se apliquen todas las escrituras pendientes"""
+        self._queue.put(_DONE)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            try:
+                self._apply(*item)
+            finally:
+                self._queue.task_done()
+
+    def _apply(self, method, args, context):
+        start = time.perf_counter()
+        try:
+            with self._stage("base de datos"), timings.activate(context):
+                with timings.timer("base de datos") as step:
+                    if method(*args) is False:
+                        step.outcome = "failed"
+        except Exception as e:
+            logger.error(
+                "❌ Error escribiendo en la base de datos: %s",
+                e,
+                extra={"stage": "base de datos", "outcome": "failed"},
+            )
+        self._stats.add(seconds=time.perf_counter() - start)
+
+
+class CertificatePipeline:
+    """
+    Generar certificados y enviarlos por etapas que se solapan.
+
+    :param render: Función render(registro) -> ruta del PDF, o None si el
+        registro se omite o falla; se llama desde varios hilos a la vez
+    :param db: DatabaseService para guardar el estado (None en modo Excel)
+    :param config: EmailConfig para enviar; None para solo generar
+    :param render_workers: Hilos de generación de PDF
+    :param queue_size: Capacidad de cada cola entre etapas
+    :param progress: Callback opcional progress(etapa, hechos, total)
+    :param connections: Conexiones SMTP por proveedor (por defecto, las de
+        cada política)
+    :param stop_event: threading.Event compartido para cancelar desde fuera
+    :param checkpoint: RunCheckpoint opcional; se avisa cuando cada registro
+        termina (omitido, generado sin envío, enviado o fallido)
+    :param session_factory: Fábrica de sesiones SMTP (p. ej. un
+        MailSessionPool para conservar las conexiones entre lotes)
+    :param profiler: StageProfiler opcional; perfila cada etapa por separado
+    :param record_timings: Guardar en bautismo_events el tiempo de cada paso
+        de cada registro (solo con base de datos; ver services.timings)
+    :param metrics: BatchMetrics opcional con contadores, colas y latencias
+    :param run_id: Ejecución a la que pertenecen los tiempos si no hay
+        checkpoint (p. ej. la del modo servicio)
+    """
+
+    def __init__(
+        self,
+        render,
+        db=None,
+        config=None,
+        render_workers=2,
+        queue_size=32,
+        progress=None,
+        connections=None,
+        stop_event=None,
+        checkpoint=None,
+        session_factory=None,
+        profiler=None,
+        record_timings=False,
+        metrics=None,
+        run_id=None,
+    ):
+        self.render = render
+        self.db = db
+        self.config = config
+        self.render_workers = max(1, render_workers)
+        self.queue_size = max(1, queue_size)
+        self.progress = progress
+        self.connections = connections
+        self.checkpoint = checkpoint
+        self.session_factory = session_factory
+        self.profiler = profiler
+        self.record_timings = record_timings
+        self.timings = None
+        self.metrics = metrics
+        self.run_id = run_id
+        self.stages = {
+            "lectura": StageStats("lectura"),
+            "generación": StageStats("generación", self.render_workers),
+            "envío": StageStats("envío"),
+            "base de datos": StageStats("base de datos"),
+        }
+        self.summary = new_delivery_summary()
+        self.summary.update({"generated": 0, "skipped": 0})
+        self._lock = threading.Lock()
+        self._stop = stop_event or threading.Event()
+        self._scheduler = None
+        self._writer = None
+        self._render_queue = None
+        self._total = 0
+
+    def stop(self):
+        """Dejar de generar y enviar después de los elementos en curso"""
+        self._stop.set()
+        if self._scheduler is not None:
+            self._scheduler.stop()
+
+    def _stage(self, name):
+        """Contexto que perfila el bloque como parte de la etapa name"""
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name)
+
+    def queue_depths(self):
+        """Elementos esperando en cada cola entre etapas"""
+        depths = {}
+        if self._render_queue is not None:
+            depths["generación"] = self._render_queue.qsize()
+        if self._scheduler is not None:
+            depths["envío"] = self._scheduler.queued
+        if self._writer is not None:
+            depths["base de datos"] = self._writer.queued
+        return depths
+
+    def _timing(self, record_ids):
+        """Contexto que atribuye a estos registros los pasos medidos en el bloque"""
+        if self.timings is None:
+            return nullcontext()
+        return self.timings.context(record_ids)
+
+    def _finished(self, records):
+        """Avisar al punto de control de que estos registros terminaron"""
+        if self.checkpoint is not None and records:
+            # Por el escritor de BD, para no adelantarse al estado de los registros
+            self.checkpoint.done(records, self.summary, self._writer)
+
+    def _read(self, records):
+        """Recorrer los registros midiendo el tiempo de lectura"""
+        stats = self.stages["lectura"]
+        iterator = iter(records)
+        while True:
+            start = time.perf_counter()
+            try:
+                with self._stage("lectura"):
+                    record = next(iterator)
+            except StopIteration:
+                return
+            stats.add(seconds=time.perf_counter() - start)
+            yield record
+
+    def _groups(self, records):
+        """Agrupar los registros por destinatario antes de generar"""
+        if self.config is None:
+            for record in records:
+                group = CertificateGroup(record.get("email", ""))
+                group.add(record, None, 0)
+                yield group
+            return
+        # De un generador se agrupa por bloques para no esperar a leerlo entero
+        size = None if isinstance(records, (list, tuple)) else STREAM_GROUP_SIZE
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, size))
+            if not chunk:
+                return
+            # Los PDF aún no existen: el límite de tamaño se aplica después
+            yield from coalesce_certificates(
+                [(record, None) for record in chunk],
+                window_hours=self.config.coalesce_window_hours,
+                max_bytes=float("inf"),
+            )
+
+    def _render_group(self, group, writer):
+        rendered = []
+        for record in group.records:
+            with self._timing([record.get("id")]):
+                start = time.perf_counter()
+                outcome = "generated"
+                try:
+                    with self._stage("generación"):
+                        path = self.render(record)
+                except Exception as e:
+                    logger.error(
+                        "❌ Error generando certificado para %s: %s",
+                        record.get("nombre_completo"),
+                        e,
+                        extra={"record_id": record.get("id"), "stage": "generación"},
+                    )
+                    path = None
+                    outcome = "failed"
+                duration = time.perf_counter() - start
+                self.stages["generación"].add(seconds=duration, nbytes=_file_size(path))
+                if path is None and outcome == "generated":
+                    outcome = "skipped"
+                timings.add("generación", duration, outcome)
+                if self.metrics is not None:
+                    self.metrics.certificate(outcome, duration)
+                logger.debug(
+                    "Certificado de %s: %s",
+                    record.get("nombre_completo"),
+                    outcome,
+                    extra={
+                        "record_id": record.get("id"),
+                        "stage": "generación",
+                        "duration": duration,
+                        "outcome": outcome,
+                    },
+                )
+
+                with self._lock:
+                    self.summary["generated" if path else "skipped"] += 1
+                    done = self.summary["generated"] + self.summary["skipped"]
+                if path:
+                    if writer is not None and record.get("id") is not None:
+                        writer.marcar_certificado_generado(record["id"])
+                    rendered.append((record, path))
+                else:
+                    self._finished([record])
+                if self.progress:
+                    self.progress("generación", done, self._total)
+        return rendered
+
+    def _dispatch(self, rendered):
+        """Pasar a la etapa de envío los certificados recién generados"""
+        if self.config is None:
+            self._finished([record for record, _ in rendered])
+            return
+
+        items = []
+        for record, path in rendered:
+            if not record.get("email"):
+                logger.info(
+                    "⚠️ %s: sin email, no se envía",
+                    record.get("nombre_completo"),
+                    extra={"record_id": record.get("id"), "outcome": "no_email"},
+                )
+                if self.metrics is not None:
+                    self.metrics.email("no_email")
+                self._finished([record])
+            elif permanently_rejected(record):
+                logger.info(
+                    "⛔ %s fue rechazado de forma permanente, no se reintenta",
+                    record["email"],
+                    extra={"record_id": record.get("id"), "outcome": "rejected"},
+                )
+                if self.metrics is not None:
+                    self.metrics.email("rejected")
+                self._finished([record])
+            else:
+                items.append((record, path))
+        if not items:
+            return
+
+        groups = coalesce_certificates(
+            items,
+            window_hours=self.config.coalesce_window_hours,
+            max_bytes=int(self.config.max_attachment_mb * 1024 * 1024),
+        )
+        for group in groups:
+            with self._lock:
+                self.summary["records"] += len(group)
+                self.summary["messages"] += 1
+            if self.config.transport == "spool":
+                start = time.perf_counter()
+                with self._timing(group.ids):
+                    with self._stage("envío"):
+                        ok = spool_group(group, self.config)
+                    duration = time.perf_counter() - start
+                    timings.add("envío", duration, "queued" if ok else "failed")
+                self.stages["envío"].add(seconds=duration, nbytes=_file_size(ok))
+                with self._lock:
+                    self.summary["queued" if ok else "failed"] += len(group)
+                if self.metrics is not None:
+                    self.metrics.email("queued" if ok else "failed", len(group))
+                self._finished(group.records)
+            else:
+                # Espera si ya hay queue_size emails sin resultado
+                self._scheduler.submit(MailJob(group.recipient, group))
+
+    def _render_worker(self, render_queue, writer):
+        while True:
+            group = render_queue.get()
+            if group is _DONE:
+                return
+            if self._stop.is_set():
+                continue
+            try:
+                self._dispatch(self._render_group(group, writer))
+            except Exception as e:
+                logger.error(
+                    "❌ Error procesando certificados para %s: %s", group.recipient, e
+                )
+                logger.debug("Error completo", exc_info=True)
+
+    def run(self, records, total=None):
+        """
+        Procesar los registros y esperar a que terminen todas las etapas.
+
+        :param records: Iterable de registros (diccionarios como los de la
+            BD); un generador se consume a medida que avanza la generación
+        :param total: Número de registros para el progreso, si records no
+            tiene len() (puede ser una estimación)
+        :return: Resumen con generados, omitidos, enviados, encolados,
+            fallidos y aplazados, y las estadísticas de cada etapa
+        """
+        start = time.perf_counter()
+        if total is None and hasattr(records, "__len__"):
+            total = len(records)
+        self._total = total or 0
+
+        writer = None
+        if self.db is not None:
+            writer = self._writer = _DatabaseWriter(
+                self.db, self.stages["base de datos"], self.queue_size * 4, self._stage
+            ).start()
+            if self.record_timings:
+                run_id = getattr(self.checkpoint, "run_id", self.run_id)
+                self.timings = EventRecorder(writer.registrar_eventos, run_id)
+
+        sending = self.config is not None and self.config.transport != "spool"
+        delivery = None
+        if sending:
+            delivery = GroupDelivery(writer, self.config, self.summary)
+            send_stats = self.stages["envío"]
+
+            def send(session, job):
+                t0 = time.perf_counter()
+                result = None
+                try:
+                    with self._timing(job.payload.ids), self._stage("envío"):
+                        result = delivery.send(session, job)
+                    return result
+                finally:
+                    duration = time.perf_counter() - t0
+                    send_stats.add(seconds=duration, nbytes=getattr(result, "size", 0))
+                    status = getattr(result, "status", "error")
+                    if self.timings is not None:
+                        self.timings.add("envío", duration, status, job.payload.ids)
+                    if self.metrics is not None:
+                        self.metrics.send_attempt(duration)
+                    logger.debug(
+                        "Envío a %s (intento %d)",
+                        job.recipient,
+                        job.attempts,
+                        extra={
+                            "record_id": job.payload.ids,
+                            "stage": "envío",
+                            "duration": duration,
+                            "outcome": status,
+                        },
+                    )
+
+            def on_result(job, result):
+                with self._timing(job.payload.ids):
+                    delivery.on_result(job, result)
+                if self.metrics is not None:
+                    self.metrics.email(result.status, len(job.payload))
+                self._finished(job.payload.records)
+                if self.progress:
+                    self.progress("envío", delivery.done, self.summary["messages"])
+
+            self._scheduler = DomainScheduler(
+                self.config,
+                send,
+                on_result=on_result,
+                concurrency=self.connections,
+                max_pending=self.queue_size,
+                stop_event=self._stop,
+                session_factory=self.session_factory,
+            ).start()
+
+        elif self.config is not None:
+            # En modo cola los mismos hilos de generación escriben los .eml
+            self.stages["envío"].workers = self.render_workers
+
+        render_queue = self._render_queue = queue.Queue(self.queue_size)
+        if self.metrics is not None:
+            self.metrics.track_queues(self.queue_depths)
+        workers = [
+            threading.Thread(
+                target=self._render_worker, args=(render_queue, writer), daemon=True
+            )
+            for _ in range(self.render_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            if not isinstance(records, (list, tuple)):
+                records = self._read(records)
+            else:
+                self.stages["lectura"].add(len(records))
+            for group in self._groups(records):
+                if self._stop.is_set():
+                    break
+                render_queue.put(group)
+        except BaseException:
+            # Ctrl+C: terminar lo que está en curso y no empezar nada más
+            self.stop()
+            raise
+        finally:
+            for _ in workers:
+                render_queue.put(_DONE)
+            for worker in workers:
+                worker.join()
+            if self._scheduler is not None:
+                self._scheduler.finish()
+                self.stages["envío"].workers = max(1, self._scheduler.connections)
+            if writer is not None:
+                if self.timings is not None:
+                    # Después de las escrituras, que también anotan su tiempo
+                    writer.wait()
+                    self.timings.flush()
+                writer.close()
+                self._writer = None
+            if self.metrics is not None:
+                self.metrics.track_queues(None)
+
+        summary = self.summary
+        if sending:
+            # Lo que no se envió ni falló de forma definitiva queda para otra vez
+            summary["deferred"] = summary["records"] - summary["sent"] - summary["failed"]
+        summary["cancelled"] = self._stop.is_set()
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        done = summary["generated"] + summary["skipped"]
+        summary["per_second"] = (
+            round(done / summary["seconds"], 2) if summary["seconds"] else 0.0
+        )
+        summary["bytes_written"] = self.stages["generación"].bytes
+        summary["bytes_sent"] = self.stages["envío"].bytes
+        summary["stages"] = {name: s.as_dict() for name, s in self.stages.items()}
+        return summary
+
+    def report(self):
+        """Líneas de texto con el rendimiento de cada etapa"""
+        return [f"⏱️  {stats}" for stats in self.stages.values() if stats.count]
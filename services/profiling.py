@@ -0,0 +1,203 @@
+"""
+Perfilado de los lotes para Certificador de Bautismos
+
+Con --profile (o la casilla de la ventana principal) cada etapa del lote
+se perfila por separado, para ver si el tiempo se va en PyPDF2, PyMuPDF,
+SQLite o el servidor SMTP:
+
+- cProfile en cada hilo mientras trabaja en una etapa; al terminar, los
+  perfiles de una etapa se juntan en <etapa>.pstats (python -m pstats,
+  snakeviz, ...).
+- Un hilo de muestreo que cada pocos milisegundos anota la pila de cada
+  hilo que está en una etapa; el resultado queda en stacks.collapsed, el
+  formato de flamegraph.pl y speedscope.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+
+
+def _slug(name):
+    """Nombre de etapa apto para un archivo ("generación" -> "generacion")"""
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return "_".join(text.lower().split()) or "etapa"
+
+
+def _frame_name(code):
+    return _function_name(code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def _function_name(filename, line, name):
+    """Función como "nombre (archivo.py:línea)"; las de C, solo su nombre"""
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class StageProfiler:
+    """
+    Perfiles de cProfile y pilas muestreadas, separados por etapa.
+
+    :param output_dir: Carpeta donde se escriben los .pstats y stacks.collapsed
+    :param interval: Segundos entre dos muestras de las pilas
+    """
+
+    COLLAPSED_FILENAME = "stacks.collapsed"
+
+    def __init__(self, output_dir, interval=0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.files = []
+        self._profiles = {}
+        self._samples = Counter()
+        self._active = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        # Desde Python 3.12 solo puede haber un cProfile activo a la vez
+        self._cprofile = True
+
+    def start(self):
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        """Perfilar el código del bloque with como parte de la etapa name"""
+        ident = threading.get_ident()
+        if ident in self._active:
+            # Ya dentro de una etapa: cuenta para la de fuera
+            yield
+            return
+        self._active[ident] = name
+        profile = self._profile(name) if self._cprofile else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                self._cprofile = False
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            del self._active[ident]
+
+    def _profile(self, name):
+        """cProfile.Profile de este hilo para la etapa"""
+        profiles = getattr(self._local, "profiles", None)
+        if profiles is None:
+            profiles = self._local.profiles = {}
+        profile = profiles.get(name)
+        if profile is None:
+            profile = profiles[name] = cProfile.Profile()
+            with self._lock:
+                self._profiles.setdefault(name, []).append(profile)
+        return profile
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, name in list(self._active.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stack.append(name)
+                    self._samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        """
+        Terminar y escribir los archivos de perfil.
+
+        :return: Rutas de los archivos escritos
+        """
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.files = []
+        for name, stats in self.stats().items():
+            path = os.path.join(self.output_dir, f"{_slug(name)}.pstats")
+            stats.dump_stats(path)
+            self.files.append(path)
+        if self._samples:
+            path = os.path.join(self.output_dir, self.COLLAPSED_FILENAME)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write(f"{stack} {count}\n")
+            self.files.append(path)
+        return self.files
+
+    def stats(self):
+        """pstats.Stats de cada etapa, con los perfiles de todos sus hilos"""
+        result = {}
+        with self._lock:
+            profiles = {name: list(items) for name, items in self._profiles.items()}
+        for name, items in profiles.items():
+            stats = None
+            for profile in items:
+                profile.create_stats()
+                if not profile.stats:
+                    continue
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            if stats is not None:
+                result[name] = stats
+        return result
+
+    def hotspots(self, top=10):
+        """
+        Funciones con más tiempo propio de cada etapa.
+
+        :return: {etapa: [(segundos, fracción, función), ...]}
+        """
+        result = {}
+        for name, stats in self.stats().items():
+            total = sum(entry[2] for entry in stats.stats.values())
+            ranked = sorted(stats.stats.items(), key=lambda item: -item[1][2])
+            result[name] = [
+                (own, own / total if total else 0.0, _function_name(*func))
+                for func, (_, _, own, _, _) in ranked[:top]
+            ]
+        return result
+
+    def report(self, top=10):
+        """Líneas de texto con los puntos calientes de cada etapa"""
+        lines = []
+        for name, entries in self.hotspots(top).items():
+            lines.append(f"🔥 {name}:")
+            for own, share, func in entries:
+                lines.append(f"   {share:6.1%} {own:8.3f}s  {func}")
+        if not lines and self._samples:
+            # Sin cProfile (otro perfilador activo): las funciones más muestreadas
+            leaves = Counter()
+            for stack, count in self._samples.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(leaves.values())
+            lines.append("🔥 Muestras:")
+            for func, count in leaves.most_common(top):
+                lines.append(f"   {count / total:6.1%} {func}")
+        return lines
+
+
+def profile_dir(base="output"):
+    """Carpeta nueva para los perfiles de una ejecución"""
+    return os.path.join(base, "perfiles", time.strftime("%Y%m%d-%H%M%S"))
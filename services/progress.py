@@ -0,0 +1,107 @@
+"""
+Progreso de los lotes para Certificador de Bautismos
+
+ProgressTracker recibe los mismos avisos progress(etapa, hechos, total) que
+ya emiten el pipeline y el envío, y calcula el ritmo y el tiempo restante
+de cada etapa. La línea de comandos y la ventana principal muestran así
+los mismos datos; junto con los tiempos por etapa del pipeline (p50/p95 y
+bytes) se ve si un lote lento está limitado por la generación de PDF o por
+el servidor SMTP.
+"""
+
+import threading
+import time
+
+
+def format_duration(seconds):
+    """Segundos como m:ss o h:mm:ss"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_bytes(size):
+    """Tamaño legible (KB, MB, GB)"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class ProgressTracker:
+    """
+    Ritmo y tiempo restante de cada etapa de un lote en curso.
+
+    :param interval: Segundos mínimos entre dos informes (ver update)
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._stages = {}
+        # El primer informe sale después de interval, con un ritmo ya medido
+        self._last_report = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, stage, done, total):
+        """
+        Registrar un aviso de progreso.
+
+        :return: True si pasó interval desde el último informe
+        """
+        now = time.monotonic()
+        with self._lock:
+            started, first = self._stages.get(stage, (now, done, 0, 0))[:2]
+            self._stages[stage] = (started, first, done, total)
+            if now - self._last_report >= self.interval:
+                self._last_report = now
+                return True
+        return False
+
+    def rate(self, stage):
+        """Elementos por segundo de la etapa desde su primer aviso"""
+        with self._lock:
+            started, first, done, _ = self._stages.get(stage, (None, 0, 0, 0))
+        elapsed = time.monotonic() - started if started is not None else 0
+        return (done - first) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, stage):
+        """Segundos que faltan para terminar la etapa, o None si no se sabe"""
+        with self._lock:
+            _, _, done, total = self._stages.get(stage, (None, 0, 0, 0))
+        rate = self.rate(stage)
+        if not total or rate <= 0:
+            return None
+        return max(0.0, (total - done) / rate)
+
+    def text(self, stage):
+        """Progreso de una etapa, p. ej. "120/500 · 18.3/s · ETA 0:21" """
+        with self._lock:
+            _, _, done, total = self._stages.get(stage, (None, 0, 0, 0))
+        return (
+            f"{done}/{total or '?'} · {self.rate(stage):.1f}/s · "
+            f"ETA {format_duration(self.eta(stage))}"
+        )
+
+    def line(self, stages=None):
+        """
+        Línea de estado con todas las etapas.
+
+        :param stages: StageStats del pipeline en curso, para añadir p95
+        """
+        with self._lock:
+            names = list(self._stages)
+        parts = [f"{name} {self.text(name)}" for name in names]
+        latencies = [
+            f"{name} {stats.percentile(95) * 1000:.0f}ms"
+            for name, stats in (stages or {}).items()
+            if stats.samples
+        ]
+        if latencies:
+            parts.append("p95 " + ", ".join(latencies))
+        return "📈 " + " | ".join(parts)
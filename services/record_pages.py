@@ -0,0 +1,138 @@
+"""
+Lista paginada de bautismos para Certificador de Bautismos
+
+La ventana principal no carga todos los registros: pide a RecordPager las
+filas que se ven y este las lee de la base de datos por páginas, ordenadas
+por la columna elegida (DatabaseService.pagina_bautismos). Solo guarda unas
+pocas páginas, así que la memoria no crece con el tamaño de la tabla.
+
+Cada página se lee a partir de la última fila de la anterior (paginación
+por clave); si se salta a una página lejana con la barra de desplazamiento
+se lee con OFFSET y desde ella se vuelve a seguir por clave.
+"""
+
+from collections import OrderedDict
+
+
+class RecordPager:
+    """
+    Filas de la tabla de bautismos por posición, leídas por páginas.
+
+    :param db: DatabaseService
+    :param page_size: Filas por página
+    :param cache_pages: Páginas que se guardan en memoria
+    """
+
+    def __init__(self, db, page_size=100, cache_pages=10):
+        self.db = db
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.orden = "id"
+        self.descendente = True
+        self.filtros = {}
+        self._pages = OrderedDict()
+        # (clave_orden, id) de la última fila de cada página leída
+        self._anchors = {}
+        self._count = None
+
+    def sort(self, orden, descendente=False):
+        """Ordenar por una columna de DatabaseService.ORDENES"""
+        self.orden = orden
+        self.descendente = descendente
+        self.refresh()
+
+    def filter(self, **filtros):
+        """Mostrar solo los registros que cumplen los filtros (ver _filtros_sql)"""
+        self.filtros = filtros
+        self.refresh()
+
+    def refresh(self):
+        """Olvidar lo leído: la próxima consulta vuelve a la base de datos"""
+        self._pages.clear()
+        self._anchors.clear()
+        self._count = None
+
+    def apply_changes(self, cambios):
+        """
+        Aplicar los cambios de DatabaseService.obtener_cambios_vista.
+
+        Las filas modificadas que están en memoria se vuelven a leer (solo
+        ellas). Si cambian las posiciones (registros nuevos o borrados, o un
+        cambio en la columna de orden) se olvidan las páginas y se vuelve a
+        leer solo lo que se ve.
+        """
+        moved = (
+            cambios["insertados"]
+            or cambios["borrados"]
+            or self.orden in cambios["columnas"]
+            # Un cambio puede hacer que un registro entre o salga del filtro
+            or (self.filtros and cambios["actualizados"])
+        )
+        if moved:
+            self._pages.clear()
+            self._anchors.clear()
+            if self.filtros or self._count is None:
+                self._count = None
+            else:
+                self._count += cambios["estadisticas"]["total"]
+            return
+
+        changed = cambios["actualizados"]
+        cached = [
+            row["id"]
+            for page in self._pages.values()
+            for row in page
+            if row["id"] in changed
+        ]
+        if not cached:
+            return
+        fresh = {row["id"]: row for row in self.db.buscar_bautismos(ids=cached)}
+        for page in self._pages.values():
+            for index, row in enumerate(page):
+                if row["id"] in fresh:
+                    # La columna de orden no cambió: la clave sigue valiendo
+                    fresh[row["id"]]["clave_orden"] = row["clave_orden"]
+                    page[index] = fresh[row["id"]]
+
+    def count(self):
+        """Número de registros con los filtros actuales"""
+        if self._count is None:
+            self._count = self.db.contar_bautismos(**self.filtros)
+        return self._count
+
+    def rows(self, start, count):
+        """Filas de las posiciones start a start + count (o hasta el final)"""
+        start = max(0, start)
+        end = min(start + count, self.count())
+        result = []
+        position = start
+        while position < end:
+            number, index = divmod(position, self.page_size)
+            page = self._page(number)
+            if index >= len(page):
+                break
+            chunk = page[index : index + end - position]
+            result.extend(chunk)
+            position += len(chunk)
+        return result
+
+    def _page(self, number):
+        page = self._pages.get(number)
+        if page is not None:
+            self._pages.move_to_end(number)
+            return page
+
+        page = self.db.pagina_bautismos(
+            self.orden,
+            self.descendente,
+            despues=self._anchors.get(number - 1),
+            offset=number * self.page_size,
+            limit=self.page_size,
+            **self.filtros,
+        )
+        if page:
+            self._anchors[number] = (page[-1]["clave_orden"], page[-1]["id"])
+        self._pages[number] = page
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return page
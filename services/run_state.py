@@ -0,0 +1,184 @@
+"""
+Ejecuciones por lotes con puntos de control para Certificador de Bautismos
+
+Cada lote queda registrado con su configuración (como hash), sus contadores
+y un punto de control: el último registro tal que todos los anteriores del
+lote ya terminaron. Si el proceso se interrumpe, --resume continúa desde ahí
+en lugar de volver a recorrer todos los registros.
+
+Con base de datos las ejecuciones se guardan en la tabla bautismo_runs; en
+modo Excel, en un archivo JSON dentro de la carpeta de salida.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+
+
+COUNTER_KEYS = (
+    "generated",
+    "skipped",
+    "records",
+    "messages",
+    "sent",
+    "queued",
+    "failed",
+    "deferred",
+)
+
+
+def record_key(record):
+    """Clave de orden de un registro: su id, o su fila en modo Excel"""
+    key = record.get("id")
+    return key if key is not None else record.get("fila")
+
+
+def config_hash(values):
+    """Hash estable de la configuración que afecta al resultado del lote"""
+    data = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def add_counters(base, summary):
+    """Sumar los contadores de un resumen a los de una ejecución anterior"""
+    return {key: (base or {}).get(key, 0) + summary.get(key, 0) for key in COUNTER_KEYS}
+
+
+class FileRunStore:
+    """
+    Ejecuciones guardadas en un archivo JSON, con los mismos métodos que
+    DatabaseService (crear_run, obtener_run_pendiente, actualizar_run,
+    finalizar_run).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save(self, runs):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(runs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, run_id, **changes):
+        with self._lock:
+            runs = self._load()
+            for run in runs:
+                if run["id"] == run_id:
+                    run.update(changes)
+            self._save(runs)
+        return True
+
+    def crear_run(self, modo, config_hash, total):
+        with self._lock:
+            runs = self._load()
+            run_id = max((run["id"] for run in runs), default=0) + 1
+            # Solo interesa la última ejecución de cada modo
+            runs = [run for run in runs if run["modo"] != modo]
+            runs.append(
+                {
+                    "id": run_id,
+                    "modo": modo,
+                    "config_hash": config_hash,
+                    "estado": "running",
+                    "total": total,
+                    "ultimo_id": None,
+                    "contadores": {},
+                }
+            )
+            self._save(runs)
+        return run_id
+
+    def obtener_run_pendiente(self, modo):
+        with self._lock:
+            runs = [run for run in self._load() if run["modo"] == modo]
+        if not runs or runs[-1]["estado"] == "completed":
+            return None
+        return runs[-1]
+
+    def actualizar_run(self, run_id, ultimo_id, contadores):
+        return self._update(run_id, ultimo_id=ultimo_id, contadores=contadores)
+
+    def finalizar_run(self, run_id, estado, contadores):
+        return self._update(run_id, estado=estado, contadores=contadores)
+
+
+class RunCheckpoint:
+    """
+    Punto de control de un lote en curso.
+
+    Los registros terminan fuera de orden (varios hilos generan y envían a
+    la vez); el punto de control solo avanza hasta el último registro cuyos
+    anteriores ya terminaron todos.
+
+    :param store: DatabaseService o FileRunStore
+    :param run_id: Ejecución a actualizar
+    :param keys: Claves (record_key) de los registros, en orden; None si
+        los registros llegan por streaming y se anuncian con expect()
+    :param base: Contadores de la ejecución anterior si se está reanudando
+    :param last_key: Punto de control de la ejecución que se reanuda
+    :param every: Registros terminados entre dos guardados
+    """
+
+    def __init__(self, store, run_id, keys=None, base=None, last_key=None, every=25):
+        self.store = store
+        self.run_id = run_id
+        # Solo las claves aún no alcanzadas por el punto de control
+        self.keys = deque(sorted(keys or ()))
+        self.base = dict(base or {})
+        self.every = max(1, every)
+        self.last_key = last_key
+        self._finished = set()
+        self._since_save = 0
+        self._lock = threading.Lock()
+
+    def expect(self, key):
+        """Añadir la clave de un registro leído por streaming (en orden)"""
+        with self._lock:
+            self.keys.append(key)
+
+    def watch(self, records):
+        """Anunciar con expect() cada registro a medida que se lee"""
+        for record in records:
+            self.expect(record_key(record))
+            yield record
+
+    def done(self, records, summary, store=None):
+        """
+        Marcar registros como terminados y guardar si toca.
+
+        :param store: Dónde escribir (p. ej. el escritor en orden del
+            pipeline, para que el punto de control nunca se adelante a las
+            escrituras de estado de esos registros)
+        """
+        with self._lock:
+            for record in records:
+                self._finished.add(record_key(record))
+            while self.keys and self.keys[0] in self._finished:
+                self.last_key = self.keys.popleft()
+                self._finished.discard(self.last_key)
+            self._since_save += len(records)
+            if self._since_save < self.every:
+                return
+            self._since_save = 0
+            last_key = self.last_key
+            counters = add_counters(self.base, summary)
+        (store or self.store).actualizar_run(self.run_id, last_key, counters)
+
+    def finish(self, estado, summary):
+        """Guardar el último punto de control y cerrar la ejecución"""
+        counters = add_counters(self.base, summary)
+        self.store.actualizar_run(self.run_id, self.last_key, counters)
+        self.store.finalizar_run(self.run_id, estado, counters)
+        return counters
@@ -0,0 +1,215 @@
+"""
+Tiempos por registro para Certificador de Bautismos
+
+Cada paso del trabajo con un registro (cargar la plantilla, rellenarla,
+guardar el PDF, construir el email MIME, enviarlo por SMTP y actualizar la
+base de datos) se mide y queda en la tabla bautismo_events con el id del
+registro, la ejecución, la duración y el resultado. Así se puede saber qué
+certificados tardaron 5 segundos y en qué paso, y ver los percentiles por
+etapa, iglesia y plantilla (python main.py stats --timings).
+
+Los pasos se miden donde ocurren, con timer() (pdf_service,
+mail_service). A qué registro pertenecen lo indica quien los procesa con
+EventRecorder.context() en el hilo que trabaja en ellos; fuera de ese
+contexto los temporizadores no hacen nada.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Pasos medidos; "generación" y "envío" son el total de cada etapa
+STEPS = (
+    "generación",
+    "plantilla",
+    "relleno",
+    "guardado",
+    "envío",
+    "mime",
+    "smtp",
+    "base de datos",
+)
+
+# Resultados que no cuentan como error en el informe
+OK_OUTCOMES = ("ok", "generated", "skipped", "reused", "sent")
+
+_local = threading.local()
+
+
+class _Context:
+    """Registros en los que trabaja un hilo y dónde anotar sus tiempos"""
+
+    def __init__(self, recorder, record_ids, template=None):
+        self.recorder = recorder
+        self.record_ids = record_ids
+        self.template = template
+
+
+class _Step:
+    """Resultado de un paso; el bloque medido puede cambiarlo"""
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+class EventRecorder:
+    """
+    Acumula los tiempos de cada registro y los guarda por tandas.
+
+    :param sink: Función sink(filas) que guarda las filas, p. ej.
+        DatabaseService.registrar_eventos (o el escritor del pipeline)
+    :param run_id: Ejecución a la que pertenecen los tiempos (puede ser None)
+    :param batch_size: Filas acumuladas antes de guardarlas
+    """
+
+    def __init__(self, sink, run_id=None, batch_size=500):
+        self.sink = sink
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.count = 0
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def add(self, step, duration, outcome="ok", record_ids=None, template=None):
+        """Anotar un paso de uno o varios registros (un email agrupado)"""
+        if not isinstance(record_ids, (list, tuple)):
+            record_ids = [record_ids]
+        rows = [
+            (record_id, self.run_id, step, duration, outcome, template)
+            for record_id in record_ids
+        ]
+        with self._lock:
+            self._rows.extend(rows)
+            self.count += len(rows)
+            full = len(self._rows) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Guardar las filas acumuladas"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if rows:
+            self.sink(rows)
+
+    @contextmanager
+    def context(self, record_ids, template=None):
+        """Atribuir a estos registros los pasos medidos en el bloque"""
+        previous = getattr(_local, "context", None)
+        _local.context = _Context(self, record_ids, template)
+        try:
+            yield _local.context
+        finally:
+            _local.context = previous
+
+
+def current():
+    """Contexto del hilo actual, o None si nadie está midiendo"""
+    return getattr(_local, "context", None)
+
+
+@contextmanager
+def activate(context):
+    """Usar en este hilo un contexto tomado de otro (ver current())"""
+    previous = getattr(_local, "context", None)
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = previous
+
+
+def set_template(template_path):
+    """Anotar la plantilla con la que se genera el registro en curso"""
+    context = current()
+    if context is not None:
+        context.template = template_path
+
+
+def add(step, duration, outcome="ok"):
+    """Anotar un paso ya medido del registro en curso"""
+    context = current()
+    if context is not None:
+        context.recorder.add(
+            step, duration, outcome, context.record_ids, context.template
+        )
+
+
+@contextmanager
+def timer(step):
+    """
+    Medir el bloque como el paso step del registro en curso.
+
+    El bloque recibe un objeto cuyo outcome ("ok" por defecto) puede
+    cambiar; si lanza una excepción el resultado queda como "error".
+    """
+    context = current()
+    result = _Step()
+    if context is None:
+        yield result
+        return
+    start = time.perf_counter()
+    try:
+        yield result
+    except BaseException:
+        result.outcome = "error"
+        raise
+    finally:
+        context.recorder.add(
+            step,
+            time.perf_counter() - start,
+            result.outcome,
+            context.record_ids,
+            context.template,
+        )
+
+
+def percentile(values, q):
+    """Valor por debajo del cual queda el q% de values (rango más cercano)"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def timing_report(events, by=None):
+    """
+    Percentiles de cada paso, opcionalmente por iglesia o plantilla.
+
+    :param events: Filas con etapa, duracion, resultado y (según by)
+        iglesia o plantilla (ver DatabaseService.obtener_eventos)
+    :param by: None, "iglesia" o "plantilla"
+    :return: Lista de diccionarios con grupo, etapa, count, errores,
+        p50, p95, p99 y max (segundos), en el orden de STEPS
+    """
+    groups = {}
+    for event in events:
+        group = (event[by] or "(sin dato)") if by else None
+        entry = groups.setdefault((group, event["etapa"]), {"durations": [], "errors": 0})
+        entry["durations"].append(event["duracion"])
+        if event["resultado"] not in OK_OUTCOMES:
+            entry["errors"] += 1
+
+    order = {step: i for i, step in enumerate(STEPS)}
+
+    def sort_key(key):
+        group, step = key
+        return group or "", order.get(step, len(order)), step
+
+    report = []
+    for key in sorted(groups, key=sort_key):
+        durations = sorted(groups[key]["durations"])
+        report.append(
+            {
+                "grupo": key[0],
+                "etapa": key[1],
+                "count": len(durations),
+                "errores": groups[key]["errors"],
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "p99": percentile(durations, 99),
+                "max": durations[-1],
+            }
+        )
+    return report
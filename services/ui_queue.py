@@ -0,0 +1,75 @@
+"""
+Cola de avisos de los hilos de trabajo a la ventana para Certificador de Bautismos
+
+Tkinter solo se puede usar desde el hilo de la ventana. Los lotes corren en
+otros hilos, así que en lugar de cambiar la ventana directamente dejan en
+UIQueue lo que hay que hacer (cambiar el estado, mostrar un mensaje,
+recargar la lista) y la ventana lo ejecuta con root.after a un ritmo fijo:
+
+    self.ui = UIQueue()
+    self.root.after(UI_FRAME_MS, self.poll_ui)   # poll_ui llama a process()
+
+Los avisos de progreso se combinan: si llegan mil entre dos cuadros, solo
+se ejecuta el último. Los demás avisos se ejecutan todos y en orden.
+"""
+
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class UIQueue:
+    """
+    Avisos pendientes para el hilo de la ventana.
+
+    call() y update() se pueden usar desde cualquier hilo; process() solo
+    desde el hilo de la ventana.
+    """
+
+    def __init__(self):
+        self._events = deque()
+        # Avisos combinables aún sin ejecutar, por clave
+        self._coalesced = {}
+        self._lock = threading.Lock()
+
+    def call(self, func, *args, **kwargs):
+        """Ejecutar func(*args, **kwargs) en el hilo de la ventana"""
+        with self._lock:
+            self._events.append([func, args, kwargs])
+            # Un aviso posterior no puede adelantarse a este
+            self._coalesced.clear()
+
+    def update(self, key, func, *args, **kwargs):
+        """
+        Como call(), pero solo se ejecuta el último aviso pendiente con la
+        misma clave (p. ej. el texto de progreso).
+        """
+        with self._lock:
+            event = self._coalesced.get(key)
+            if event is not None:
+                event[1:] = [args, kwargs]
+                return
+            event = self._coalesced[key] = [func, args, kwargs]
+            self._events.append(event)
+
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def process(self):
+        """
+        Ejecutar los avisos pendientes.
+
+        :return: Avisos ejecutados
+        """
+        with self._lock:
+            events, self._events = self._events, deque()
+            self._coalesced.clear()
+        for func, args, kwargs in events:
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                logger.exception("❌ Error actualizando la ventana")
+        return len(events)
@@ -0,0 +1,219 @@
+"""
+Modo servicio para Certificador de Bautismos
+
+El servicio queda en marcha y procesa solo los bautismos nuevos o
+modificados, sin que nadie tenga que lanzar el lote. Cada intervalo hace
+una comprobación casi gratuita (PRAGMA data_version en una conexión propia,
+que cambia solo cuando otra conexión escribió en la base de datos) y, si
+hubo escrituras, lee el registro de cambios que mantienen los triggers de
+bautismo_cambios. Entre ciclos el proceso duerme: la plantilla, la
+configuración y las conexiones SMTP siguen en memoria para el siguiente.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class QuietHours:
+    """
+    Franja horaria en la que el servicio no genera ni envía nada.
+
+    :param start: Hora de inicio (datetime.time)
+    :param end: Hora de fin; si es menor que start, la franja cruza la medianoche
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def parse(cls, text):
+        """Franja en formato "22-7" o "22:30-06:15" """
+        try:
+            start, end = (part.strip() for part in text.split("-"))
+            return cls(_parse_time(start), _parse_time(end))
+        except ValueError:
+            raise ValueError(f"Horario de silencio inválido: {text} (p. ej. 22-7)")
+
+    def active(self, now=None):
+        now = (now or datetime.now()).time()
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        return now >= self.start or now < self.end
+
+    def __str__(self):
+        return f"{self.start:%H:%M}-{self.end:%H:%M}"
+
+
+def _parse_time(text):
+    fmt = "%H:%M" if ":" in text else "%H"
+    return datetime.strptime(text, fmt).time()
+
+
+class DatabaseWatcher:
+    """
+    Procesar los cambios de la base de datos a medida que ocurren.
+
+    :param db: DatabaseService
+    :param processor: BatchProcessor que se reutiliza en todos los ciclos
+    :param interval: Segundos entre comprobaciones
+    :param quiet_hours: QuietHours opcional
+    :param retry_every: Segundos entre barridos completos de los registros
+        sin terminar (fechas que ya llegaron, envíos aplazados); 0 = nunca
+    :param send: Enviar los certificados además de generarlos
+    :param session_pool: MailSessionPool del processor, para cerrar las
+        conexiones que quedan sin uso demasiado tiempo
+    :param batch_size: Cambios leídos por consulta
+    """
+
+    def __init__(
+        self,
+        db,
+        processor,
+        interval=10.0,
+        quiet_hours=None,
+        retry_every=3600.0,
+        send=True,
+        session_pool=None,
+        batch_size=1000,
+    ):
+        self.db = db
+        self.processor = processor
+        self.interval = max(0.1, interval)
+        self.quiet_hours = quiet_hours
+        self.retry_every = retry_every
+        self.send = send
+        self.session_pool = session_pool
+        self.batch_size = batch_size
+        self.cycles = 0
+        self._stop = threading.Event()
+        self._conn = None
+        self._data_version = None
+        self._cursor = 0
+        self._last_sweep = 0.0
+        # Ejecución del servicio: los tiempos de todos los ciclos van a ella
+        self._run_id = None
+        self._run_counts = {"generated": 0, "sent": 0, "queued": 0, "failed": 0}
+
+    def stop(self):
+        """Terminar después del ciclo en curso"""
+        self._stop.set()
+        self.processor.cancel()
+
+    def _database_changed(self):
+        """True si otra conexión escribió desde la última comprobación"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db.db_path, check_same_thread=False)
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _process(self, records, reason):
+        if self._run_id is None:
+            self._run_id = self.db.crear_run("servicio", None, None)
+        summary = self.processor.generate(
+            records, send=self.send, track_run=False, run_id=self._run_id
+        )
+        self.cycles += 1
+        if summary is None:
+            return None
+        for key in self._run_counts:
+            self._run_counts[key] += summary[key]
+        done = summary["generated"] + summary["skipped"]
+        if done:
+            logger.info(
+                "🔔 %s: %d certificados generados, %d enviados, %d encolados, "
+                "%d fallidos",
+                reason,
+                summary["generated"],
+                summary["sent"],
+                summary["queued"],
+                summary["failed"],
+            )
+        return summary
+
+    def sweep(self):
+        """Procesar todos los registros sin terminar"""
+        self._last_sweep = time.monotonic()
+        return self._process(
+            self.db.iterar_bautismos(estado="sin_terminar"), "Registros pendientes"
+        )
+
+    def process_changes(self):
+        """
+        Procesar los registros modificados desde el último ciclo.
+
+        :return: Número de registros revisados
+        """
+        processed = 0
+        while not self._stop.is_set():
+            ids, last = self.db.obtener_cambios(self._cursor, self.batch_size)
+            if ids is None:
+                # El registro se podó antes de leerlo: revisar todo
+                logger.warning("⚠️  Se perdieron cambios del registro, revisando todo")
+                self._cursor = self.db.ultimo_cambio()
+                self.db.purgar_cambios(self._cursor)
+                summary = self.sweep()
+                return summary["generated"] + summary["skipped"] if summary else 0
+            if not ids:
+                break
+            records = self.db.buscar_bautismos(ids=ids, estado="sin_terminar")
+            if records:
+                self._process(records, f"{len(records)} registros nuevos o modificados")
+            processed += len(records)
+            # Lo ya procesado no se vuelve a leer
+            self.db.purgar_cambios(last)
+            self._cursor = last
+        return processed
+
+    def run_once(self):
+        """
+        Un ciclo: barrido si toca, o los cambios si hubo escrituras.
+
+        :return: True si se procesó algo
+        """
+        if self.session_pool is not None:
+            self.session_pool.close_idle()
+        if self.quiet_hours is not None and self.quiet_hours.active():
+            return False
+        if self.retry_every and time.monotonic() - self._last_sweep >= self.retry_every:
+            self.sweep()
+            return True
+        if not self._database_changed():
+            return False
+        return self.process_changes() > 0
+
+    def run(self):
+        """Procesar cambios hasta que se llame a stop()"""
+        # Lo anterior al arranque lo cubre el barrido inicial
+        self._cursor = self.db.ultimo_cambio()
+        self._database_changed()
+        quiet = False
+        try:
+            if self.quiet_hours is None or not self.quiet_hours.active():
+                self.sweep()
+            while not self._stop.wait(self.interval):
+                in_quiet_hours = (
+                    self.quiet_hours is not None and self.quiet_hours.active()
+                )
+                if in_quiet_hours != quiet:
+                    quiet = in_quiet_hours
+                    if quiet:
+                        logger.info("🌙 Horario de silencio (%s): en pausa", self.quiet_hours)
+                    else:
+                        logger.info("☀️  Fin del horario de silencio")
+                self.run_once()
+        finally:
+            if self._run_id is not None:
+                self.db.finalizar_run(self._run_id, "completed", self._run_counts)
+                self._run_id = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self.session_pool is not None:
+                self.session_pool.close()
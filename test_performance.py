@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Pruebas de rendimiento con líneas base guardadas en perf_baselines.json.
+
+Miden con datos sintéticos el ritmo (operaciones por segundo) y el pico de
+memoria (tracemalloc) de generate_certificate, de las operaciones en bloque
+de DatabaseService y del envío de emails contra el servidor SMTP local.
+Siempre fallan si la memoria queda por encima de la línea base más la
+tolerancia, si la plantilla se vuelve a leer en cada certificado o si los
+envíos no reutilizan la conexión SMTP.
+
+El ritmo depende de la máquina y de su carga, así que solo se compara con
+la línea base si se pide con PERF_CHECK_RATES=1 (en la misma máquina en la
+que se guardaron las líneas base). Se toma la mediana de PERF_RUNS
+ejecuciones.
+
+    python -m pytest -q test_performance.py
+    PERF_CHECK_RATES=1 PERF_TOLERANCE=0.7 python -m pytest -q test_performance.py
+    PERF_UPDATE_BASELINES=1 python -m pytest -q test_performance.py
+"""
+
+import itertools
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.synthetic_data import generate_records, make_template
+from services import pdf_service
+from services.database_service import DatabaseService
+from services.mail_batch import deliver_certificates
+from services.mail_scheduler import DEFAULT_POLICIES
+from services.mail_service import MailSession
+from services.pdf_service import generate_certificate
+
+BASELINES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "perf_baselines.json"
+)
+UPDATE_BASELINES = os.environ.get("PERF_UPDATE_BASELINES") == "1"
+CHECK_RATES = os.environ.get("PERF_CHECK_RATES") == "1"
+RUNS = int(os.environ.get("PERF_RUNS", "5"))
+
+with open(BASELINES_PATH, encoding="utf-8") as f:
+    BASELINES = json.load(f)
+TOLERANCE = float(os.environ.get("PERF_TOLERANCE", BASELINES["tolerance"]))
+
+# Resultados de esta ejecución, para PERF_UPDATE_BASELINES
+_measured = {}
+
+
+def measure(prepare, count):
+    """
+    Ritmo y pico de memoria de una operación.
+
+    La operación se ejecuta RUNS veces para medir el tiempo (se usa la
+    mediana) y una más con tracemalloc (que la hace más lenta) para medir
+    la memoria.
+
+    :param prepare: Función que prepara y devuelve la operación a medir
+    :param count: Elementos que procesa la operación
+    :return: {"per_second": ..., "peak_kb": ...}
+    """
+    times = []
+    for _ in range(RUNS):
+        run = prepare()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    seconds = statistics.median(times)
+
+    run = prepare()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"per_second": count / seconds, "peak_kb": peak / 1024}
+
+
+def check(case, measured):
+    """Comparar una medición con su línea base"""
+    _measured[case] = measured
+    if UPDATE_BASELINES:
+        return
+    baseline = BASELINES["cases"].get(case)
+    if baseline is None:
+        pytest.skip(f"{case}: sin línea base (PERF_UPDATE_BASELINES=1 para crearla)")
+
+    if CHECK_RATES:
+        floor = baseline["per_second"] * (1 - TOLERANCE)
+        assert measured["per_second"] >= floor, (
+            f"{case}: {measured['per_second']:.1f}/s, por debajo del mínimo "
+            f"{floor:.1f}/s (línea base {baseline['per_second']:.1f}/s)"
+        )
+    ceiling = baseline["peak_kb"] * (1 + TOLERANCE)
+    assert measured["peak_kb"] <= ceiling, (
+        f"{case}: pico de {measured['peak_kb']:.0f} KB, por encima del máximo "
+        f"{ceiling:.0f} KB (línea base {baseline['peak_kb']:.0f} KB)"
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def update_baselines():
+    """Con PERF_UPDATE_BASELINES=1, guardar lo medido como nuevas líneas base"""
+    yield
+    if not UPDATE_BASELINES or not _measured:
+        return
+    for case, measured in _measured.items():
+        BASELINES["cases"][case] = {
+            "per_second": round(measured["per_second"], 1),
+            "peak_kb": round(measured["peak_kb"]),
+        }
+    with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+        json.dump(BASELINES, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Carpeta de trabajo con data/template.pdf sintética y el mapeo de campos.
+
+    generate_certificate busca data/template.pdf relativo al directorio
+    actual, así que la prueba se ejecuta dentro de esta carpeta.
+    """
+    data_dir = tmp_path / "data"
+    make_template(str(data_dir / "template.pdf"))
+    shutil.copy(
+        os.path.join(os.path.dirname(BASELINES_PATH), "data", "field_mapping.json"),
+        data_dir / "field_mapping.json",
+    )
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def sink():
+    with SMTPSink() as server:
+        yield server
+
+
+def records(count):
+    return list(generate_records(count, seed=42))
+
+
+# Certificados ---------------------------------------------------------
+
+
+def test_generate_certificate(workdir):
+    people = records(20)
+    template = os.path.join("data", "template.pdf")
+    # La primera llamada lee la plantilla y el mapeo; no forma parte de la medida
+    generate_certificate("Prueba", "01/01/2024", "Iglesia", template, "warmup.pdf")
+
+    def prepare():
+        def run():
+            for i, person in enumerate(people):
+                assert generate_certificate(
+                    person["nombre_completo"],
+                    person["fecha_bautismo"],
+                    person["iglesia"],
+                    template,
+                    f"certificado_{i}.pdf",
+                )
+
+        return run
+
+    check("generate_certificate", measure(prepare, len(people)))
+
+
+def test_template_is_read_once(workdir, monkeypatch):
+    reads = []
+    read_file = pdf_service._read_file
+
+    def counting_read(path):
+        reads.append(os.path.basename(path))
+        return read_file(path)
+
+    monkeypatch.setattr(pdf_service, "_read_file", counting_read)
+    monkeypatch.setattr(pdf_service, "_file_cache", {})
+    template = os.path.join("data", "template.pdf")
+    for i, person in enumerate(records(10)):
+        generate_certificate(
+            person["nombre_completo"],
+            person["fecha_bautismo"],
+            person["iglesia"],
+            template,
+            f"certificado_{i}.pdf",
+        )
+
+    assert reads.count("template.pdf") == 1, "la plantilla se leyó más de una vez"
+    assert reads.count("field_mapping.json") == 1, "el mapeo se leyó más de una vez"
+
+
+# Base de datos --------------------------------------------------------
+
+
+def test_database_bulk_insert(tmp_path):
+    rows = records(5000)
+    paths = itertools.count()
+
+    def prepare():
+        db = DatabaseService(str(tmp_path / f"insert_{next(paths)}.db"))
+        return lambda: db.agregar_bautismos(rows)
+
+    check("db_bulk_insert", measure(prepare, len(rows)))
+
+
+def test_database_bulk_update(tmp_path):
+    db = DatabaseService(str(tmp_path / "update.db"))
+    db.agregar_bautismos(records(5000))
+    ids = [record["id"] for record in db.buscar_bautismos()]
+
+    def prepare():
+        def run():
+            assert db.marcar_emails_enviados(ids)
+            assert db.regenerar_certificados(ids)
+
+        return run
+
+    check("db_bulk_update", measure(prepare, len(ids)))
+
+
+def test_database_iterate(tmp_path):
+    db = DatabaseService(str(tmp_path / "iterate.db"))
+    db.agregar_bautismos(records(5000))
+    total = db.contar_bautismos(estado="sin_terminar")
+
+    def prepare():
+        def run():
+            # Por páginas: la memoria no debe crecer con el número de registros
+            assert sum(1 for _ in db.iterar_bautismos(estado="sin_terminar")) == total
+
+        return run
+
+    check("db_iterate", measure(prepare, total))
+
+
+# Emails ---------------------------------------------------------------
+
+
+def test_mail_session_reuses_connection(sink, workdir):
+    attachment = "adjunto.pdf"
+    make_template(attachment)
+    count = 40
+
+    def prepare():
+        def run():
+            with MailSession(sink.email_config()) as session:
+                for i in range(count):
+                    assert session.send_certificate(
+                        f"persona{i}@iglesia.org", f"Persona {i}", attachment
+                    )
+
+        return run
+
+    before = sink.snapshot()
+    check("mail_session", measure(prepare, count))
+    connections = sink.snapshot()["connections"] - before["connections"]
+    # Una conexión por ejecución (tiempo y memoria), no una por email
+    runs = RUNS + 1
+    assert connections == runs, (
+        f"{connections} conexiones SMTP para {runs * count} emails"
+    )
+
+
+def test_mail_delivery(sink, workdir, tmp_path):
+    db = DatabaseService(str(tmp_path / "mail.db"))
+    db.agregar_bautismos(records(30))
+    items = []
+    for record in db.buscar_bautismos():
+        path = f"certificado_{record['id']}.pdf"
+        make_template(path)
+        items.append((record, path))
+    # Sin los límites por minuto de Outlook o Yahoo se mide el programa
+    limits = {
+        group: (policy.concurrency, 0) for group, policy in DEFAULT_POLICIES.items()
+    }
+    config = sink.email_config(domain_limits=limits)
+
+    def prepare():
+        db.regenerar_certificados([record["id"] for record, _ in items])
+
+        def run():
+            summary = deliver_certificates(db, items, config=config)
+            assert summary["sent"] == sum(1 for record, _ in items if record["email"])
+
+        return run
+
+    before = sink.snapshot()
+    check("mail_delivery", measure(prepare, len(items)))
+    connections = sink.snapshot()["connections"] - before["connections"]
+    messages = sink.snapshot()["accepted"] - before["accepted"]
+    assert connections < messages / 2, (
+        f"{connections} conexiones SMTP para {messages} emails: se reconecta por email"
+    )